@@ -0,0 +1,303 @@
+"""
+Headless self-play arena for Expansion War bots.
+
+Plays batches of matches between bot configurations on the built-in levels
+and on custom level files, spread over a pool of processes, and reports
+win rates, average game length and when each base changed hands.
+
+Every pair of bots plays the given number of games on every level, swapping
+colours between games. A match alternates turns between green and red: the
+side to move picks one action (or passes) and the board then runs
+--ticks-per-turn ticks, as when the turn timer runs out in the GUI. Games
+still undecided after --max-turns are draws.
+
+A bot is given by name, optionally with constructor arguments:
+    greedy
+    search:beam_width=4,max_depth=3
+    mcts:rollout_depth=2
+
+Level files are JSON lists of unit configs (the format of levels.py) or
+games saved from the GUI as JSON or XML, played from the saved position.
+
+Usage:
+    python arena.py --bots greedy search --games 100
+    python arena.py --bots mcts search --levels 2 3 --level-file my_map.json --csv games.csv --json arena.json
+"""
+
+import argparse
+import ast
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from bots import BOTS, MCTSBot, create_bot
+from db_handler import DatabaseHandler
+from game_engine import GameEngine, PLAYER, PC, NEUTRAL, compact_unit_ids
+from levels import LEVELS
+from state_sync import replay_action
+
+
+def parse_bot_spec(spec):
+    """Split "name:key=value,..." into (name, kwargs)"""
+    name, _, options = spec.partition(":")
+    if name not in BOTS:
+        raise ValueError(f"Unknown bot {name!r}, choose from {', '.join(BOTS)}")
+    kwargs = {}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        try:
+            kwargs[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[key] = value
+    # The arena already runs one game per core
+    if BOTS[name] is MCTSBot:
+        kwargs.setdefault("workers", 1)
+    return name, kwargs
+
+
+def builtin_levels(numbers=None):
+    """(name, unit dicts) for the built-in levels, all of them by default"""
+    levels = []
+    for number in numbers or range(1, len(LEVELS) + 1):
+        if not 1 <= number <= len(LEVELS):
+            raise ValueError(f"There is no level {number}, the game has {len(LEVELS)}")
+        engine = GameEngine()
+        engine.load_level(LEVELS[number - 1])
+        levels.append((f"level {number}", engine.board.to_dicts()))
+    return levels
+
+
+def load_level_file(path):
+    """(name, unit dicts) for a level config or saved game file"""
+    handler = DatabaseHandler()
+    if path.lower().endswith(".xml"):
+        success, message, data = handler.load_from_xml_file(path)
+    else:
+        success, message, data = handler.load_from_json_file(path)
+    if not success:
+        raise ValueError(message)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    if isinstance(data, dict):
+        # A saved game, played on from where it was saved
+        return name, compact_unit_ids(data.get("units", []))
+    engine = GameEngine()
+    engine.load_level(data)
+    return name, engine.board.to_dicts()
+
+
+def play_game(job):
+    """Play one match, returns its record; runs in a worker process"""
+    random.seed(job["seed"])
+    engine = GameEngine()
+    engine.load_state(job["units"])
+    bots = {side: create_bot(name, ticks_per_turn=job["ticks_per_turn"], **kwargs)
+            for side, (name, kwargs) in zip((PLAYER, PC), (job["green"], job["red"]))}
+
+    captures = []
+    engine.add_listener(lambda event, state, old_owner: captures.append(
+        (engine.tick_count, state.unit_id, old_owner, state.owner)))
+
+    started = time.perf_counter()
+    side = PLAYER
+    turns = 0
+    winner = None
+    while turns < job["max_turns"] and not winner:
+        action = bots[side].choose_action(engine.board, side, job["move_time"])
+        if action is not None:
+            replay_action(engine, action)
+        for _ in range(job["ticks_per_turn"]):
+            engine.tick()
+            winner = engine.winner()
+            if winner:
+                break
+        turns += 1
+        side = PC if side == PLAYER else PLAYER
+
+    for bot in bots.values():
+        bot.close()
+    counts = engine.owner_counts()
+    return {
+        "level": job["level"],
+        "green": job["green_spec"],
+        "red": job["red_spec"],
+        "seed": job["seed"],
+        "winner": winner or "draw",
+        "turns": turns,
+        "ticks": engine.tick_count,
+        "green_units": counts[PLAYER],
+        "red_units": counts[PC],
+        "neutral_units": counts[NEUTRAL],
+        "seconds": round(time.perf_counter() - started, 4),
+        "captures": captures
+    }
+
+
+def make_jobs(levels, bot_specs, games, seed=0, ticks_per_turn=5, max_turns=100, move_time=0.02):
+    """Every pairing of bots on every level, colours swapped between games"""
+    parsed = {spec: parse_bot_spec(spec) for spec in bot_specs}
+    pairings = list(itertools.combinations(bot_specs, 2)) or [(bot_specs[0], bot_specs[0])]
+    seeds = itertools.count(seed)
+    jobs = []
+    for level_name, units in levels:
+        for first, second in pairings:
+            for game in range(games):
+                green, red = (first, second) if game % 2 == 0 else (second, first)
+                jobs.append({
+                    "level": level_name, "units": units, "seed": next(seeds),
+                    "green_spec": green, "red_spec": red, "green": parsed[green], "red": parsed[red],
+                    "ticks_per_turn": ticks_per_turn, "max_turns": max_turns, "move_time": move_time
+                })
+    return jobs
+
+
+def run_games(jobs, workers=None, progress=True):
+    """Play every job, in a pool of processes unless workers is 1"""
+    results = []
+    started = time.perf_counter()
+    if workers == 1:
+        games = map(play_game, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(workers)
+        games = pool.imap_unordered(play_game, jobs, chunksize=max(1, len(jobs) // (8 * (workers or os.cpu_count() or 1))))
+    try:
+        for result in games:
+            results.append(result)
+            if progress and len(results) % 100 == 0:
+                elapsed = time.perf_counter() - started
+                print(f"[ARENA] {len(results)}/{len(jobs)} games, {len(results) / elapsed:.1f} games/s")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+
+def summarize(results):
+    """Win rates and lengths per level and pairing, plus colour balance per level"""
+    matchups = {}
+    levels = {}
+    for game in results:
+        pairing = tuple(sorted((game["green"], game["red"])))
+        entry = matchups.setdefault((game["level"], pairing), {
+            "level": game["level"], "bot_a": pairing[0], "bot_b": pairing[1],
+            "games": 0, "wins_a": 0, "wins_b": 0, "draws": 0, "ticks": 0})
+        entry["games"] += 1
+        entry["ticks"] += game["ticks"]
+        if game["winner"] == "draw":
+            entry["draws"] += 1
+        else:
+            winning_bot = game["green"] if game["winner"] == "green" else game["red"]
+            # A mirror match counts wins for the first bot
+            entry["wins_a" if winning_bot == pairing[0] else "wins_b"] += 1
+
+        level = levels.setdefault(game["level"], {
+            "level": game["level"], "games": 0, "green_wins": 0, "red_wins": 0, "draws": 0,
+            "ticks": 0, "first_capture_ticks": []})
+        level["games"] += 1
+        level["ticks"] += game["ticks"]
+        level[{"green": "green_wins", "red": "red_wins"}.get(game["winner"], "draws")] += 1
+        if game["captures"]:
+            level["first_capture_ticks"].append(game["captures"][0][0])
+
+    summary = []
+    for entry in matchups.values():
+        games = entry["games"]
+        entry["win_rate_a"] = round(entry["wins_a"] / games, 3)
+        entry["win_rate_b"] = round(entry["wins_b"] / games, 3)
+        entry["avg_ticks"] = round(entry.pop("ticks") / games, 1)
+        summary.append(entry)
+
+    balance = []
+    for level in levels.values():
+        games = level["games"]
+        first_captures = level.pop("first_capture_ticks")
+        level["green_win_rate"] = round(level["green_wins"] / games, 3)
+        level["red_win_rate"] = round(level["red_wins"] / games, 3)
+        level["avg_ticks"] = round(level.pop("ticks") / games, 1)
+        level["avg_first_capture_tick"] = round(sum(first_captures) / len(first_captures), 1) if first_captures else None
+        balance.append(level)
+    return summary, balance
+
+
+def write_csv(results, path):
+    """One row per game, the capture timeline as tick:unit:owner entries"""
+    fields = ["level", "green", "red", "seed", "winner", "turns", "ticks",
+              "green_units", "red_units", "neutral_units", "seconds", "captures"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for game in results:
+            row = dict(game)
+            row["captures"] = " ".join(f"{tick}:{unit_id}:{new_owner}" for tick, unit_id, _, new_owner in game["captures"])
+            writer.writerow(row)
+
+
+def write_json(results, summary, balance, config, path):
+    with open(path, "w") as f:
+        json.dump({"config": config, "summary": summary, "levels": balance, "games": results}, f, indent=2)
+
+
+def print_summary(summary, balance):
+    for entry in summary:
+        print(f"{entry['level']:>12}  {entry['bot_a']} {entry['win_rate_a']:.0%} vs {entry['bot_b']} "
+              f"{entry['win_rate_b']:.0%} ({entry['draws']} draws of {entry['games']}), "
+              f"{entry['avg_ticks']} ticks on average")
+    for level in balance:
+        print(f"{level['level']:>12}  green {level['green_win_rate']:.0%} / red {level['red_win_rate']:.0%}, "
+              f"first capture at tick {level['avg_first_capture_tick']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Expansion War bots against each other")
+    parser.add_argument("--bots", nargs="+", default=["greedy", "search"],
+                        help="Bot specs such as greedy or search:max_depth=3, every pair plays")
+    parser.add_argument("--games", type=int, default=20, help="Games per pairing and level")
+    parser.add_argument("--levels", type=int, nargs="*", help="Built-in level numbers, all by default")
+    parser.add_argument("--level-file", action="append", default=[], help="Extra level or saved game (JSON/XML)")
+    parser.add_argument("--no-builtin", action="store_true", help="Only play the level files")
+    parser.add_argument("--workers", type=int, default=None, help="Processes, defaults to the number of CPUs")
+    parser.add_argument("--move-time", type=float, default=0.02, help="Seconds each bot may think per move")
+    parser.add_argument("--ticks-per-turn", type=int, default=5)
+    parser.add_argument("--max-turns", type=int, default=100, help="Turns before a game is a draw")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="Write one row per game to this file")
+    parser.add_argument("--json", help="Write the summary and every game to this file")
+    parser.add_argument("--quiet", action="store_true", help="Disable progress output")
+    args = parser.parse_args()
+
+    try:
+        for spec in args.bots:
+            parse_bot_spec(spec)
+        levels = [] if args.no_builtin else builtin_levels(args.levels)
+        levels += [load_level_file(path) for path in args.level_file]
+    except ValueError as e:
+        parser.error(str(e))
+    if not levels:
+        parser.error("No levels to play")
+
+    jobs = make_jobs(levels, args.bots, args.games, seed=args.seed, ticks_per_turn=args.ticks_per_turn,
+                     max_turns=args.max_turns, move_time=args.move_time)
+    started = time.perf_counter()
+    results = run_games(jobs, args.workers, progress=not args.quiet)
+    elapsed = time.perf_counter() - started
+    results.sort(key=lambda game: game["seed"])
+
+    summary, balance = summarize(results)
+    print(f"[ARENA] {len(results)} games in {elapsed:.1f}s ({len(results) / elapsed:.1f} games/s)")
+    print_summary(summary, balance)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("csv", "json", "quiet")}
+    if args.csv:
+        write_csv(results, args.csv)
+    if args.json:
+        write_json(results, summary, balance, config, args.json)
+
+
+if __name__ == "__main__":
+    main()
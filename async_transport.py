@@ -0,0 +1,348 @@
+"""
+asyncio transport for the Expansion War network game.
+
+AsyncNetworkManager is a drop-in replacement for NetworkManager: it speaks the
+same framed protocol, runs the same handshake and message handling and emits
+the same connected / disconnected / message_received / error signals. Instead
+of a blocking thread per connection that polls its socket with short
+timeouts, all sockets are served by one asyncio event loop running in a
+background thread:
+
+* reads wake up as soon as data arrives, with no polling interval
+* writes go through a bounded send queue drained by a writer task that waits
+  on StreamWriter.drain(), so a slow peer pushes back instead of growing the
+  buffers without limit
+* stop() cancels every connection task and closes the listening socket right
+  away instead of waiting for a socket timeout to expire
+
+Qt integration works through the signals: they are emitted from the loop
+thread and Qt queues them onto the GUI thread, exactly like the threaded
+manager. Calls from the GUI thread into the loop use call_soon_threadsafe
+and never block on the network.
+"""
+
+import asyncio
+import errno
+import threading
+
+from message_codec import JSON_CODEC
+from network_manager import NetworkManager
+from network_protocol import FRAME_HEADER, MAX_FRAME_SIZE, frame_message
+
+
+class AsyncNetworkManager(NetworkManager):
+    """NetworkManager running its sockets on an asyncio event loop"""
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+        self.loop_thread = None
+        self.server = None
+        self.writer = None
+        self.send_queue = None
+        self.tasks = set()  # Connection tasks cancelled on stop()
+        self.shutdown_task = None  # Last stop(), new tasks wait for it
+
+        self.connect_timeout = 5.0  # seconds
+        self.shutdown_timeout = 2.0  # seconds
+        self.max_pending_frames = 1024  # Sends fail once this many frames are queued
+        self.write_buffer_limit = 1024 * 1024  # Transport buffer size that makes drain() wait
+
+        self.send_lock = threading.Lock()
+        self.pending_frames = 0
+
+    def start_loop(self):
+        """Start the event loop thread if it is not running yet"""
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.run_loop)
+        self.loop_thread.daemon = True
+        self.loop_thread.start()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit(self, coro):
+        """Run a coroutine on the loop as a task cancelled by stop()"""
+        async def tracked():
+            task = asyncio.current_task()
+            self.tasks.add(task)
+            try:
+                if self.shutdown_task is not None:
+                    # Let the previous connection close before this one starts
+                    await asyncio.wait([self.shutdown_task])
+                await coro
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                self.error.emit(f"Network error: {str(e)}")
+                self.log(f"Network task error: {str(e)}")
+            finally:
+                self.tasks.discard(task)
+
+        return asyncio.run_coroutine_threadsafe(tracked(), self.loop)
+
+    def in_loop_thread(self):
+        return threading.current_thread() is self.loop_thread
+
+    def reset_connection_state(self, host, port, resume=False):
+        self.running = True
+        self.server_host = host
+        self.server_port = port
+        self.valid_connection = False
+        self.connection_processed = False
+        self.handshake_completed = False
+        self.connection_verified = False
+        self.codec = JSON_CODEC
+        if not resume:
+            self.end_session()
+        self.reset_heartbeat()
+
+    def start_server(self, host, port, resume=False):
+        """Start a server to accept client connections"""
+        if self.running:
+            self.stop()
+
+        self.reset_connection_state(host, port, resume)
+        self.log(f"Starting server on {host}:{port}")
+        self.start_loop()
+        self.submit(self.serve(host, port))
+
+    async def serve(self, host, port):
+        try:
+            self.server = await asyncio.start_server(self.accept_client, host, port, reuse_address=True)
+        except OSError as e:
+            if e.errno in (errno.EADDRINUSE, 10048):  # Address already in use
+                self.error.emit(f"Port {port} is already in use. Try a different port.")
+            elif e.errno in (errno.EADDRNOTAVAIL, 10049):  # Cannot assign requested address
+                self.error.emit(f"Cannot bind to {host}. Try using 127.0.0.1 instead.")
+            else:
+                self.error.emit(f"Socket error: {str(e)}")
+            self.running = False
+            self.server_is_running = False
+            self.server_status_changed.emit(False, f"Server failed to start on {host}:{port}")
+            self.log(f"Server failed to start: {str(e)}")
+            return
+
+        self.server_is_running = True
+        self.server_status_changed.emit(True, f"Server running on {host}:{port}")
+        self.log(f"Server bound to {host}:{port} and listening")
+        self.connected.emit(True, f"Server started on {host}:{port}. Waiting for client...")
+
+    async def accept_client(self, reader, writer):
+        if self.writer is not None or not self.running:
+            # One opponent per game, like the threaded server
+            self.log("Rejecting additional client connection")
+            writer.close()
+            return
+
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            self.client_address = writer.get_extra_info("peername")[:2]
+            self.statusMessage(f"TCP connection established with {self.client_address[0]}:{self.client_address[1]}. Waiting for handshake...")
+            verified = await self.handle_connection(reader, writer)
+            # The game is over for this server once its client is gone, but
+            # status probes and aborted handshakes leave it listening
+            if verified and self.server:
+                self.server.close()
+                self.server = None
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.tasks.discard(task)
+
+    def connect_to_server(self, host, port, resume=False):
+        """Connect to a server as a client"""
+        if self.running:
+            self.stop()
+
+        self.reset_connection_state(host, port, resume)
+        self.log(f"Attempting to connect to server at {host}:{port}")
+        self.start_loop()
+        self.submit(self.connect(host, port))
+
+    async def connect(self, host, port):
+        attempts = 0
+        while attempts < self.retry_attempts and self.running:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                attempts += 1
+                if isinstance(e, ConnectionRefusedError):
+                    error_msg = f"Connection refused. The server at {host}:{port} is not running or not accepting connections."
+                elif isinstance(e, asyncio.TimeoutError):
+                    error_msg = f"Connection to {host}:{port} timed out."
+                else:
+                    error_msg = f"Socket error: {str(e)}"
+
+                if attempts < self.retry_attempts:
+                    self.error.emit(f"{error_msg} Retrying in {self.retry_delay} seconds... (Attempt {attempts}/{self.retry_attempts})")
+                    await asyncio.sleep(self.retry_delay)
+                else:
+                    self.connected.emit(False, f"{error_msg} All retry attempts failed.")
+                continue
+
+            # A resumed session sends again only after the handshake replayed its log
+            self.valid_connection = self.session_token is None
+            self.connected.emit(True, f"Connected to server at {host}:{port}")
+            await self.handle_connection(reader, writer, on_open=self.send_handshake_request)
+            return
+
+        if self.running:
+            self.running = False
+            self.valid_connection = False
+            self.connection_verified = False
+
+    async def handle_connection(self, reader, writer, on_open=None):
+        """Read framed messages until the peer disconnects or stop() is called
+
+        Returns True if the connection completed its handshake.
+        """
+        self.log("Starting message handler")
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        with self.send_lock:
+            self.pending_frames = 0
+        self.send_queue = asyncio.Queue()
+        self.writer = writer
+        sender = asyncio.ensure_future(self.drain_send_queue(writer))
+        heartbeat = asyncio.ensure_future(self.send_heartbeats())
+        verified = False
+
+        try:
+            if on_open:
+                on_open()
+
+            while self.running:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                (length,) = FRAME_HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    self.error.emit(f"Protocol error: Frame length {length} exceeds limit of {MAX_FRAME_SIZE} bytes")
+                    self.valid_connection = False
+                    self.connection_verified = False
+                    break
+                payload = await reader.readexactly(length)
+                keep_running = self.process_payload(payload)
+                verified = verified or self.connection_verified
+                if not keep_running:
+                    break
+
+        except asyncio.IncompleteReadError:
+            if self.server is not None and not verified:
+                # Status probe or a client that left before its handshake
+                self.log("Connection closed before handshake")
+                return verified
+            self.log("Connection closed by remote host")
+            self.report_disconnect("Connection closed by remote host")
+            self.valid_connection = False
+            self.connection_processed = False
+            self.connection_verified = False
+        except OSError as e:
+            if self.running and not self.disconnect_reported:
+                self.error.emit(f"Socket error: {str(e)}")
+                self.log(f"Socket error in handle_connection: {str(e)}")
+            self.valid_connection = False
+            self.connection_verified = False
+        finally:
+            sender.cancel()
+            heartbeat.cancel()
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            self.log("Message handler ended")
+        return verified
+
+    async def send_heartbeats(self):
+        """Ping the peer from the loop, whatever the GUI thread is doing"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval / 1000.0)
+            self.send_heartbeat()
+
+    async def drain_send_queue(self, writer):
+        """Write queued frames, waiting whenever the peer falls behind"""
+        try:
+            while True:
+                frames = [await self.send_queue.get()]
+                # Coalesce whatever else is already queued into one write
+                while not self.send_queue.empty():
+                    frames.append(self.send_queue.get_nowait())
+                writer.write(b"".join(frames))
+                await writer.drain()
+                with self.send_lock:
+                    self.pending_frames -= len(frames)
+        except OSError as e:
+            if self.running:
+                self.error.emit(f"Error sending message: {str(e)}")
+            self.valid_connection = False
+
+    def has_connection(self):
+        return self.writer is not None
+
+    def write_frame(self, payload):
+        """Queue one encoded message for the writer task, never blocks"""
+        frame = frame_message(payload)
+        with self.send_lock:
+            if self.writer is None:
+                raise ConnectionError("Not connected")
+            if self.pending_frames >= self.max_pending_frames:
+                raise ConnectionError(f"Send queue full ({self.pending_frames} messages pending)")
+            self.pending_frames += 1
+        self.loop.call_soon_threadsafe(self.send_queue.put_nowait, frame)
+
+    def wait_for_send(self):
+        # Queued frames go out in order, nothing to wait for
+        pass
+
+    def close_connection(self):
+        if self.writer is None:
+            return
+        if self.in_loop_thread():
+            self.writer.close()
+        else:
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+    def cleanup(self):
+        """Cancel every connection task and close the listening socket
+
+        Never waits: the shutdown runs on the loop, and tasks submitted
+        after this call start once it has finished.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        if self.in_loop_thread():
+            self.begin_shutdown()
+        else:
+            self.loop.call_soon_threadsafe(self.begin_shutdown)
+
+    def begin_shutdown(self):
+        self.shutdown_task = self.loop.create_task(self.shutdown())
+        self.shutdown_task.add_done_callback(self.shutdown_done)
+
+    def shutdown_done(self, task):
+        if not task.cancelled() and task.exception():
+            self.log(f"Error during network shutdown: {str(task.exception())}")
+
+    async def shutdown(self):
+        server = self.server
+        self.server = None
+        if server:
+            server.close()
+
+        current = asyncio.current_task()
+        tasks = [task for task in self.tasks if task is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+
+        if server:
+            await server.wait_closed()
+        if self.server is None:
+            # Unless a new server was started in the meantime
+            self.server_is_running = False
@@ -0,0 +1,411 @@
+"""
+Micro-benchmarks for Expansion War.
+
+Times the hot paths of the game on generated boards of 10 to 10000 units:
+the simulation tick, unit painting, game state collection and loading,
+saving and loading through DatabaseHandler, message encoding and decoding
+with both codecs, and framed message throughput over a loopback socket.
+The GUI benchmarks (MainWindow.increment_all_units, Unit.paint at 1:1
+and zoomed out, sync_owner, move highlighting, the EdgeLayer,
+get_current_game_state and apply_game_state) run on an offscreen
+QApplication and are skipped when PyQt5 is not installed.
+
+Results can be saved as a baseline and later runs compared against it.
+Comparisons use the best batch of each benchmark, which is far less noisy
+than the median on a busy machine; a benchmark that got slower by more
+than --threshold is reported as a regression and makes the run exit with
+status 1. Baselines are only comparable on the same machine, and shared
+or virtual machines need a larger threshold.
+
+Usage:
+    python benchmarks.py --save benchmark_baseline.json
+    python benchmarks.py --compare benchmark_baseline.json
+    python benchmarks.py --filter tick --sizes 1000 10000
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from board_arrays import NUMPY_AVAILABLE
+from db_handler import DatabaseHandler
+from game_engine import GameEngine, PLAYER, PC, NEUTRAL
+from message_codec import BINARY_CODEC, JSON_CODEC
+from network_protocol import FrameBuffer, NetworkMessage, frame_message
+
+try:
+    from PyQt5.QtWidgets import QApplication
+    QT_AVAILABLE = True
+except ImportError:
+    QT_AVAILABLE = False
+
+SIZES = (10, 100, 1000, 10000)
+
+
+def make_units(count, seed=0):
+    """Saved game unit dicts for a random board with two links per unit"""
+    rng = random.Random(seed)
+    columns = max(1, int(count ** 0.5))
+    units = []
+    for unit_id in range(count):
+        owner = (PLAYER, PC, NEUTRAL)[unit_id % 3]
+        unit = {
+            "id": unit_id, "owner": owner, "value": rng.randint(1, 30),
+            "x": (unit_id % columns) * 60, "y": (unit_id // columns) * 60, "size": 40,
+            "connections": []
+        }
+        if owner == NEUTRAL:
+            unit["player_points"] = rng.randint(0, 5)
+            unit["pc_points"] = rng.randint(0, 5)
+        units.append(unit)
+    if count > 1:
+        for unit in units:
+            for _ in range(2):
+                other = rng.randrange(count)
+                if other != unit["id"] and other not in unit["connections"]:
+                    unit["connections"].append(other)
+    return units
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the prints of the code being measured"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def make_game_state(count):
+    return {"level": 1, "tick": 0, "current_turn": PLAYER, "game_mode": "Single Player",
+            "player_units": count // 3, "pc_units": count // 3, "units": make_units(count)}
+
+
+def measure(op, min_time=0.05, repeats=5):
+    """Median and best seconds per call of op, over repeats batches of calls
+
+    The garbage collector is paused while timing, as timeit does.
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return measure_batches(op, min_time, repeats)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure_batches(op, min_time, repeats):
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            op()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or calls >= 1 << 20:
+            break
+        calls *= 2
+
+    times = [elapsed / calls]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            op()
+        times.append((time.perf_counter() - started) / calls)
+    return {"median_us": round(statistics.median(times) * 1e6, 3),
+            "best_us": round(min(times) * 1e6, 3), "calls": calls}
+
+
+def engine_benchmarks(sizes):
+    """(name, op) pairs for the headless engine"""
+    for size in sizes:
+        # tick[] always measures the sequential rules so results compare across machines
+        engine = GameEngine(vectorize_threshold=None)
+        engine.load_state(make_units(size))
+        yield f"tick[{size}]", engine.tick
+        if NUMPY_AVAILABLE:
+            vectorized = GameEngine(vectorize_threshold=0)
+            vectorized.load_state(make_units(size))
+            yield f"tick_vectorized[{size}]", vectorized.tick
+
+        units = engine.board.to_dicts()
+        yield f"board_to_dicts[{size}]", engine.board.to_dicts
+        yield f"board_load_state[{size}]", lambda engine=GameEngine(), units=units: engine.load_state(units)
+        yield f"board_copy[{size}]", engine.board.copy
+
+
+def storage_benchmarks(sizes, directory):
+    handler = DatabaseHandler()
+    for size in sizes:
+        game_state = make_game_state(size)
+        json_path = os.path.join(directory, f"bench_{size}.json")
+        xml_path = os.path.join(directory, f"bench_{size}.xml")
+        handler.save_to_json_file(game_state, json_path)
+        handler.save_to_xml_file(game_state, xml_path)
+        yield f"json_save[{size}]", lambda state=game_state, path=json_path: handler.save_to_json_file(state, path)
+        yield f"json_load[{size}]", lambda path=json_path: handler.load_from_json_file(path)
+        yield f"xml_save[{size}]", lambda state=game_state, path=xml_path: handler.save_to_xml_file(state, path)
+        yield f"xml_load[{size}]", lambda path=xml_path: handler.load_from_xml_file(path)
+
+
+def codec_benchmarks(sizes):
+    action = NetworkMessage(NetworkMessage.ACTION, {"type": "connect", "source_id": 12, "target_id": 345,
+                                                    "tick": 1000, "action_seq": 7}, seq=42)
+    messages = [("action", action)]
+    messages += [(f"game_state[{size}]", NetworkMessage(NetworkMessage.GAME_STATE, make_game_state(size), seq=1))
+                 for size in sizes]
+    for label, message in messages:
+        for codec in (JSON_CODEC, BINARY_CODEC):
+            payload = message.encode(codec)
+            yield f"encode_{codec.name}_{label}", lambda message=message, codec=codec: message.encode(codec)
+            yield f"decode_{codec.name}_{label}", lambda payload=payload: NetworkMessage.decode(payload)
+
+
+class LoopbackLink:
+    """A TCP connection to a thread on this machine that decodes every frame"""
+
+    def __init__(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        self.sender = socket.create_connection(listener.getsockname())
+        self.sender.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.receiver, _ = listener.accept()
+        listener.close()
+        self.received = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.receive, daemon=True)
+        self.thread.start()
+
+    def receive(self):
+        frames = FrameBuffer()
+        while True:
+            data = self.receiver.recv(65536)
+            if not data:
+                return
+            decoded = [NetworkMessage.decode(payload) for payload in frames.feed(data)]
+            if decoded:
+                with self.condition:
+                    self.received += len(decoded)
+                    self.condition.notify()
+
+    def send_batch(self, frame, count):
+        """Send count copies of frame and wait until all were decoded"""
+        with self.condition:
+            target = self.received + count
+        self.sender.sendall(frame * count)
+        with self.condition:
+            self.condition.wait_for(lambda: self.received >= target)
+
+    def close(self):
+        self.sender.close()
+        self.thread.join()
+        self.receiver.close()
+
+
+def loopback_benchmarks(sizes, link):
+    """Per-message time of framed messages sent through the loopback link"""
+    action = NetworkMessage(NetworkMessage.ACTION, {"type": "connect", "source_id": 12, "target_id": 345,
+                                                    "tick": 1000, "action_seq": 7}, seq=42)
+    for codec in (JSON_CODEC, BINARY_CODEC):
+        frame = frame_message(action.encode(codec))
+        yield f"loopback_{codec.name}_action_x100", lambda frame=frame: link.send_batch(frame, 100)
+        for size in sizes:
+            message = NetworkMessage(NetworkMessage.GAME_STATE, make_game_state(size), seq=1)
+            frame = frame_message(message.encode(codec))
+            yield f"loopback_{codec.name}_game_state[{size}]", lambda frame=frame: link.send_batch(frame, 1)
+
+
+def gui_benchmarks(sizes):
+    """MainWindow and Unit paths, on an offscreen QApplication"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtGui import QImage, QPainter, QTransform
+    from PyQt5.QtWidgets import QStyleOptionGraphicsItem
+    import main
+
+    app = QApplication.instance() or QApplication([])
+    with quiet():
+        window = main.MainWindow()
+    window.stop_simulation()
+    window.set_bot(None)
+    window.show_game_over_dialog = lambda winner: None
+    image = QImage(800, 600, QImage.Format_ARGB32)
+    option = QStyleOptionGraphicsItem()
+
+    for size in sizes:
+        game_state = make_game_state(size)
+        with quiet():
+            window.apply_game_state(game_state)
+        window.stop_simulation()
+        yield f"increment_all_units[{size}]", window.increment_all_units
+        yield f"get_current_game_state[{size}]", window.get_current_game_state
+
+        def apply_state(game_state=game_state):
+            window.apply_game_state(game_state)
+            window.stop_simulation()
+        yield f"apply_game_state[{size}]", apply_state
+
+        units = list(window.unit_map.values())
+
+        def paint_units(units=units):
+            painter = QPainter(image)
+            for unit in units:
+                unit.paint(painter, option)
+            painter.end()
+        yield f"unit_paint_all[{size}]", paint_units
+
+        def paint_units_zoomed_out(units=units):
+            painter = QPainter(image)
+            painter.setTransform(QTransform.fromScale(0.1, 0.1))
+            for unit in units:
+                unit.paint(painter, option)
+            painter.end()
+        yield f"unit_paint_all_zoomed_out[{size}]", paint_units_zoomed_out
+
+        def flip_owners(units=units):
+            # Every base changing hands, as in a mass capture
+            for unit in units:
+                window.engine.board.set_owner(unit.state, "pc" if unit.state.owner == "player" else "player")
+                unit.sync_owner()
+        yield f"owner_flip_all[{size}]", flip_owners
+
+        def click_unit(unit=units[0]):
+            # A plain click clears the highlights, a Ctrl+click shows the moves
+            unit.clear_all_highlights()
+            window.handle_selection_changed()
+            unit.show_possible_moves()
+            unit.clear_all_highlights()
+        yield f"click_highlight_moves[{size}]", click_unit
+
+        def paint_edges():
+            painter = QPainter(image)
+            window.edge_layer.paint(painter, option)
+            painter.end()
+        yield f"edge_layer_paint[{size}]", paint_edges
+
+        def paint_edges_zoomed_out():
+            painter = QPainter(image)
+            painter.setTransform(QTransform.fromScale(0.1, 0.1))
+            window.edge_layer.paint(painter, option)
+            painter.end()
+        yield f"edge_layer_paint_zoomed_out[{size}]", paint_edges_zoomed_out
+
+        source, target = units[0], units[-1]
+
+        def toggle_connection(source=source.state, target=target.state):
+            # What Unit.connect_to and disconnect_from do, without ending the turn
+            window.engine.connect(source, target)
+            window.edge_layer.refresh((source.unit_id, target.unit_id))
+            window.engine.disconnect(source, target)
+            window.edge_layer.refresh((source.unit_id, target.unit_id))
+        yield f"connect_disconnect_refresh[{size}]", toggle_connection
+
+        def full_refresh():
+            window.engine.board.touch()
+            window.edge_layer.refresh()
+        yield f"edge_layer_full_refresh[{size}]", full_refresh
+    app.processEvents()
+
+
+def run(sizes, name_filter=None, gui=True, min_time=0.05, repeats=5):
+    """Run every benchmark matching name_filter, returns {name: timings}"""
+    results = {}
+    link = LoopbackLink()
+    with tempfile.TemporaryDirectory() as directory:
+        groups = [engine_benchmarks(sizes), storage_benchmarks(sizes, directory), codec_benchmarks(sizes),
+                  loopback_benchmarks(sizes, link)]
+        if gui and QT_AVAILABLE:
+            groups.append(gui_benchmarks(sizes))
+        for group in groups:
+            for name, op in group:
+                if name_filter and name_filter not in name:
+                    continue
+                # GUI code prints a lot, keep it out of the report
+                with quiet():
+                    results[name] = measure(op, min_time, repeats)
+                print(f"{name:<44} {format_time(results[name]['median_us']):>12}")
+    link.close()
+    return results
+
+
+def format_time(microseconds):
+    if microseconds >= 1e6:
+        return f"{microseconds / 1e6:.2f} s"
+    if microseconds >= 1e3:
+        return f"{microseconds / 1e3:.2f} ms"
+    return f"{microseconds:.2f} us"
+
+
+def environment():
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": NUMPY_AVAILABLE,
+        "qt": QT_AVAILABLE
+    }
+
+
+def compare(results, baseline, threshold=0.15):
+    """Print the change of every benchmark against baseline, returns the regressions"""
+    regressions = []
+    for name, timing in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<44} {format_time(timing['best_us']):>12}   (new)")
+            continue
+        ratio = timing["best_us"] / base["best_us"] if base["best_us"] else 1.0
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = ""
+        print(f"{name:<44} {format_time(base['best_us']):>12} -> {format_time(timing['best_us']):>12}"
+              f"  x{ratio:.2f} {verdict}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expansion War micro-benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="Board sizes in units")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--no-gui", action="store_true", help="Skip the benchmarks that need PyQt5")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per timed batch")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed batches per benchmark")
+    parser.add_argument("--save", help="Write the results to this file")
+    parser.add_argument("--compare", help="Compare with the results saved in this file")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.filter, gui=not args.no_gui, min_time=args.min_time, repeats=args.repeats)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        print(f"Results saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} ({baseline['environment']['date']}, "
+              f"Python {baseline['environment']['python']}):")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
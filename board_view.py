@@ -0,0 +1,110 @@
+from PyQt5.QtWidgets import QGraphicsView
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter
+
+MIN_ZOOM = 0.02
+MAX_ZOOM = 8.0
+ZOOM_STEP = 1.25  # Per wheel notch
+BOARD_AREA = QRectF(0, 0, 800, 600)  # The scene is never smaller than the original board
+BOARD_MARGIN = 40
+
+
+def board_rect(board):
+    """Scene rect holding every base of a BoardState"""
+    rect = QRectF(BOARD_AREA)
+    if len(board):
+        left = min(state.x for state in board)
+        top = min(state.y for state in board)
+        right = max(state.x + state.size for state in board)
+        bottom = max(state.y + state.size for state in board)
+        rect = rect.united(QRectF(left, top, right - left, bottom - top).adjusted(
+            -BOARD_MARGIN, -BOARD_MARGIN, BOARD_MARGIN, BOARD_MARGIN))
+    return rect
+
+
+class BoardView(QGraphicsView):
+    """Board view with wheel zoom, middle-button panning and fit to board
+
+    Units and the EdgeLayer pick their level of detail from the view
+    transform, and the scene only paints items in the exposed region, so
+    zooming out on a large map or panning around it stays cheap.
+    Home fits the whole board in the window.
+    """
+
+    def __init__(self, scene, parent=None):
+        super().__init__(scene, parent)
+        self.setRenderHint(QPainter.Antialiasing)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+        # A tick repaints every visible base; clipping to hundreds of small
+        # rects makes each edge line far slower to draw than one big rect
+        self.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
+        self.pan_start = None
+        self.fit_pending = False  # A fit asked for before the view had its size
+
+    def zoom(self):
+        return self.transform().m11()
+
+    def set_zoom(self, zoom):
+        zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+        factor = zoom / self.zoom()
+        self.scale(factor, factor)
+
+    def fit_board(self):
+        """Show the whole scene, zooming out when needed but never in"""
+        rect = self.sceneRect()
+        viewport = self.viewport().rect()
+        if not self.isVisible() or rect.isEmpty() or viewport.isEmpty():
+            self.fit_pending = True
+            return
+        self.fit_pending = False
+        self.set_zoom(min(1.0, viewport.width() / rect.width(), viewport.height() / rect.height()))
+        self.centerOn(rect.center())
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.fit_pending:
+            self.fit_board()
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if steps:
+            # Keep the board point under the mouse where it is
+            anchor = self.mapToScene(event.pos())
+            self.set_zoom(self.zoom() * ZOOM_STEP ** steps)
+            offset = self.mapFromScene(anchor) - event.pos()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() + offset.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() + offset.y())
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MiddleButton:
+            self.pan_start = event.pos()
+            self.viewport().setCursor(Qt.ClosedHandCursor)
+            event.accept()
+            return
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.pan_start is not None:
+            delta = event.pos() - self.pan_start
+            self.pan_start = event.pos()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
+            event.accept()
+            return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MiddleButton and self.pan_start is not None:
+            self.pan_start = None
+            self.viewport().unsetCursor()
+            event.accept()
+            return
+        super().mouseReleaseEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Home:
+            self.fit_board()
+            event.accept()
+            return
+        super().keyPressEvent(event)
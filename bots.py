@@ -0,0 +1,431 @@
+"""
+Computer opponents for Expansion War.
+
+A bot looks at a BoardState and picks one connect/disconnect action (or
+None to pass) for its side, in the same format Unit.connect_to and
+Unit.disconnect_from produce, so the result can go through the normal
+action path. Bots only use the headless engine: they never touch Qt and
+are meant to run off the GUI thread on a private copy of the board.
+
+GreedyBot plays the action whose board looks best when its next turn comes
+around. SearchBot looks several turns ahead with alpha-beta over the most
+promising actions of each side and deepens until its time budget runs out.
+MCTSBot runs Monte Carlo tree search with random playouts, spread over a
+pool of worker processes so it uses every core.
+"""
+
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from game_engine import BoardState, GameEngine, PLAYER, NEUTRAL, other_side
+from state_sync import replay_action
+
+UNIT_SCORE = 20  # Worth of owning a base on top of its value
+CAPTURE_SCORE = 2  # Worth of one capture point on a neutral base
+WIN_SCORE = 100000
+ROLLOUT_SCALE = 50  # Score difference that makes a playout worth about 0.73 of a win
+RESULT_GRACE = 0.1  # Seconds a worker may take past the deadline to send its tree back
+
+
+def evaluate(board, side):
+    """Score the board from side's point of view, higher is better"""
+    opponent = other_side(side)
+    if not board.count(opponent) and board.count(side):
+        return WIN_SCORE
+    if not board.count(side) and board.count(opponent):
+        return -WIN_SCORE
+
+    score = 0
+    for state in board:
+        if state.owner == side:
+            score += state.value + UNIT_SCORE
+        elif state.owner == opponent:
+            score -= state.value + UNIT_SCORE
+        elif state.owner == NEUTRAL:
+            own_points, opponent_points = state.player_points, state.pc_points
+            if side != PLAYER:
+                own_points, opponent_points = opponent_points, own_points
+            score += (own_points - opponent_points) * CAPTURE_SCORE
+    return score
+
+
+def legal_actions(board, side):
+    """Every action side can take, connects before disconnects"""
+    sources = board.units_of(side)
+    actions = []
+    for source in sources:
+        connected = {other.unit_id for other in source.connections}
+        for target in board:
+            if target is not source and target.unit_id not in connected:
+                actions.append({"type": "connect", "source_id": source.unit_id, "target_id": target.unit_id})
+    for source in sources:
+        for other in source.connections:
+            actions.append({"type": "disconnect", "source_id": source.unit_id, "target_id": other.unit_id})
+    return actions
+
+
+def play_turn(engine, action, ticks):
+    """Apply action (None passes) and run a turn of ticks, stopping at a win"""
+    if action is not None:
+        replay_action(engine, action)
+    for _ in range(ticks):
+        if engine.winner():
+            break
+        engine.tick()
+
+
+def simulate(board, action, ticks):
+    """Return a copy of the board after action and the given number of ticks"""
+    engine = GameEngine(board.copy())
+    play_turn(engine, action, ticks)
+    return engine.board
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when the time budget is used up or it is stopped"""
+
+
+class Bot:
+    """Chooses actions for one side of the board
+
+    ticks_per_turn is how many engine ticks a turn is expected to last,
+    bots look ahead in whole turns. stop() may be called from another
+    thread to make a running choose_action() return early.
+    """
+
+    name = "bot"
+
+    def __init__(self, ticks_per_turn=5):
+        self.ticks_per_turn = ticks_per_turn
+        self.deadline = 0  # time.monotonic() at which thinking must stop
+        self.stats = {}  # Figures about the last decision, for logging
+
+    def stop(self):
+        self.deadline = 0
+
+    def time_up(self):
+        return time.monotonic() >= self.deadline
+
+    def check_time(self):
+        if self.time_up():
+            raise SearchTimeout()
+
+    def warm_up(self):
+        """Get ready to move, e.g. at level start, so the first move keeps its budget"""
+
+    def close(self):
+        """Release anything the bot keeps between moves"""
+
+    def choose_action(self, board, side, time_budget=1.0):
+        """Return an action dict for side, or None to pass
+
+        The board is not modified. time_budget is in seconds of wall time.
+        """
+        raise NotImplementedError
+
+
+class GreedyBot(Bot):
+    """Plays the action that looks best at the start of its next turn"""
+
+    name = "greedy"
+
+    def choose_action(self, board, side, time_budget=1.0):
+        self.deadline = time.monotonic() + time_budget
+        horizon = 2 * self.ticks_per_turn
+        best_action = None
+        best_score = evaluate(simulate(board, None, horizon), side)
+        evaluated = 1
+        for action in legal_actions(board, side):
+            if self.time_up():
+                break
+            score = evaluate(simulate(board, action, horizon), side)
+            evaluated += 1
+            if score > best_score:
+                best_action, best_score = action, score
+        self.stats = {"evaluated": evaluated, "score": best_score}
+        return best_action
+
+
+class SearchBot(Bot):
+    """Alpha-beta search over whole turns with iterative deepening
+
+    Each ply is one side's action followed by a turn of ticks. Only the
+    beam_width actions that look best after their own turn are searched
+    further, which keeps the tree small enough to deepen within a turn.
+    """
+
+    name = "search"
+
+    def __init__(self, ticks_per_turn=5, beam_width=6, max_depth=8):
+        super().__init__(ticks_per_turn)
+        self.beam_width = beam_width
+        self.max_depth = max_depth
+
+    def choose_action(self, board, side, time_budget=1.0):
+        self.deadline = time.monotonic() + time_budget
+        self.nodes = 0
+        best_action = None
+        best_score = None
+        depth = 0
+        try:
+            for depth in range(1, self.max_depth + 1):
+                best_action, best_score = self.search_root(board, side, depth)
+                if abs(best_score) >= WIN_SCORE:
+                    break
+        except SearchTimeout:
+            depth -= 1  # The last depth did not finish, keep the previous result
+        self.stats = {"depth": depth, "nodes": self.nodes, "score": best_score}
+        return best_action
+
+    def ordered_children(self, board, side):
+        """(action, board after the action and a turn) pairs, best first for side"""
+        children = []
+        for action in [None] + legal_actions(board, side):
+            self.check_time()
+            child = simulate(board, action, self.ticks_per_turn)
+            children.append((evaluate(child, side), len(children), action, child))
+        children.sort(key=lambda item: (-item[0], item[1]))
+        return [(action, child) for _, _, action, child in children[:self.beam_width]]
+
+    def search_root(self, board, side, depth):
+        best_action, best_score = None, None
+        alpha = -WIN_SCORE - 1
+        for action, child in self.ordered_children(board, side):
+            score = -self.negamax(child, other_side(side), depth - 1, -WIN_SCORE - 1, -alpha)
+            if best_score is None or score > best_score:
+                best_action, best_score = action, score
+            alpha = max(alpha, score)
+        return best_action, best_score
+
+    def negamax(self, board, side, depth, alpha, beta):
+        """Value of the board for side to move, searched depth plies deep"""
+        self.nodes += 1
+        if depth == 0 or board.count(side) == 0 or board.count(other_side(side)) == 0:
+            return evaluate(board, side)
+
+        best = -WIN_SCORE - 1
+        for _, child in self.ordered_children(board, side):
+            score = -self.negamax(child, other_side(side), depth - 1, -beta, -alpha)
+            best = max(best, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        return best
+
+
+def random_action(board, side, rng, pass_probability=0.2):
+    """Cheap playout move: toggle the link between an own base and a random unit"""
+    sources = board.units_of(side)
+    if not sources or len(board) < 2 or rng.random() < pass_probability:
+        return None
+    source = rng.choice(sources)
+    target = rng.choice(list(board.units.values()))
+    if target is source:
+        return None
+    action_type = "disconnect" if target in source.connections else "connect"
+    return {"type": action_type, "source_id": source.unit_id, "target_id": target.unit_id}
+
+
+def rollout_reward(board, side):
+    """Playout result for side between 0 (lost) and 1 (won)"""
+    score = evaluate(board, side)
+    if abs(score) >= WIN_SCORE:
+        return 1.0 if score > 0 else 0.0
+    return 1 / (1 + math.exp(-score / ROLLOUT_SCALE))
+
+
+class MCTSNode:
+    """A position reached by playing action, mover is the side that played it"""
+
+    __slots__ = ("parent", "action", "mover", "children", "untried", "visits", "wins")
+
+    def __init__(self, parent=None, action=None, mover=None):
+        self.parent = parent
+        self.action = action
+        self.mover = mover
+        self.children = []
+        self.untried = None  # Actions not expanded yet, filled on the first visit
+        self.visits = 0
+        self.wins = 0.0  # Sum of playout rewards for mover
+
+    def select_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+
+def action_key(action):
+    return None if action is None else (action["type"], action["source_id"], action["target_id"])
+
+
+# Set in MCTSBot worker processes, lets stop() end their searches early
+worker_stop_event = None
+
+
+def init_worker(stop_event):
+    global worker_stop_event
+    worker_stop_event = stop_event
+
+
+def run_mcts(units_data, side, time_budget, ticks_per_turn=5, rollout_depth=4,
+             exploration=1.4, seed=None, time_up=None, deadline=None):
+    """Search from the given board for time_budget seconds or until time_up()
+
+    deadline is an absolute time.monotonic() that overrides time_budget, so
+    a search queued in a worker still ends with the move it was started for.
+    Returns ({action_key: (visits, wins)} for the root actions, rollouts).
+    Kept at module level so worker processes can run it.
+    """
+    root_board = BoardState()
+    root_board.load_dicts(units_data)
+    rng = random.Random(seed)
+    root = MCTSNode()
+    if deadline is None:
+        deadline = time.monotonic() + time_budget
+    if time_up is None:
+        stop_event = worker_stop_event
+        time_up = lambda: time.monotonic() >= deadline or (stop_event is not None and stop_event.is_set())
+    rollouts = 0
+
+    while rollouts == 0 or not time_up():
+        engine = GameEngine(root_board.copy())
+        node, to_move = root, side
+
+        # Selection: follow the tree while every action of a node has been tried
+        while node.untried is not None and not node.untried and node.children:
+            node = node.select_child(exploration)
+            play_turn(engine, node.action, ticks_per_turn)
+            to_move = other_side(to_move)
+
+        # Expansion
+        if node.untried is None:
+            node.untried = [None] + legal_actions(engine.board, to_move)
+            rng.shuffle(node.untried)
+        if node.untried and not engine.winner():
+            action = node.untried.pop()
+            child = MCTSNode(node, action, to_move)
+            node.children.append(child)
+            node = child
+            play_turn(engine, action, ticks_per_turn)
+            to_move = other_side(to_move)
+
+        # Playout
+        for _ in range(rollout_depth):
+            if engine.winner():
+                break
+            play_turn(engine, random_action(engine.board, to_move, rng), ticks_per_turn)
+            to_move = other_side(to_move)
+        reward = rollout_reward(engine.board, side)
+        rollouts += 1
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            node.wins += reward if node.mover == side else 1 - reward
+            node = node.parent
+
+    return {action_key(child.action): (child.visits, child.wins) for child in root.children}, rollouts
+
+
+class MCTSBot(Bot):
+    """Monte Carlo tree search with root parallelisation
+
+    Every worker process grows its own tree from the current board for the
+    whole time budget; their root statistics are added up and the most
+    visited action is played. Each playout plays rollout_depth turns of
+    random moves. workers defaults to the number of CPUs, 1 searches in the
+    calling thread without a pool.
+
+    The pool is started by warm_up(), spawning workers takes a while. They
+    stop at the move's deadline or when stop() is called; a worker that is
+    late anyway is left out of the result.
+    """
+
+    name = "mcts"
+
+    def __init__(self, ticks_per_turn=5, rollout_depth=4, workers=None, exploration=1.4):
+        super().__init__(ticks_per_turn)
+        self.rollout_depth = rollout_depth
+        self.workers = workers or os.cpu_count() or 1
+        self.exploration = exploration
+        self.pool = None
+        self.stop_event = None
+
+    def warm_up(self):
+        if self.workers == 1 or self.pool is not None:
+            return
+        # Spawned workers do not inherit the GUI's threads or Qt state
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=context,
+                                        initializer=init_worker, initargs=(self.stop_event,))
+        # Workers start on demand, give each one a task so all are up before the first move
+        for _ in range(self.workers):
+            self.pool.submit(os.getpid)
+
+    def stop(self):
+        super().stop()
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def choose_action(self, board, side, time_budget=1.0):
+        deadline = self.deadline = time.monotonic() + time_budget
+        started = time.monotonic()
+        units_data = board.to_dicts()
+        args = (side, time_budget, self.ticks_per_turn, self.rollout_depth, self.exploration)
+
+        if self.workers == 1:
+            results = [run_mcts(units_data, *args, seed=random.getrandbits(32), time_up=self.time_up)]
+        else:
+            self.warm_up()
+            self.stop_event.clear()
+            seeds = [random.getrandbits(32) for _ in range(self.workers)]
+            futures = [self.pool.submit(run_mcts, units_data, *args, seed=seed, deadline=deadline)
+                       for seed in seeds]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=max(0, deadline + RESULT_GRACE - time.monotonic())))
+                except FutureTimeoutError:
+                    future.cancel()
+
+        totals = {}
+        rollouts = 0
+        for root_stats, worker_rollouts in results:
+            rollouts += worker_rollouts
+            for key, (visits, wins) in root_stats.items():
+                total_visits, total_wins = totals.get(key, (0, 0.0))
+                totals[key] = (total_visits + visits, total_wins + wins)
+
+        elapsed = time.monotonic() - started
+        self.stats = {"rollouts": rollouts, "rollouts_per_sec": round(rollouts / elapsed) if elapsed else rollouts,
+                      "workers": self.workers}
+        if not self.deadline or not totals:
+            # Nothing searched, or stopped from outside and the result is not wanted
+            return None
+
+        key, (visits, wins) = max(totals.items(), key=lambda item: item[1][0])
+        self.stats["win_rate"] = round(wins / visits, 3)
+        if key is None:
+            return None
+        action_type, source_id, target_id = key
+        return {"type": action_type, "source_id": source_id, "target_id": target_id}
+
+    def close(self):
+        if self.pool is not None:
+            self.stop_event.set()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+BOTS = {bot.name: bot for bot in (GreedyBot, SearchBot, MCTSBot)}
+
+
+def create_bot(name, **kwargs):
+    """Build a bot by name, None for a human opponent"""
+    bot_class = BOTS.get(name)
+    return bot_class(**kwargs) if bot_class else None
@@ -16,6 +16,8 @@ class ConfigDialog(QDialog):
         self.ip_address = "127.0.0.1"
         self.port = 5000
         self.network_role = "server"  # Default to server role
+        self.opponents = [("Search bot", "search"), ("MCTS bot (all cores)", "mcts"), ("Greedy bot", "greedy"),
+                          ("Human (same computer)", None)]
         
         self.setup_ui()
         
@@ -38,6 +40,22 @@ class ConfigDialog(QDialog):
         mode_group.setLayout(mode_layout)
         main_layout.addWidget(mode_group)
         
+        # Who plays red in single player
+        self.opponent_box = QGroupBox("Red Opponent")
+        opponent_layout = QHBoxLayout()
+        self.opponent_group = QButtonGroup(self)
+        
+        for i, (label, name) in enumerate(self.opponents):
+            radio = QRadioButton(label)
+            if i == 0:
+                radio.setChecked(True)
+            self.opponent_group.addButton(radio, i)
+            opponent_layout.addWidget(radio)
+        opponent_layout.addStretch()
+        
+        self.opponent_box.setLayout(opponent_layout)
+        main_layout.addWidget(self.opponent_box)
+        
         # Network settings
         self.network_group = QGroupBox("Network Settings")
         self.network_group.setEnabled(False)
@@ -85,6 +103,23 @@ class ConfigDialog(QDialog):
         
         network_layout.addLayout(form_layout)
         
+        # Synchronisation mode, only the host's choice is used
+        sync_layout = QHBoxLayout()
+        self.sync_group = QButtonGroup(self)
+        
+        self.state_sync_radio = QRadioButton("State Sync")
+        self.lockstep_radio = QRadioButton("Lockstep (low bandwidth)")
+        self.state_sync_radio.setChecked(True)
+        self.lockstep_radio.setToolTip("Only actions are exchanged, both sides simulate the board")
+        
+        self.sync_group.addButton(self.state_sync_radio, 0)
+        self.sync_group.addButton(self.lockstep_radio, 1)
+        
+        sync_layout.addWidget(self.state_sync_radio)
+        sync_layout.addWidget(self.lockstep_radio)
+        sync_layout.addStretch()
+        network_layout.addLayout(sync_layout)
+        
         self.network_group.setLayout(network_layout)
         main_layout.addWidget(self.network_group)
         
@@ -108,6 +143,7 @@ class ConfigDialog(QDialog):
         
         # Enable network settings only for network game
         self.network_group.setEnabled(mode_idx == 2)
+        self.opponent_box.setEnabled(mode_idx == 0)
     
     def on_role_changed(self, button):
         if button == self.server_radio:
@@ -124,5 +160,7 @@ class ConfigDialog(QDialog):
             "game_mode": self.selected_mode,
             "ip_address": self.ip_input.text(),
             "port": self.port_input.value(),
-            "network_role": self.network_role
+            "network_role": self.network_role,
+            "sync_mode": "lockstep" if self.lockstep_radio.isChecked() else "state",
+            "opponent": self.opponents[self.opponent_group.checkedId()][1]
         }
@@ -0,0 +1,263 @@
+"""
+Connection layer for the Expansion War scene.
+
+Connections used to be drawn by every Unit item, twice per edge and outside
+the item's bounding rect, so any change needed a full scene repaint. Here a
+single EdgeLayer item sits below the units and draws every edge of the
+board in one drawLines() call. It repaints only the regions of edges that
+changed and finds the visible edges through a tile index. Zoomed far out,
+edges that join the same screen cells are merged into one line.
+"""
+
+from PyQt5.QtWidgets import QGraphicsItem
+from PyQt5.QtCore import Qt, QRectF, QPointF, QLineF
+from PyQt5.QtGui import QPen, QTransform
+
+EDGE_PEN = QPen(Qt.darkGray, 1, Qt.DashLine)
+# One pixel wide at any zoom, scaled pens go through a much slower stroker
+EDGE_PEN.setCosmetic(True)
+EDGE_MARGIN = 2  # Pen width plus antialiasing around every line
+FULL_UPDATE_EDGES = 100  # Beyond this many changed edges one repaint of the layer is cheaper
+TILE_SIZE = 400  # Edges are indexed by the tiles they cross so the exposed ones can be found
+AGGREGATE_ZOOM = 0.5  # Zoomed out further edges are merged per screen cell
+AGGREGATE_CELL = 12  # Smallest cell size in screen pixels
+MAX_AGGREGATE_LINES = 2000  # Cells grow until the merged lines are this few
+
+
+def edge_key(a, b):
+    return (a, b) if a <= b else (b, a)
+
+
+def line_rect(line):
+    x1, y1, x2, y2 = line
+    rect = QRectF(QPointF(x1, y1), QPointF(x2, y2)).normalized()
+    return rect.adjusted(-EDGE_MARGIN, -EDGE_MARGIN, EDGE_MARGIN, EDGE_MARGIN)
+
+
+def line_tiles(line):
+    """Keys of the TILE_SIZE tiles a line passes through, walked along the grid"""
+    x1, y1, x2, y2 = line
+    column, row = int(x1 // TILE_SIZE), int(y1 // TILE_SIZE)
+    end_column, end_row = int(x2 // TILE_SIZE), int(y2 // TILE_SIZE)
+    tiles = [(column, row)]
+    dx, dy = x2 - x1, y2 - y1
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # Line parameter of the next column and row border, and between borders
+    next_x = ((column + (step_x > 0)) * TILE_SIZE - x1) / dx if dx else float("inf")
+    next_y = ((row + (step_y > 0)) * TILE_SIZE - y1) / dy if dy else float("inf")
+    delta_x = TILE_SIZE / abs(dx) if dx else float("inf")
+    delta_y = TILE_SIZE / abs(dy) if dy else float("inf")
+    for _ in range(abs(end_column - column) + abs(end_row - row)):
+        if (next_x < next_y and column != end_column) or row == end_row:
+            column += step_x
+            next_x += delta_x
+        else:
+            row += step_y
+            next_y += delta_y
+        tiles.append((column, row))
+    return tiles
+
+
+def rect_tiles(rect):
+    """Keys of the TILE_SIZE tiles a rect overlaps"""
+    left, top = int(rect.left() // TILE_SIZE), int(rect.top() // TILE_SIZE)
+    right, bottom = int(rect.right() // TILE_SIZE), int(rect.bottom() // TILE_SIZE)
+    return [(column, row) for column in range(left, right + 1) for row in range(top, bottom + 1)]
+
+
+class EdgeLayer(QGraphicsItem):
+    """Draws every connection of a BoardState in one batched call
+
+    Each edge is drawn once, between the centres of its two bases, below
+    the unit items. refresh() compares the board with what was drawn last
+    and repaints only the regions of the edges that appeared, disappeared
+    or moved, so callers never need a full scene.update().
+
+    Only the edges crossing the exposed tiles are drawn. Zoomed out below
+    AGGREGATE_ZOOM the edges are merged into one line per pair of screen
+    cells they join, which keeps huge maps drawable.
+    """
+
+    def __init__(self, board):
+        super().__init__()
+        self.board = board
+        self.revision = None  # Board revision the edges were built from
+        self.edges = {}  # (low id, high id) -> (x1, y1, x2, y2)
+        self.lines = {}  # (low id, high id) -> QLineF
+        self.line_list = []  # self.lines.values() as drawLines() wants them, None when stale
+        self.incident = {}  # unit id -> keys of its edges
+        self.tiles = None  # (column, row) -> keys of the edges crossing the tile, built on first use
+        self.bounds = QRectF()
+        self.changes = 0  # Bumped whenever the drawn edges change
+        self.aggregate = None  # (zoom, changes) -> merged lines, for the last zoom drawn
+        self.aggregating = False  # Whether the last paint merged the edges
+        self.setZValue(-1)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setFlag(QGraphicsItem.ItemIsSelectable, False)
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.refresh()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        painter.setPen(EDGE_PEN)
+        transform = painter.worldTransform()
+        zoom = option.levelOfDetailFromTransform(transform)
+        self.aggregating = zoom < AGGREGATE_ZOOM and transform.type() <= QTransform.TxScale
+        if self.aggregating:
+            # The merged lines are in screen pixels, drawing them with only
+            # the translation also keeps the painter off the slow scaled path
+            painter.setClipRect(self.bounds, Qt.IntersectClip)
+            painter.setWorldTransform(QTransform.fromTranslate(transform.dx(), transform.dy()))
+            painter.drawLines(self.aggregated_lines(zoom))
+            return
+        painter.drawLines(self.exposed_lines(option.exposedRect))
+
+    def exposed_lines(self, exposed):
+        """Lines of the edges crossing the exposed rect, all of them when most are"""
+        # Widened so lines just outside a tile still get their antialiasing
+        margin = EDGE_MARGIN
+        tiles = rect_tiles(exposed.adjusted(-margin, -margin, margin, margin)) if not exposed.isEmpty() else None
+        if self.tiles is None and tiles is not None and not exposed.contains(self.bounds):
+            self.tiles = {}
+            for key, line in self.edges.items():
+                for tile in line_tiles(line):
+                    self.tiles.setdefault(tile, set()).add(key)
+        if tiles is None or self.tiles is None or len(tiles) >= len(self.tiles):
+            if self.line_list is None:
+                self.line_list = list(self.lines.values())
+            return self.line_list
+        keys = set()
+        for tile in tiles:
+            keys.update(self.tiles.get(tile, ()))
+        return [self.lines[key] for key in keys]
+
+    def aggregated_lines(self, zoom):
+        """One line in screen pixels per pair of screen cells joined by edges
+
+        Cells start at AGGREGATE_CELL pixels and double until there are at
+        most MAX_AGGREGATE_LINES lines, so a tangle of long edges becomes a
+        coarse map of which regions are linked.
+        """
+        if self.aggregate is not None and self.aggregate[0] == (zoom, self.changes):
+            return self.aggregate[1]
+        pixels = AGGREGATE_CELL
+        while True:
+            cell = pixels / zoom  # In scene units
+            pairs = set()
+            for x1, y1, x2, y2 in self.edges.values():
+                start = (int(x1 // cell), int(y1 // cell))
+                end = (int(x2 // cell), int(y2 // cell))
+                # Edges inside a cell are too short to see
+                if start != end:
+                    pairs.add((start, end) if start < end else (end, start))
+            if len(pairs) <= MAX_AGGREGATE_LINES:
+                break
+            pixels *= 2
+        half = pixels / 2
+        lines = [QLineF(start[0] * pixels + half, start[1] * pixels + half,
+                        end[0] * pixels + half, end[1] * pixels + half)
+                 for start, end in pairs]
+        self.aggregate = ((zoom, self.changes), lines)
+        return lines
+
+    def edge_line(self, key):
+        """Current line of an edge, None if the two bases are not connected"""
+        source, target = self.board.get(key[0]), self.board.get(key[1])
+        if source is None or target is None or target not in source.connections:
+            return None
+        return (source.x + source.size / 2, source.y + source.size / 2,
+                target.x + target.size / 2, target.y + target.size / 2)
+
+    def collect_edges(self):
+        edges = {}
+        for state in self.board:
+            half = state.size / 2
+            for other in state.connections:
+                if state.unit_id < other.unit_id:
+                    other_half = other.size / 2
+                    edges[(state.unit_id, other.unit_id)] = (state.x + half, state.y + half,
+                                                             other.x + other_half, other.y + other_half)
+        return edges
+
+    def refresh(self, unit_ids=None):
+        """Pick up connection changes made to the board since the last call
+
+        Callers that just connected or disconnected bases may pass their
+        ids; when that was the only change to the board since the last
+        refresh only the edges of those bases are compared, otherwise the
+        whole board is.
+        """
+        revision = self.board.revision
+        if revision == self.revision:
+            return
+
+        if unit_ids is not None and self.revision is not None and revision == self.revision + 1:
+            keys = set()
+            for unit_id in unit_ids:
+                keys.update(self.incident.get(unit_id, ()))
+                state = self.board.get(unit_id)
+                if state is not None:
+                    keys.update(edge_key(unit_id, other.unit_id) for other in state.connections)
+            changes = {key: self.edge_line(key) for key in keys}
+        else:
+            edges = self.collect_edges()
+            changes = {key: line for key, line in edges.items() if self.edges.get(key) != line}
+            changes.update((key, None) for key in self.edges if key not in edges)
+        self.revision = revision
+        self.apply_changes(changes)
+
+    def apply_changes(self, changes):
+        """Store the new line (or None) of each edge and repaint where they changed"""
+        dirty = []
+        added = QRectF()
+        if self.edges and len(changes) == len(self.edges) and not any(changes.values()):
+            # Every edge went, as when a new board is loaded: drop them at once
+            dirty = list(self.edges.values())
+            self.edges, self.lines, self.incident = {}, {}, {}
+            self.tiles = None
+            changes = {}
+        for key, line in changes.items():
+            old = self.edges.get(key)
+            if old == line:
+                continue
+            if old is not None:
+                dirty.append(old)
+                del self.edges[key]
+                del self.lines[key]
+                for unit_id in key:
+                    self.incident[unit_id].discard(key)
+                for tile in line_tiles(old) if self.tiles is not None else ():
+                    tile_keys = self.tiles[tile]
+                    tile_keys.discard(key)
+                    if not tile_keys:
+                        del self.tiles[tile]
+            if line is not None:
+                dirty.append(line)
+                self.edges[key] = line
+                self.lines[key] = QLineF(*line)
+                for unit_id in key:
+                    self.incident.setdefault(unit_id, set()).add(key)
+                for tile in line_tiles(line) if self.tiles is not None else ():
+                    self.tiles.setdefault(tile, set()).add(key)
+                added = added.united(line_rect(line))
+        if not dirty:
+            return
+        self.line_list = None
+        self.changes += 1
+
+        # Bounds only grow with new lines, a removed line leaves a little
+        # unused space until the board has no connections at all
+        bounds = self.bounds.united(added) if self.edges else QRectF()
+        if bounds != self.bounds:
+            # The scene repaints the old bounds as part of the change
+            self.prepareGeometryChange()
+            self.bounds = bounds
+        if len(dirty) > FULL_UPDATE_EDGES or self.aggregating:
+            # Merged lines are snapped to screen cells, not where the edges are
+            self.update()
+            return
+        for line in dirty:
+            self.update(line_rect(line))
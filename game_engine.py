@@ -0,0 +1,416 @@
+"""
+Headless simulation core for Expansion War.
+
+The game rules (growth, ally bonus, neutral capture and attack drain) live
+here as plain Python data so they can run without a QApplication or a
+QGraphicsScene. MainWindow and the Unit graphics items are thin views over
+a GameEngine instance.
+"""
+
+PLAYER = "player"
+PC = "pc"
+NEUTRAL = "neutral"
+
+CAPTURE_POINTS = 10  # Points a side needs to capture a neutral base
+NEUTRAL_VALUE = 10   # Value of a base that has just become neutral
+
+# Boards with at least this many units use the NumPy tick when available;
+# below it building the arrays costs more than the per-unit tick
+VECTORIZE_THRESHOLD = 1000
+
+
+def other_side(side):
+    return PC if side == PLAYER else PLAYER
+
+
+def compact_unit_ids(units_data):
+    """Renumber unit dicts 0..n-1 in board order, keeping their connections
+
+    Saves made before ids were allocated per board carry 64-bit memory
+    addresses; already compact boards are returned unchanged.
+    """
+    ids = [unit_data.get("id") for unit_data in units_data]
+    if ids == list(range(len(ids))):
+        return units_data
+
+    new_ids = {unit_id: index for index, unit_id in enumerate(ids) if unit_id is not None}
+    compacted = []
+    for index, unit_data in enumerate(units_data):
+        unit_data = dict(unit_data, id=index)
+        if "connections" in unit_data:
+            unit_data["connections"] = [new_ids[conn_id] for conn_id in unit_data["connections"] if conn_id in new_ids]
+        compacted.append(unit_data)
+    return compacted
+
+
+class UnitState:
+    """Plain data for a single base on the board"""
+
+    def __init__(self, unit_id, x=0, y=0, size=40, owner=PLAYER, value=None):
+        self.unit_id = unit_id
+        self.x = x
+        self.y = y
+        self.size = size
+        self.owner = owner
+
+        if value is None:
+            value = NEUTRAL_VALUE if owner == NEUTRAL else 0
+        self.value = value
+
+        self.player_points = 0
+        self.pc_points = 0
+        self.connections = []  # Connected UnitState objects
+        self.changed_tick = 0  # Engine tick of the last owner/connection change
+
+    def increase_value(self, amount=1):
+        self.value += amount
+
+    def decrease_value(self, amount=1):
+        self.value = max(0, self.value - amount)
+
+    def to_dict(self):
+        """Serialize the unit in the saved game / network format"""
+        unit_data = {
+            "id": self.unit_id,
+            "owner": self.owner,
+            "value": self.value,
+            "x": self.x,
+            "y": self.y,
+            "size": self.size
+        }
+
+        # Only neutral bases carry capture points
+        if self.owner == NEUTRAL:
+            unit_data["player_points"] = self.player_points
+            unit_data["pc_points"] = self.pc_points
+
+        unit_data["connections"] = [conn.unit_id for conn in self.connections]
+        return unit_data
+
+
+class BoardState:
+    """All units and connections of a level, kept in insertion order
+
+    Units are also bucketed by owner so per-side queries and counts never
+    have to scan the whole board. Ownership must be changed through
+    set_owner() to keep the buckets in sync.
+    """
+
+    def __init__(self):
+        self.units = {}  # unit_id -> UnitState
+        self.by_owner = {PLAYER: {}, PC: {}, NEUTRAL: {}}  # owner -> {unit_id: UnitState}
+        self.revision = 0  # Bumped on every change to units or connections
+
+    def __iter__(self):
+        return iter(list(self.units.values()))
+
+    def __len__(self):
+        return len(self.units)
+
+    def get(self, unit_id):
+        return self.units.get(unit_id)
+
+    def next_id(self):
+        """Smallest unit id above every id on the board"""
+        return max(self.units, default=-1) + 1
+
+    def add_unit(self, unit_id, x=0, y=0, size=40, owner=PLAYER, value=None):
+        return self.add_state(UnitState(unit_id, x, y, size, owner, value))
+
+    def add_state(self, state):
+        self.units[state.unit_id] = state
+        self.by_owner.setdefault(state.owner, {})[state.unit_id] = state
+        self.revision += 1
+        return state
+
+    def remove_unit(self, unit_id):
+        """Remove a unit and all of its connections, returns False if unknown"""
+        state = self.units.pop(unit_id, None)
+        if state is None:
+            return False
+        self.by_owner.get(state.owner, {}).pop(unit_id, None)
+        for other in state.connections:
+            if state in other.connections:
+                other.connections.remove(state)
+        state.connections = []
+        self.revision += 1
+        return True
+
+    def set_owner(self, state, owner):
+        """Change the owner of a unit and move it to the matching bucket"""
+        if state.owner == owner:
+            return
+        self.by_owner[state.owner].pop(state.unit_id, None)
+        state.owner = owner
+        self.by_owner.setdefault(owner, {})[state.unit_id] = state
+
+    def units_of(self, owner):
+        return list(self.by_owner.get(owner, {}).values())
+
+    def count(self, owner):
+        return len(self.by_owner.get(owner, {}))
+
+    def touch(self):
+        """Record an edit made directly on a UnitState"""
+        self.revision += 1
+
+    def clear(self):
+        self.clear_connections()
+        self.units = {}
+        self.by_owner = {PLAYER: {}, PC: {}, NEUTRAL: {}}
+
+    def clear_connections(self):
+        for state in self.units.values():
+            state.connections = []
+        self.revision += 1
+
+    def connect(self, source, target):
+        """Connect two units, returns False if they were already connected"""
+        if source is target or target in source.connections:
+            return False
+        source.connections.append(target)
+        if source not in target.connections:
+            target.connections.append(source)
+        self.revision += 1
+        return True
+
+    def disconnect(self, source, target):
+        """Disconnect two units, returns False if they were not connected"""
+        if target not in source.connections:
+            return False
+        source.connections.remove(target)
+        if source in target.connections:
+            target.connections.remove(source)
+        self.revision += 1
+        return True
+
+    def connection_pairs(self):
+        """Yield every connection once as a (source, target) pair"""
+        seen = set()
+        for state in self.units.values():
+            for other in state.connections:
+                key = frozenset((state.unit_id, other.unit_id))
+                if key not in seen:
+                    seen.add(key)
+                    yield state, other
+
+    def to_dicts(self):
+        return [state.to_dict() for state in self.units.values()]
+
+    def load_dicts(self, units_data):
+        """Replace the board with units in the saved game / network format"""
+        self.clear()
+        for unit_data in units_data:
+            owner = unit_data.get("owner", NEUTRAL)
+            unit_id = unit_data.get("id")
+            if unit_id is None:
+                unit_id = self.next_id()
+            state = self.add_unit(
+                unit_id,
+                x=unit_data.get("x", 0),
+                y=unit_data.get("y", 0),
+                size=unit_data.get("size", 40),
+                owner=owner,
+                value=unit_data.get("value", 0 if owner != NEUTRAL else NEUTRAL_VALUE)
+            )
+            if owner == NEUTRAL:
+                state.player_points = unit_data.get("player_points", 0)
+                state.pc_points = unit_data.get("pc_points", 0)
+
+        for unit_data in units_data:
+            state = self.get(unit_data.get("id"))
+            if not state:
+                continue
+            for conn_id in unit_data.get("connections", []):
+                other = self.get(conn_id)
+                if other:
+                    self.connect(state, other)
+
+    def copy(self):
+        """Return an independent deep copy of the board
+
+        Clones the units directly instead of going through to_dicts(), bots
+        copy the board for every position they look at.
+        """
+        board = BoardState()
+        for state in self.units.values():
+            clone = UnitState(state.unit_id, state.x, state.y, state.size, state.owner, state.value)
+            clone.player_points = state.player_points
+            clone.pc_points = state.pc_points
+            clone.changed_tick = state.changed_tick
+            board.add_state(clone)
+        for state in self.units.values():
+            board.units[state.unit_id].connections = [board.units[other.unit_id] for other in state.connections]
+        return board
+
+
+class GameEngine:
+    """Runs the game rules over a BoardState
+
+    Listeners are called as listener(event, state, old_owner) whenever a unit
+    changes owner, so views can swap sprites without polling.
+
+    Boards with at least vectorize_threshold units are ticked through the
+    NumPy ArrayBoard when NumPy is installed. It gives the same result as the
+    sequential reference rules, only faster; pass None to always use them.
+    """
+
+    def __init__(self, board=None, vectorize_threshold=VECTORIZE_THRESHOLD):
+        self.board = board if board is not None else BoardState()
+        self.listeners = []
+        self.tick_count = 0  # Number of ticks simulated, stamped on every change
+        self.vectorize_threshold = vectorize_threshold
+        self.array_board = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, event, state, old_owner=None):
+        state.changed_tick = self.tick_count
+        for listener in self.listeners:
+            listener(event, state, old_owner)
+
+    def load_level(self, level_config):
+        """Populate the board from a level config (list of unit dicts)
+
+        Units are numbered by their index in the config, so ids are small,
+        the same in every session and can index arrays directly.
+        """
+        self.tick_count = 0
+        self.board.clear()
+        for index, unit_config in enumerate(level_config):
+            self.board.add_state(UnitState(index, **unit_config))
+        return list(self.board)
+
+    def load_state(self, units_data, tick_count=0):
+        """Populate the board from saved game / network unit dicts"""
+        self.tick_count = tick_count
+        self.board.load_dicts(units_data)
+        return list(self.board)
+
+    def connect(self, source, target):
+        if not self.board.connect(source, target):
+            return False
+        source.changed_tick = target.changed_tick = self.tick_count
+        return True
+
+    def disconnect(self, source, target):
+        if not self.board.disconnect(source, target):
+            return False
+        source.changed_tick = target.changed_tick = self.tick_count
+        return True
+
+    def transfer_points(self, target, source):
+        """Apply one point of pressure from source onto target"""
+        if target.owner == NEUTRAL:
+            if source.owner == PLAYER:
+                target.player_points += 1
+                if target.player_points >= CAPTURE_POINTS:
+                    self.convert_to(target, PLAYER)
+            elif source.owner == PC:
+                target.pc_points += 1
+                if target.pc_points >= CAPTURE_POINTS:
+                    self.convert_to(target, PC)
+
+        elif target.owner == PLAYER and source.owner == PC:
+            target.decrease_value()
+            if target.value == 0:
+                self.convert_to_neutral(target)
+
+        elif target.owner == PC and source.owner == PLAYER:
+            target.decrease_value()
+            if target.value == 0:
+                self.convert_to_neutral(target)
+
+    def convert_to_neutral(self, state):
+        old_owner = state.owner
+        self.board.set_owner(state, NEUTRAL)
+        state.value = NEUTRAL_VALUE
+        state.player_points = 0
+        state.pc_points = 0
+        self.notify("owner_changed", state, old_owner)
+
+    def convert_to(self, state, new_owner):
+        old_owner = state.owner
+        self.board.set_owner(state, new_owner)
+
+        if new_owner == PLAYER:
+            state.value = state.player_points if state.player_points > 0 else 1  # Ensure at least 1 point
+        elif new_owner == PC:
+            state.value = state.pc_points if state.pc_points > 0 else 1  # Ensure at least 1 point
+
+        state.player_points = 0
+        state.pc_points = 0
+        self.notify("owner_changed", state, old_owner)
+
+    def use_vectorized_tick(self):
+        if self.vectorize_threshold is None or len(self.board) < self.vectorize_threshold:
+            return False
+        from board_arrays import NUMPY_AVAILABLE
+        return NUMPY_AVAILABLE
+
+    def tick(self):
+        """Advance the simulation by one step"""
+        self.tick_count += 1
+        if self.use_vectorized_tick():
+            self.tick_vectorized()
+        else:
+            self.tick_sequential()
+
+    def tick_vectorized(self):
+        """Advance the simulation through the NumPy array mirror"""
+        from board_arrays import ArrayBoard
+
+        # The arrays stay authoritative between ticks and are only rebuilt
+        # after the board was edited outside of the tick
+        if self.array_board is None or self.array_board.revision != self.board.revision:
+            self.array_board = ArrayBoard(self.board)
+
+        conversions = self.array_board.tick()
+        for state, old_owner in self.array_board.push(self.board, conversions):
+            self.notify("owner_changed", state, old_owner)
+
+    def tick_sequential(self):
+        """Advance the simulation one connection at a time"""
+        units = list(self.board)
+
+        # Bases connected to a base of the same owner grow twice as fast
+        allied = set()
+        for state in units:
+            if state.owner != NEUTRAL:
+                for other in state.connections:
+                    if other.owner == state.owner:
+                        allied.add(state.unit_id)
+                        allied.add(other.unit_id)
+
+        for state in units:
+            if state.owner != NEUTRAL:
+                state.increase_value(2 if state.unit_id in allied else 1)
+
+        # Push points along every connection
+        for state in units:
+            for other in state.connections:
+                if state.owner != NEUTRAL and other.owner == NEUTRAL:
+                    self.transfer_points(other, state)
+                    state.decrease_value()
+                elif state.owner == PLAYER and other.owner == PC:
+                    self.transfer_points(other, state)
+                elif state.owner == PC and other.owner == PLAYER:
+                    self.transfer_points(other, state)
+
+    def owner_counts(self):
+        return {owner: self.board.count(owner) for owner in (PLAYER, PC, NEUTRAL)}
+
+    def winner(self):
+        """Return "green", "red" or None if the game is still running"""
+        if not len(self.board):
+            return None
+
+        green_units = self.board.count(PLAYER)
+        red_units = self.board.count(PC)
+
+        if green_units == 0 and red_units > 0:
+            return "red"
+        if red_units == 0 and green_units > 0:
+            return "green"
+        return None
@@ -0,0 +1,377 @@
+"""
+Headless multi-match server for Expansion War.
+
+Runs without Qt and hosts many games in one process. Clients connect with
+the normal game client (Network Game, role client), complete the usual
+handshake and wait in a lobby until a second client arrives; the two are
+then paired into a match with its own id. The first client plays green
+("player"), the second red ("pc").
+
+Every match runs an authoritative GameEngine on its own SimulationClock.
+Actions are validated against the match before they are applied and
+forwarded to the opponent, and both clients receive the resulting board as
+versioned GAME_STATE_DELTA updates after every tick.
+When a match is won both clients get the final board and a DISCONNECT
+with the result, and their connections are closed.
+
+Usage:
+    python game_server.py --host 0.0.0.0 --port 5000 --level 1
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+import uuid
+from collections import deque
+
+from game_engine import GameEngine, PLAYER, PC, other_side
+from levels import LEVELS
+from message_codec import JSON_CODEC, KNOWN_STRINGS, choose_codec, codec_for
+from network_protocol import PROTOCOL_VERSION, FRAME_HEADER, MAX_FRAME_SIZE, frame_message, NetworkMessage
+from sim_clock import SimulationClock
+from state_sync import StateTracker
+
+SIDES = (PLAYER, PC)
+
+
+class ClientConnection:
+    """One connected game client"""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")
+        self.client_id = None
+        self.codec = JSON_CODEC
+        self.verified = False
+        self.match = None
+        self.side = None
+        self.tracker = StateTracker()
+        self.last_action = 0  # action_seq of the last action of this client processed
+
+    def send(self, msg_type, data, codec=None):
+        """Queue a message; a client that stops reading is dropped"""
+        if self.writer.is_closing():
+            return False
+        codec = codec or self.codec
+        self.writer.write(frame_message(codec.encode(msg_type, data)))
+        # Never let one slow client stall every match on the server
+        if self.writer.transport.get_write_buffer_size() > self.server.max_write_buffer:
+            self.server.log(f"Client {self.client_id} is not keeping up, disconnecting")
+            self.close()
+            return False
+        return True
+
+    def send_error(self, error):
+        return self.send(NetworkMessage.ERROR, {"error": error})
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class Match:
+    """An authoritative game between two clients"""
+
+    def __init__(self, match_id, clients, level_config, level_number, timestep=1000):
+        self.match_id = match_id
+        self.clients = dict(zip(SIDES, clients))
+        self.level_number = level_number
+        self.engine = GameEngine()
+        self.engine.load_level(level_config)
+        self.clock = SimulationClock(timestep=timestep)
+        self.clock.add_tick_listener(self.tick)
+        self.current_turn = PLAYER
+        self.winner = None
+        self.started_at = time.monotonic()
+
+        for side, client in self.clients.items():
+            client.match = self
+            client.side = side
+            client.tracker.reset()
+            client.last_action = 0
+
+    def start(self):
+        for client in self.clients.values():
+            self.send_full_state(client)
+        self.clock.start()
+
+    def opponent(self, client):
+        return self.clients.get(other_side(client.side))
+
+    def game_state(self, client):
+        counts = self.engine.owner_counts()
+        return {
+            "level": self.level_number,
+            "tick": self.engine.tick_count,
+            "current_turn": self.current_turn,
+            "game_mode": "Network Game",
+            "player_units": counts[PLAYER],
+            "pc_units": counts[PC],
+            "units": self.engine.board.to_dicts(),
+            "network_role": "server",
+            "player_role": client.side,
+            "match_id": self.match_id,
+            "last_action": client.last_action
+        }
+
+    def send_full_state(self, client):
+        client.tracker.commit(self.engine.board)
+        game_state = self.game_state(client)
+        game_state["state_version"] = client.tracker.version
+        if client.send(NetworkMessage.GAME_STATE, game_state):
+            client.tracker.mark_full_snapshot_sent()
+
+    def sync_client(self, client):
+        tracker = client.tracker
+        if not tracker.commit(self.engine.board) or tracker.acked_version is None:
+            return
+        if tracker.needs_full_snapshot():
+            self.send_full_state(client)
+        else:
+            delta = tracker.make_delta(self.engine.board, self.engine.tick_count)
+            delta["last_action"] = client.last_action
+            client.send(NetworkMessage.GAME_STATE_DELTA, delta)
+
+    def tick(self):
+        if self.winner:
+            return
+        self.engine.tick()
+        for client in self.clients.values():
+            self.sync_client(client)
+
+        winner = self.engine.winner()
+        if winner:
+            self.finish(winner)
+
+    def finish(self, winner):
+        self.winner = winner
+        self.clock.stop()
+        # Bring both clients to the final board so they agree on the result
+        for client in self.clients.values():
+            self.sync_client(client)
+
+    def handle_action(self, client, action):
+        """Validate and apply an ACTION, returns an error string or None"""
+        # Rejected actions count as processed too, the client stops predicting them
+        client.last_action = max(client.last_action, action.get("action_seq", 0))
+        if self.winner:
+            return "Match is over"
+        if client.side != self.current_turn:
+            return "Not your turn"
+
+        board = self.engine.board
+        source = board.get(action.get("source_id"))
+        target = board.get(action.get("target_id"))
+        if source is None or target is None:
+            return "Unknown unit"
+        if source.owner != client.side:
+            return "You can only act from your own bases"
+
+        action_type = action.get("type")
+        if action_type == "connect":
+            self.engine.connect(source, target)
+        elif action_type == "disconnect":
+            self.engine.disconnect(source, target)
+        else:
+            return f"Unknown action type: {action_type}"
+
+        opponent = self.opponent(client)
+        if opponent:
+            opponent.send(NetworkMessage.ACTION, action)
+        return None
+
+    def handle_turn_change(self, client, turn_data):
+        if client.side != self.current_turn or not isinstance(turn_data, dict):
+            return
+        next_turn = turn_data.get("next_turn")
+        if isinstance(next_turn, dict):
+            # send_turn_change() wraps the client's whole turn message
+            next_turn = next_turn.get("next_turn")
+        if next_turn not in SIDES:
+            return
+        self.current_turn = next_turn
+        opponent = self.opponent(client)
+        if opponent:
+            opponent.send(NetworkMessage.TURN_CHANGE, turn_data)
+
+
+class GameServer:
+    """Accepts clients, pairs them in a lobby and runs their matches"""
+
+    def __init__(self, host="0.0.0.0", port=5000, level=1, timestep=1000, frame_interval=0.05,
+                 max_write_buffer=4 * 1024 * 1024, debug_mode=True):
+        self.host = host
+        self.port = port
+        self.level = level
+        self.timestep = timestep
+        self.frame_interval = frame_interval  # Seconds between clock polls
+        self.max_write_buffer = max_write_buffer
+        self.debug_mode = debug_mode
+
+        self.server_id = str(uuid.uuid4())[:8]
+        self.lobby = deque()
+        self.matches = {}  # match_id -> Match
+        self.match_ids = itertools.count(1)
+        self.server = None
+
+    def log(self, message):
+        if self.debug_mode:
+            print(f"[SERVER] {message}")
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, reuse_address=True)
+        self.log(f"Game server {self.server_id} listening on {self.host}:{self.port}")
+
+    async def run(self):
+        await self.start()
+        try:
+            await self.run_matches()
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def run_matches(self):
+        """Advance every match clock, each catches up on its own ticks"""
+        while True:
+            now = time.monotonic()
+            for match in list(self.matches.values()):
+                match.clock.advance(now)
+                if match.winner:
+                    self.end_match(match)
+            await asyncio.sleep(self.frame_interval)
+
+    async def handle_client(self, reader, writer):
+        client = ClientConnection(self, reader, writer)
+        self.log(f"TCP connection from {client.address}")
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                (length,) = FRAME_HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    self.log(f"Frame of {length} bytes from {client.address}, closing")
+                    break
+                payload = await reader.readexactly(length)
+                if not self.handle_message(client, NetworkMessage.decode(payload)):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.remove_client(client)
+            client.close()
+
+    def handle_message(self, client, message):
+        """Route one message, returns False to close the connection"""
+        if message.type == NetworkMessage.HANDSHAKE_REQUEST:
+            return self.handle_handshake(client, message.data)
+
+        if not client.verified:
+            client.send_error("Handshake required")
+            return False
+
+        if message.type == NetworkMessage.ACK:
+            return True
+        if message.type == NetworkMessage.PING:
+            client.send(NetworkMessage.PONG, message.data)
+            return True
+        if message.seq is not None:
+            # TCP keeps order, every message up to this one has arrived
+            client.send(NetworkMessage.ACK, {"ack": message.seq})
+
+        match = client.match
+        if message.type == NetworkMessage.ACTION:
+            if match:
+                error = match.handle_action(client, message.data)
+                if error:
+                    client.send_error(error)
+        elif message.type == NetworkMessage.TURN_CHANGE:
+            if match:
+                match.handle_turn_change(client, message.data)
+        elif message.type == NetworkMessage.STATE_ACK:
+            client.tracker.ack(message.data.get("version", 0))
+            if match and message.data.get("resync"):
+                match.send_full_state(client)
+        elif message.type == NetworkMessage.DISCONNECT:
+            return False
+        return True
+
+    def handle_handshake(self, client, data):
+        if data.get("game") != "ExpansionWar":
+            self.log(f"Invalid game in handshake from {client.address}: {data.get('game')}")
+            return False
+
+        client.client_id = data.get("client_id", "unknown")
+        codec_name = choose_codec(data.get("codecs"))
+        client.send(NetworkMessage.HANDSHAKE_RESPONSE, {
+            "server_id": self.server_id,
+            "client_id": client.client_id,
+            "status": "accepted",
+            "game": "ExpansionWar",
+            "version": PROTOCOL_VERSION,
+            "codec": codec_name,
+            "known_strings": len(KNOWN_STRINGS)
+        }, codec=JSON_CODEC)
+        client.codec = codec_for(codec_name, data.get("known_strings"))
+        client.verified = True
+        self.log(f"Client {client.client_id} verified ({codec_name} codec)")
+
+        self.lobby.append(client)
+        self.pair_clients()
+        return True
+
+    def pair_clients(self):
+        while len(self.lobby) >= 2:
+            clients = [self.lobby.popleft(), self.lobby.popleft()]
+            match_id = f"{self.server_id}-{next(self.match_ids)}"
+            level_number = min(max(self.level, 1), len(LEVELS))
+            match = Match(match_id, clients, LEVELS[level_number - 1], level_number, timestep=self.timestep)
+            self.matches[match_id] = match
+            self.log(f"Match {match_id} started: {clients[0].client_id} (green) vs {clients[1].client_id} (red)")
+            match.start()
+
+    def end_match(self, match):
+        if self.matches.pop(match.match_id, None):
+            duration = time.monotonic() - match.started_at
+            self.log(f"Match {match.match_id} won by {match.winner} after {match.engine.tick_count} ticks ({duration:.0f}s)")
+            # Both clients already have the final board, release them
+            for client in match.clients.values():
+                client.match = None
+                client.send(NetworkMessage.DISCONNECT, {"reason": f"Match over, {match.winner} won"})
+                client.close()
+
+    def remove_client(self, client):
+        if client in self.lobby:
+            self.lobby.remove(client)
+        match = client.match
+        client.match = None
+        if match and self.matches.pop(match.match_id, None):
+            self.log(f"Client {client.client_id} left match {match.match_id}, ending it")
+            match.clock.stop()
+            opponent = match.opponent(client)
+            if opponent:
+                opponent.match = None
+                opponent.send(NetworkMessage.DISCONNECT, {"reason": "Opponent left the match"})
+                opponent.close()
+        self.log(f"Client {client.client_id} disconnected ({len(self.matches)} matches running)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Expansion War game server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--level", type=int, default=1, help="Level number played by every match")
+    parser.add_argument("--tick-ms", type=int, default=1000, help="Logical milliseconds per simulation tick")
+    parser.add_argument("--quiet", action="store_true", help="Disable logging")
+    args = parser.parse_args()
+
+    server = GameServer(args.host, args.port, level=args.level, timestep=args.tick_ms, debug_mode=not args.quiet)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("Server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Built-in Expansion War levels.
+
+Each level is a list of unit configs (x, y, size, owner) as accepted by
+GameEngine.load_level. Kept free of Qt so headless tools can load them.
+"""
+
+LEVELS = [
+    [
+        {"x": 150, "y": 300, "size": 50, "owner": "player"},
+        {"x": 150, "y": 150, "size": 50, "owner": "pc"},
+        {"x": 300, "y": 150, "size": 50, "owner": "pc"},
+        {"x": 300, "y": 300, "size": 50, "owner": "neutral"}
+    ],
+    [
+        {"x": 100, "y": 100, "size": 50, "owner": "player"},
+        {"x": 200, "y": 100, "size": 50, "owner": "neutral"},
+        {"x": 300, "y": 100, "size": 50, "owner": "pc"},
+        {"x": 400, "y": 100, "size": 50, "owner": "neutral"},
+        {"x": 250, "y": 300, "size": 50, "owner": "neutral"}
+    ],
+    [
+        {"x": 100, "y": 300, "size": 50, "owner": "player"},
+        {"x": 200, "y": 200, "size": 50, "owner": "neutral"},
+        {"x": 300, "y": 300, "size": 50, "owner": "pc"},
+        {"x": 150, "y": 400, "size": 50, "owner": "neutral"},
+        {"x": 350, "y": 400, "size": 50, "owner": "neutral"},
+        {"x": 400, "y": 200, "size": 50, "owner": "pc"}
+    ]
+]
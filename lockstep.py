@@ -0,0 +1,163 @@
+"""
+Deterministic lockstep synchronisation for network games.
+
+Instead of the host streaming board state, both peers run the same
+simulation and exchange only the connect/disconnect actions produced by
+Unit.connect_to/disconnect_from. Every action is tagged with the tick it
+applies on (it takes effect after that tick and before the next one), and
+an engine only simulates tick T+1 once it holds the opponent's input for
+tick T. Starting from the same snapshot, both boards therefore evolve
+identically and the bandwidth depends on how often the players act, not on
+the size of the board.
+
+Every input also carries a hash of the board after its tick, so a desync is
+reported on the tick it happens instead of surfacing later as a board the
+two players disagree on.
+"""
+
+import zlib
+from collections import OrderedDict
+
+from state_sync import replay_action
+
+
+def state_hash(board):
+    """CRC32 of everything the rules depend on, in board order"""
+    crc = 0
+    for state in board:
+        row = (state.unit_id, state.owner, state.value, state.player_points, state.pc_points,
+               sorted(other.unit_id for other in state.connections))
+        crc = zlib.crc32(repr(row).encode("utf-8"), crc)
+    return crc
+
+
+class LockstepSession:
+    """Exchanges per-tick inputs and advances an engine in lockstep
+
+    send is called with the payload of every input message. A session is
+    restarted from the engine's current board with start(); inputs from an
+    earlier start (another epoch) are ignored.
+    """
+
+    def __init__(self, engine, send, hash_interval=1, hash_history=256, max_catch_up_ticks=3):
+        self.engine = engine
+        self.send = send
+        self.hash_interval = hash_interval  # Ticks between state hashes
+        self.hash_history = hash_history  # Local hashes kept for late remote ones
+        self.max_catch_up_ticks = max_catch_up_ticks  # Clock ticks kept while waiting for the opponent
+        self.desync_listeners = []
+        self.active = False
+        self.epoch = 0
+        self.desync_tick = None
+
+    def add_desync_listener(self, listener):
+        """Register listener(tick, local_hash, remote_hash)"""
+        self.desync_listeners.append(listener)
+
+    def start(self, epoch=None):
+        """Begin lockstep from the engine's current board and tick
+
+        The host picks the epoch, the client passes the one it received.
+        """
+        self.epoch = self.epoch + 1 if epoch is None else epoch
+        self.active = True
+
+        self.target_tick = self.engine.tick_count
+        self.sent_tick = self.engine.tick_count - 1  # Last tick whose input went out
+        self.local_actions = []
+        self.deferred_actions = []  # Made after this tick's input was sent
+        self.remote_inputs = {}  # tick -> opponent actions
+        self.local_hashes = OrderedDict()
+        self.remote_hashes = {}  # Opponent hashes for ticks not simulated yet
+        self.desync_tick = None
+        self.record_hash()
+        return self.epoch
+
+    def stop(self):
+        self.active = False
+
+    @property
+    def stalled(self):
+        """True while waiting for the opponent's input"""
+        return self.active and self.engine.tick_count < self.target_tick
+
+    def record_local_action(self, action):
+        """Queue an action the local player has already applied to the engine"""
+        tick = self.engine.tick_count
+        if self.sent_tick >= tick:
+            # The opponent already has our input for this tick: take the
+            # action back and apply it right after the next tick instead
+            undo = dict(action, type="disconnect" if action.get("type") == "connect" else "connect")
+            replay_action(self.engine, undo)
+            action["tick"] = tick + 1
+            self.deferred_actions.append(action)
+        else:
+            action["tick"] = tick
+            self.local_actions.append(action)
+        return action
+
+    def request_tick(self):
+        """Called once per clock tick, returns the number of ticks simulated"""
+        self.target_tick = min(self.target_tick + 1, self.engine.tick_count + self.max_catch_up_ticks)
+        return self.advance()
+
+    def receive(self, data):
+        """Store the opponent's input for one tick, returns the ticks simulated"""
+        if not self.active or data.get("epoch") != self.epoch:
+            return 0
+        tick = data.get("tick")
+        self.remote_inputs[tick] = data.get("actions", [])
+        if data.get("hash") is not None:
+            self.check_hash(tick, data["hash"])
+        return self.advance()
+
+    def advance(self):
+        """Simulate every requested tick the opponent's input is known for"""
+        ticks = 0
+        while self.active and self.engine.tick_count < self.target_tick:
+            tick = self.engine.tick_count
+            if self.sent_tick < tick:
+                self.send_input(tick)
+            if tick not in self.remote_inputs:
+                break
+
+            for action in self.remote_inputs.pop(tick):
+                replay_action(self.engine, action)
+            self.engine.tick()
+            ticks += 1
+            self.record_hash()
+
+            deferred, self.deferred_actions = self.deferred_actions, []
+            for action in deferred:
+                replay_action(self.engine, action)
+                self.local_actions.append(action)
+        return ticks
+
+    def send_input(self, tick):
+        data = {"tick": tick, "actions": self.local_actions, "epoch": self.epoch}
+        if tick in self.local_hashes:
+            data["hash"] = self.local_hashes[tick]
+        self.local_actions = []
+        self.sent_tick = tick
+        self.send(data)
+
+    def record_hash(self):
+        tick = self.engine.tick_count
+        if tick % self.hash_interval:
+            return
+        self.local_hashes[tick] = state_hash(self.engine.board)
+        while len(self.local_hashes) > self.hash_history:
+            self.local_hashes.popitem(last=False)
+        if tick in self.remote_hashes:
+            self.check_hash(tick, self.remote_hashes.pop(tick))
+
+    def check_hash(self, tick, remote_hash):
+        local_hash = self.local_hashes.get(tick)
+        if local_hash is None:
+            if tick > self.engine.tick_count:
+                self.remote_hashes[tick] = remote_hash
+            return
+        if local_hash != remote_hash and self.desync_tick is None:
+            self.desync_tick = tick
+            for listener in self.desync_listeners:
+                listener(tick, local_hash, remote_hash)
@@ -1,9 +1,11 @@
-from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QGraphicsView, QGraphicsItem, QGraphicsLineItem, QPushButton, QLabel, QVBoxLayout, QWidget, QHBoxLayout, QAction, QMessageBox, QSizePolicy, QProgressBar, QFileDialog
-from PyQt5.QtCore import Qt, QRectF, QPointF, QLineF, QTimer
-from PyQt5.QtGui import QBrush, QPen, QColor, QPainter, QFont, QPixmap, QIcon
+from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QPushButton, QLabel, QVBoxLayout, QWidget, QHBoxLayout, QAction, QMessageBox, QSizePolicy, QProgressBar, QFileDialog
+from PyQt5.QtCore import Qt, QPointF, QTimer
+from PyQt5.QtGui import QIcon
 import os
 import sys
 import json
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ET
 import xml.dom.minidom
 from PyQt5 import QtCore
@@ -11,7 +13,18 @@ import resources_rc
 from config_dialog import ConfigDialog
 from db_handler import DatabaseHandler
 from save_load_dialog import SaveGameDialog, LoadGameDialog
-from network_manager import NetworkManager, NetworkMessage
+from network_manager import NetworkMessage
+from async_transport import AsyncNetworkManager
+from game_engine import GameEngine, compact_unit_ids
+from bots import create_bot
+from levels import LEVELS
+from sim_clock import SimulationClock
+from state_sync import StateTracker, ClientPrediction, apply_delta, snapshot_to_delta
+from lockstep import LockstepSession
+from unit import Unit
+from edge_layer import EdgeLayer
+from board_view import BoardView, board_rect
+from sprite_cache import SPRITES
 import network_connection_fix
 
 plugin_path = os.path.join(os.path.dirname(QtCore.__file__), "plugins", "platforms")
@@ -39,393 +52,6 @@ class LevelManager:
     def reset(self):
         self.current_level_index = 0
 
-class ConnectionLine(QGraphicsLineItem):
-    def __init__(self, start_pos):
-        super().__init__()
-        self.setLine(QLineF(start_pos, start_pos))
-        self.setPen(QPen(Qt.darkGray, 1, Qt.DashLine))
-        
-class Unit(QGraphicsItem):
-    def __init__(self, x, y, size=40, owner="player"):
-        super().__init__()
-        
-        self.size = size
-        self.owner = owner
-        
-        if (owner == "player"):
-            self.pixmap = QPixmap(":/images/grafika/green.bmp")
-            self.color = QColor(50, 200, 50)
-        elif (owner == "pc"):
-            self.pixmap = QPixmap(":/images/grafika/red.bmp")
-            self.color = QColor(200, 50, 50)
-        else:
-            self.pixmap = QPixmap(":/images/grafika/grey.bmp")
-            self.color = QColor(150, 150, 150)
-        
-        if not self.pixmap.isNull():
-            self.pixmap = self.pixmap.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            
-        self.connections = []
-        self.dragging_connection = False
-        self.deleting_connection = False
-        self.temp_connection_line = None
-        self.highlight_type = None
-        self.is_highlighted = False
-        
-        # Network-related properties
-        self.last_action = None  # Store the last action performed for network sync
-        
-        # Initialize player_points and pc_points for all units
-        self.player_points = 0
-        self.pc_points = 0
-        
-        if owner == "neutral":
-            self.value = 10
-        else:
-            self.value = 0
-
-        self.main_window = None
-        self.setPos(x, y)
-        self.setFlag(QGraphicsItem.ItemIsSelectable)
-        
-        # Add unique ID for each unit (for history tracking)
-        self.unit_id = id(self)
-
-    def can_interact(self):
-        """Check if this unit can be interacted with in current game state"""
-        if not self.main_window:
-            return True
-            
-        # In single player mode or if game is over, follow standard rules
-        if self.main_window.game_mode != "Network Game" or self.main_window.game_over:
-            return self.owner == "neutral" or self.owner == self.main_window.current_turn
-            
-        # In network game, only allow interaction if:
-        # 1. It's our turn (player_role matches current_turn)
-        # 2. We own the unit (unit's owner matches player_role) OR the unit is neutral
-        is_our_turn = self.main_window.current_turn == self.main_window.player_role
-        
-        # FIX: Check if we own the unit (compare to player_role, not current_turn)
-        is_our_unit = self.owner == "neutral" or self.owner == self.main_window.player_role
-        
-        # Debug print for interaction check
-        print(f"Interaction check - Unit owner: {self.owner}, Current turn: {self.main_window.current_turn}, Player role: {self.main_window.player_role}")
-        print(f"Can interact? is_our_turn: {is_our_turn}, is_our_unit: {is_our_unit}, Result: {is_our_turn and is_our_unit}")
-        
-        # Debug print for client interaction check
-        if self.main_window.player_role == "pc":
-            print(f"[CLIENT] Interaction check - Unit owner: {self.owner}, Current turn: {self.main_window.current_turn}")
-            print(f"[CLIENT] Is my turn? {is_our_turn} (current_turn:{self.main_window.current_turn}==player_role:{self.main_window.player_role})")
-            print(f"[CLIENT] Is my unit? {is_our_unit} (owner:{self.owner}==player_role:{self.main_window.player_role} or neutral)") 
-            print(f"[CLIENT] Final permission: {is_our_turn and is_our_unit}")
-        
-        return is_our_turn and is_our_unit
-        
-    def disconnect_from(self, other_unit):
-        if other_unit in self.connections:
-            self.connections.remove(other_unit)
-            if self in other_unit.connections:
-                other_unit.connections.remove(self)
-            
-            self.update()
-            other_unit.update()
-            if self.scene():
-                self.scene().update()
-            
-            if self.main_window and self.owner == self.main_window.current_turn:
-                # Store the disconnect action for network sync
-                self.last_action = {
-                    "type": "disconnect",
-                    "source_id": self.unit_id,
-                    "target_id": other_unit.unit_id
-                }
-                self.main_window.action_performed(self.last_action)
-
-    def paint(self, painter, option, widget=None):
-        if self.is_highlighted:
-            if self.highlight_type == "connect":
-                painter.setPen(QPen(QColor(0, 100, 255), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-            elif self.highlight_type == "attack":
-                painter.setPen(QPen(QColor(255, 0, 0), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-            elif self.highlight_type == "transfer":
-                painter.setPen(QPen(QColor(255, 255, 0), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-            elif self.highlight_type == "ally":
-                painter.setPen(QPen(QColor(0, 255, 0), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-        
-        # Draw connection lines - important part for visible connections
-        pen = QPen(Qt.darkGray, 1, Qt.DashLine)
-        painter.setPen(pen)
-        for other in self.connections:
-            start = self.scenePos() + self.boundingRect().center()
-            end = other.scenePos() + other.boundingRect().center()
-            painter.drawLine(self.mapFromScene(start), self.mapFromScene(end))
-
-        if not self.pixmap.isNull():
-            if self.isSelected():
-                painter.setPen(QPen(Qt.black, 2))
-                painter.setBrush(QBrush(QColor(255, 255, 0)))
-                painter.drawEllipse(0, 0, self.size, self.size)
-                
-            painter.drawPixmap(0, 0, self.pixmap)
-        else:
-            pen = QPen(Qt.black, 2)
-            brush = QBrush(self.color if not self.isSelected() else QColor(255, 255, 0))
-            painter.setPen(pen)
-            painter.setBrush(brush)
-            painter.drawEllipse(0, 0, self.size, self.size)
-        
-        painter.setPen(QPen(Qt.white))
-        painter.setFont(QFont("Arial", self.size // 4))
-        
-        if self.owner == "neutral":
-            display_text = f"[{self.value}]"
-            if self.player_points > 0:
-                display_text += f"\nP:{self.player_points}"
-            if self.pc_points > 0:
-                display_text += f"\nC:{self.pc_points}"
-        else:
-            display_text = str(self.value)
-            
-        painter.drawText(QRectF(0, 0, self.size, self.size), 
-                         Qt.AlignCenter, display_text)
-    
-    def transfer_points(self, from_unit):
-        if self.owner == "neutral":
-            if from_unit.owner == "player":
-                self.player_points += 1
-                if self.player_points >= 10:
-                    self.convert_to("player")
-            elif from_unit.owner == "pc":
-                self.pc_points += 1
-                if self.pc_points >= 10:
-                    self.convert_to("pc")
-    
-        elif self.owner == "player" and from_unit.owner == "pc":
-            self.decrease_value()
-            if self.value == 0:
-                self.convert_to_neutral()
-    
-        elif self.owner == "pc" and from_unit.owner == "player":
-            self.decrease_value()
-            if self.value == 0:
-                self.convert_to_neutral()
-            
-        self.update()
-
-    def convert_to_neutral(self):
-        self.owner = "neutral"
-        self.color = QColor(150, 150, 150)
-        self.pixmap = QPixmap(":/images/grafika/grey.bmp")
-        if not self.pixmap.isNull():
-            self.pixmap = self.pixmap.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.value = 10
-        self.player_points = 0
-        self.pc_points = 0
-        self.update()
-        
-        if self.main_window:
-            self.main_window.check_game_over()
-
-    def convert_to(self, new_owner):
-        old_owner = self.owner
-        self.owner = new_owner
-
-        if new_owner == "player":
-            self.color = QColor(50, 200, 50)
-            self.pixmap = QPixmap(":/images/grafika/green.bmp")
-            self.value = self.player_points if self.player_points > 0 else 1  # Ensure at least 1 point
-        elif new_owner == "pc":
-            self.color = QColor(200, 50, 50)
-            self.pixmap = QPixmap(":/images/grafika/red.bmp")
-            self.value = self.pc_points if self.pc_points > 0 else 1  # Ensure at least 1 point
-    
-        if not self.pixmap.isNull():
-            self.pixmap = self.pixmap.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-    
-        self.player_points = 0
-        self.pc_points = 0
-
-        self.update()
-        
-        if self.main_window:
-            self.main_window.check_game_over()
-        
-    def boundingRect(self):
-        return QRectF(0, 0, self.size, self.size)
-    
-    def increase_value(self, amount=1):
-        old_value = self.value
-        self.value += amount
-        self.update()
-        
-    def decrease_value(self, amount=1):
-        old_value = self.value
-        self.value -= amount
-        self.value = max(0, self.value)
-        self.update()
-
-    def mousePressEvent(self, event):
-        # First check if we can interact with this unit based on network roles and turns
-        if not self.can_interact():
-            # Don't allow selection if we can't interact
-            event.ignore()
-            return
-            
-        if event.button() == Qt.LeftButton:
-            self.clear_all_highlights()
-            self.setSelected(True)
-            
-            if event.modifiers() == Qt.ControlModifier:
-                self.dragging_connection = True
-                start_pos = self.scenePos() + self.boundingRect().center()
-                self.temp_connection_line = ConnectionLine(start_pos)
-                self.scene().addItem(self.temp_connection_line)
-                self.show_possible_moves()  # Only show highlights when actively connecting
-            event.accept()
-        elif event.button() == Qt.RightButton:
-            if not self.can_interact():
-                event.ignore()
-                return
-                
-            self.deleting_connection = True
-        
-            self.clear_all_highlights()
-            for unit in self.connections:
-                unit.is_highlighted = True
-                unit.highlight_type = "attack"
-                unit.update()
-        
-            start_pos = self.scenePos() + self.boundingRect().center()
-            self.temp_connection_line = ConnectionLine(start_pos)
-            self.temp_connection_line.setPen(QPen(Qt.red, 2, Qt.DashLine))
-            self.scene().addItem(self.temp_connection_line)
-        
-            event.accept()
-        else:
-            super().mousePressEvent(event)
-            
-    def clear_all_highlights(self):
-        if self.scene():
-            for item in self.scene().items():
-                if isinstance(item, Unit):
-                    item.is_highlighted = False
-                    item.highlight_type = None
-                    item.update()
-                    
-    def show_possible_moves(self):
-        if not self.scene():
-            return
-            
-        all_units = [item for item in self.scene().items() if isinstance(item, Unit) and item != self]
-        
-        for unit in all_units:
-            if unit not in self.connections:
-                unit.is_highlighted = True
-                unit.highlight_type = "connect"
-            else:
-                if unit.owner == "neutral" and self.owner != "neutral":
-                    unit.is_highlighted = True
-                    unit.highlight_type = "transfer"
-                elif unit.owner != self.owner and unit.owner != "neutral" and self.owner != "neutral":
-                    unit.is_highlighted = True
-                    unit.highlight_type = "attack"
-                elif unit.owner == self.owner:
-                    unit.is_highlighted = True
-                    unit.highlight_type = "ally"
-                    
-            unit.update()        
-            
-    def mouseMoveEvent(self, event):
-        if (self.dragging_connection or self.deleting_connection) and self.temp_connection_line:
-            start_pos = self.scenePos() + self.boundingRect().center()
-            mouse_pos = self.mapToScene(event.pos())
-            self.temp_connection_line.setLine(QLineF(start_pos, mouse_pos))
-            event.accept()
-        else:
-            super().mouseMoveEvent(event)
-            
-    def mouseReleaseEvent(self, event):
-        if self.dragging_connection and self.temp_connection_line:
-            end_pos = self.mapToScene(event.pos())
-            
-            # Clean up connection line
-            self.scene().removeItem(self.temp_connection_line)
-            self.temp_connection_line = None
-            
-            # Find item under cursor
-            item_under_cursor = None
-            for item in self.scene().items(end_pos):
-                if isinstance(item, Unit) and item != self:
-                    item_under_cursor = item
-                    break
-            
-            # Connect only if we found a unit under the cursor
-            if item_under_cursor:
-                self.connect_to(item_under_cursor)
-            
-            # Clear all highlights after connection is made
-            self.clear_all_highlights()
-            self.dragging_connection = False
-            event.accept()
-        elif self.deleting_connection:
-            end_pos = self.mapToScene(event.pos())
-            
-            # Clean up connection line
-            if self.temp_connection_line:
-                self.scene().removeItem(self.temp_connection_line)
-                self.temp_connection_line = None
-            
-            # Find item under cursor
-            item_under_cursor = None
-            for item in self.scene().items(end_pos):
-                if isinstance(item, Unit) and item != self and item in self.connections:
-                    item_under_cursor = item
-                    break
-            
-            # Disconnect only if we found a connected unit under the cursor
-            if item_under_cursor:
-                self.disconnect_from(item_under_cursor)
-            
-            # Always clear highlights when releasing
-            self.clear_all_highlights()
-            self.deleting_connection = False
-            event.accept()
-        else:
-            super().mouseReleaseEvent(event)
-    
-    def handle_selection_changed(self):
-        """Handle selection change to clear highlights"""
-        if not self.dragging_connection and not self.deleting_connection:
-            self.clear_all_highlights()
-            
-    def connect_to(self, other_unit):
-        if other_unit not in self.connections:
-            self.connections.append(other_unit)
-            other_unit.connections.append(self)
-            self.update()
-            other_unit.update()
-            
-            # Force scene update to ensure connection lines are drawn
-            if self.scene():
-                self.scene().update()
-            
-            if self.main_window and self.owner == self.main_window.current_turn:
-                # Store the connect action for network sync
-                self.last_action = {
-                    "type": "connect",
-                    "source_id": self.unit_id,
-                    "target_id": other_unit.unit_id
-                }
-                self.main_window.action_performed(self.last_action)
-
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -435,32 +61,39 @@ class MainWindow(QMainWindow):
         self.level_manager = LevelManager()
         self.setup_levels()
         
+        # Headless simulation core, the scene only mirrors its state
+        self.engine = GameEngine()
+        self.engine.add_listener(self.on_engine_event)
+        
+        # Fixed timestep logical clock: one engine tick per second of game time.
+        # Turns are measured on the same clock so both follow game time.
+        self.clock = SimulationClock(timestep=1000)
+        self.clock.add_tick_listener(self.increment_all_units)
+        self.frame_interval = 50  # How often the Qt timer polls the clock (ms)
+        
         self.current_turn = "player"
         self.turn_duration = 5000
-        self.turn_timer = QTimer(self)
-        self.turn_timer.timeout.connect(self.switch_turn)
-        self.turn_timer.setSingleShot(True)
-        
-        self.timer_tick = 100
+        self.turn_deadline = None  # Logical time at which the current turn ends
         self.time_remaining = self.turn_duration
-        self.progress_timer = QTimer(self)
-        self.progress_timer.timeout.connect(self.update_progress)
-        
-        # Apply network patches first
-        try:
-            import network_patch
-            print("Network patches applied")
-        except ImportError:
-            print("Network patches not available - connection stability may be limited")
         
         # Game configuration
         self.game_mode = "Single Player"  # Default mode
+        
+        # Computer opponent for the red side in Single Player. It thinks on a
+        # copy of the board in a worker thread so the GUI keeps running.
+        self.bot_side = "pc"
+        self.bot_think_time = 1000  # ms of wall time per move, capped by the turn
+        self.bot_executor = ThreadPoolExecutor(max_workers=1)
+        self.bot = None
+        self.bot_future = None
+        self.set_bot("search")
         self.network_ip = "127.0.0.1"
         self.network_port = 5000
         self.network_role = "server"  # Default role for network game
         
-        # Network manager
-        self.network_manager = NetworkManager()
+        # Network manager, sockets run on an asyncio loop so the GUI never
+        # waits on the network (network_patch only tunes the threaded manager)
+        self.network_manager = AsyncNetworkManager()
         
         # Try to apply network fixes
         try:
@@ -474,12 +107,41 @@ class MainWindow(QMainWindow):
         self.network_manager.message_received.connect(self.on_network_message)
         self.network_manager.error.connect(self.on_network_error)
         self.network_manager.server_status_changed.connect(self.on_server_status_changed)
+        self.network_manager.latency_updated.connect(self.on_latency_updated)
+        self.network_manager.session_resumed.connect(self.on_session_resumed)
         
         # Player roles for network game
         self.player_role = "player"  # Local player is "player" by default
         self.opponent_role = "pc"    # Remote player is "pc" by default
         
         self.network_game_ready = False
+        self.action_ids = itertools.count(1)  # Numbers the turn changes we send
+        
+        # A dropped connection first tries to resume the session in the
+        # background, the game only restarts if that fails
+        self.resuming = False
+        self.resume_timeout = 30000  # ms to wait for the session to resume
+        self.resume_retry_delay = 250  # ms the client waits for the host to listen again
+        self.resume_timer = QTimer(self)
+        self.resume_timer.setSingleShot(True)
+        self.resume_timer.timeout.connect(self.on_resume_timeout)
+        self.ack_timeout = 5000  # ms the client has to acknowledge the initial game state
+        
+        # Delta sync: the host versions the board, the client tracks the
+        # last version it applied
+        self.state_tracker = StateTracker()
+        self.state_version = 0
+        
+        # Authoritative host: the client predicts locally and reconciles every
+        # tick-stamped update from the host
+        self.client_prediction = True
+        self.prediction = ClientPrediction()
+        self.last_remote_action = 0  # Host: action_seq of the last client action applied
+        
+        # Lockstep: both sides simulate and exchange only their actions per tick
+        self.sync_mode = "state"  # "state" or "lockstep", the host decides
+        self.lockstep = LockstepSession(self.engine, self.network_manager.send_lockstep_input)
+        self.lockstep.add_desync_listener(self.on_lockstep_desync)
         
         self.setWindowTitle("Expansion War")
         self.resize(850, 650)
@@ -489,9 +151,10 @@ class MainWindow(QMainWindow):
         self.create_turn_indicator()
         
         self.scene = QGraphicsScene()
-        self.scene.setSceneRect(0, 0, 800, 600)
-        self.view = QGraphicsView(self.scene)
-        self.view.setRenderHint(QPainter.Antialiasing)
+        self.scene.setSceneRect(board_rect(self.engine.board))
+        self.edge_layer = EdgeLayer(self.engine.board)
+        self.scene.addItem(self.edge_layer)
+        self.view = BoardView(self.scene)
         
         self.setCentralWidget(self.view)
         
@@ -499,17 +162,19 @@ class MainWindow(QMainWindow):
         
         self.view.installEventFilter(self)
         self.timer = QTimer(self)
-        self.timer.timeout.connect(self.increment_all_units)
-        self.timer.start(1000)
+        self.timer.timeout.connect(self.on_clock_frame)
+        self.start_simulation()
         self.scene.selectionChanged.connect(self.handle_selection_changed)
         
-        self.load_level()
-        self.start_turn()
-        
         self.game_over = False
         
         # Unit ID to object mapping
         self.unit_map = {}
+        # Units drawn with a highlight ring, so clearing them skips the rest
+        self.highlighted_units = set()
+        
+        self.load_level()
+        self.start_turn()
         
         # Initialize database handler
         self.db_handler = DatabaseHandler()
@@ -524,6 +189,9 @@ class MainWindow(QMainWindow):
         source_id = action_data.get("source_id")
         target_id = action_data.get("target_id")
         
+        # Tell the client which of its predicted actions we have applied
+        self.last_remote_action = max(self.last_remote_action, action_data.get("action_seq", 0))
+        
         # Find the units
         source_unit = self.find_unit_by_id(source_id)
         target_unit = self.find_unit_by_id(target_id)
@@ -533,23 +201,14 @@ class MainWindow(QMainWindow):
             return
         
         # Apply the action
+        changed = False
         if action_type == "connect":
-            if target_unit not in source_unit.connections:
-                source_unit.connections.append(target_unit)
-                target_unit.connections.append(source_unit)
-                source_unit.update()
-                target_unit.update()
-                # Force scene update to refresh connection lines
-                self.scene.update()
+            changed = self.engine.connect(source_unit.state, target_unit.state)
         elif action_type == "disconnect":
-            if target_unit in source_unit.connections:
-                source_unit.connections.remove(target_unit)
-                if source_unit in target_unit.connections:
-                    target_unit.connections.remove(source_unit)
-                source_unit.update()
-                target_unit.update()
-                # Force scene update to refresh connection lines
-                self.scene.update()
+            changed = self.engine.disconnect(source_unit.state, target_unit.state)
+        
+        if changed:
+            self.edge_layer.refresh((source_id, target_id))
         
         # Update status message to show action was received
         self.statusBar().showMessage(f"Received opponent's {action_type} action - waiting for turn change...")
@@ -571,7 +230,13 @@ class MainWindow(QMainWindow):
                     self.network_role = "server"
                     self.player_role = "player"
                     self.opponent_role = "pc"
-            
+
+            # A dedicated game server assigns our side explicitly
+            if "player_role" in game_state:
+                self.network_role = "client"
+                self.player_role = game_state["player_role"]
+                self.opponent_role = "pc" if self.player_role == "player" else "player"
+
             # Set the current turn
             if "current_turn" in game_state:
                 self.current_turn = game_state.get("current_turn")
@@ -593,8 +258,7 @@ class MainWindow(QMainWindow):
                     # Not our turn, just wait
                     self.statusBar().showMessage("Waiting for opponent's move...")
                     # Disable turn timer if it's not our turn
-                    self.turn_timer.stop()
-                    self.progress_timer.stop()
+                    self.stop_turn_timer()
                     self.skip_button.setEnabled(False)
             else:
                 self.statusBar().showMessage("Failed to apply network game state")
@@ -612,31 +276,16 @@ class MainWindow(QMainWindow):
             return False
 
     def setup_levels(self):
-        self.level_manager.add_level([
-            {"x": 150, "y": 300, "size": 50, "owner": "player"},
-            {"x": 150, "y": 150, "size": 50, "owner": "pc"},
-            {"x": 300, "y": 150, "size": 50, "owner": "pc"},
-            {"x": 300, "y": 300, "size": 50, "owner": "neutral"}
-        ])
-        
-        self.level_manager.add_level([
-            {"x": 100, "y": 100, "size": 50, "owner": "player"},
-            {"x": 200, "y": 100, "size": 50, "owner": "neutral"},
-            {"x": 300, "y": 100, "size": 50, "owner": "pc"},
-            {"x": 400, "y": 100, "size": 50, "owner": "neutral"},
-            {"x": 250, "y": 300, "size": 50, "owner": "neutral"}
-        ])
-        
-        self.level_manager.add_level([
-            {"x": 100, "y": 300, "size": 50, "owner": "player"},
-            {"x": 200, "y": 200, "size": 50, "owner": "neutral"},
-            {"x": 300, "y": 300, "size": 50, "owner": "pc"},
-            {"x": 150, "y": 400, "size": 50, "owner": "neutral"},
-            {"x": 350, "y": 400, "size": 50, "owner": "neutral"},
-            {"x": 400, "y": 200, "size": 50, "owner": "pc"}
-        ])
+        for level_config in LEVELS:
+            self.level_manager.add_level(level_config)
 
     def load_level(self):
+        # A new board ends any lockstep session and any move being thought about
+        self.lockstep.stop()
+        self.cancel_bot_turn()
+        if self.bot is not None:
+            self.bot.warm_up()
+        
         current_level = self.level_manager.current_level_index + 1
         self.statusBar().showMessage(f"Level: {current_level}")
         self.setWindowTitle(f"Expansion War - Level {current_level}")
@@ -646,43 +295,65 @@ class MainWindow(QMainWindow):
         self.clear_all_connections_and_highlights()
         
         # Now clear the scene which will delete all units
-        self.scene.clear()
-        
-        # Clear the unit map
-        self.unit_map = {}
+        self.clear_unit_views()
         
         # Create new units for the level
         level_config = self.level_manager.get_current_level()
         if level_config:
-            for unit_config in level_config:
-                unit = Unit(**unit_config)
-                unit.main_window = self
-                self.scene.addItem(unit)
-                self.unit_map[unit.unit_id] = unit
+            states = self.engine.load_level(level_config)
+            SPRITES.preload(state.size for state in states)
+            for state in states:
+                self.add_unit_view(state)
+        self.fit_view_to_board()
         
         # Set initial game state
         self.current_turn = "player"
         self.start_turn()
 
+    def add_unit_view(self, state):
+        """Create the graphics item mirroring an engine unit"""
+        unit = Unit(state)
+        unit.main_window = self
+        self.scene.addItem(unit)
+        self.unit_map[unit.unit_id] = unit
+        return unit
+
+    def fit_view_to_board(self):
+        """Grow the scene to the loaded board and show all of it"""
+        self.scene.setSceneRect(board_rect(self.engine.board))
+        self.view.fit_board()
+
+    def clear_unit_views(self):
+        """Remove every unit item from the scene and the id index"""
+        self.scene.clear()
+        # Clear in place so anything holding the map sees the new contents
+        self.unit_map.clear()
+        self.highlighted_units.clear()
+        # scene.clear() deleted the edge layer as well
+        self.edge_layer = EdgeLayer(self.engine.board)
+        self.scene.addItem(self.edge_layer)
+
+    def on_engine_event(self, event, state, old_owner):
+        """Keep unit views in sync with ownership changes made by the engine"""
+        if event == "owner_changed":
+            unit = self.unit_map.get(state.unit_id)
+            if unit:
+                unit.sync_owner()
+
     def clear_all_connections_and_highlights(self):
-        # Create a local copy of the items to avoid modification during iteration
-        items = list(self.scene.items())
-        for item in items:
-            if isinstance(item, Unit):
-                # Clear connections
-                item.connections = []
-                # Clear highlights
-                item.is_highlighted = False
-                item.highlight_type = None
-                # Remove any temp connection lines
-                if hasattr(item, 'temp_connection_line') and item.temp_connection_line and item.temp_connection_line in self.scene.items():
-                    self.scene.removeItem(item.temp_connection_line)
-                    item.temp_connection_line = None
-                # Reset connection state
-                item.dragging_connection = False
-                item.deleting_connection = False
-        # Force scene update
-        self.scene.update()
+        # Clear connections
+        self.engine.board.clear_connections()
+        self.clear_highlights()
+        
+        for item in self.unit_map.values():
+            # Remove any temp connection lines
+            if item.temp_connection_line and item.temp_connection_line.scene() is self.scene:
+                self.scene.removeItem(item.temp_connection_line)
+            item.temp_connection_line = None
+            # Reset connection state
+            item.dragging_connection = False
+            item.deleting_connection = False
+        self.edge_layer.refresh()
 
     def next_level(self):
         if self.level_manager.next_level():
@@ -692,9 +363,8 @@ class MainWindow(QMainWindow):
 
     def reset_level(self):
         # Stop all game timers first to avoid accessing deleted objects
-        self.timer.stop()
-        self.turn_timer.stop()
-        self.progress_timer.stop()
+        self.stop_simulation()
+        self.stop_turn_timer()
         
         # Set game_over to false before loading level
         self.game_over = False
@@ -703,7 +373,7 @@ class MainWindow(QMainWindow):
         self.load_level()
         
         # Restart the unit timer after level is loaded
-        self.timer.start(1000)
+        self.start_simulation()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_N:
@@ -717,36 +387,53 @@ class MainWindow(QMainWindow):
         selected_items = self.scene.selectedItems()
         if not selected_items:
             # Only clear highlights if nothing is selected
-            for item in self.scene.items():
-                if isinstance(item, Unit):
-                    item.is_highlighted = False
-                    item.highlight_type = None
-                    item.update()
+            self.clear_highlights()
+
+    def set_highlights(self, highlights):
+        """Highlight exactly the units in {unit: highlight type}
+
+        Only units whose highlight changes are repainted.
+        """
+        for unit in self.highlighted_units.difference(highlights):
+            unit.set_highlight(None)
+        for unit, highlight_type in highlights.items():
+            unit.set_highlight(highlight_type)
+        self.highlighted_units = set(highlights)
+
+    def clear_highlights(self):
+        self.set_highlights({})
 
     def increment_all_units(self):
-        units_with_same_owner_connections = set()
-        for item in self.scene.items():
-            if isinstance(item, Unit) and item.owner != "neutral":
-                for connected_unit in item.connections:
-                    if connected_unit.owner == item.owner:
-                        units_with_same_owner_connections.add(item)
-                        units_with_same_owner_connections.add(connected_unit)
-        for item in self.scene.items():
-            if isinstance(item, Unit) and item.owner != "neutral":
-                if item in units_with_same_owner_connections:
-                    item.increase_value(2)
-                else:
-                    item.increase_value(1)
-        for item in self.scene.items():
-            if isinstance(item, Unit):
-                for connected_unit in item.connections:
-                    if item.owner != "neutral" and connected_unit.owner == "neutral":
-                        connected_unit.transfer_points(item)
-                        item.decrease_value()
-                    elif item.owner == "player" and connected_unit.owner == "pc":
-                        connected_unit.transfer_points(item)
-                    elif item.owner == "pc" and connected_unit.owner == "player":
-                        connected_unit.transfer_points(item)
+        if self.lockstep_running():
+            # Only ticks once the opponent's input for the tick has arrived
+            if self.lockstep.request_tick():
+                self.refresh_after_ticks()
+            return
+        
+        self.engine.tick()
+        self.refresh_after_ticks()
+    
+    def refresh_after_ticks(self):
+        # Only repaint bases whose label changed, update() also throws away
+        # the item's cached pixmap; zoomed out too far for labels a tick
+        # changes nothing on screen
+        zoom = self.view.zoom()
+        for unit in self.unit_map.values():
+            if unit.shows_label(zoom) and unit.label_changed():
+                unit.update()
+        
+        # Opponent actions applied with the ticks may have changed connection lines
+        self.edge_layer.refresh()
+        
+        if (self.game_mode == "Network Game" and self.network_game_ready and self.network_role == "server"
+              and not self.lockstep_running() and self.network_manager.valid_connection):
+            # While the client is away the next delta covers everything it missed
+            self.sync_network_state()
+        
+        self.check_game_over()
+    
+    def lockstep_running(self):
+        return self.lockstep.active and self.game_mode == "Network Game"
 
     def eventFilter(self, source, event):
         if source is self.view and event.type() == QtCore.QEvent.KeyPress:
@@ -797,22 +484,113 @@ class MainWindow(QMainWindow):
         
         # Start turn timer
         self.time_remaining = self.turn_duration
+        self.turn_deadline = self.clock.time + self.turn_duration
         self.turn_progress.setValue(self.time_remaining)
         self.time_label.setText(f"{self.time_remaining/1000:.1f}s")
-        self.turn_timer.start(self.turn_duration)
-        self.progress_timer.start(self.timer_tick)
+        
+        if self.bot_controls_turn():
+            self.skip_button.setEnabled(False)
+            self.start_bot_turn()
+
+    def set_bot(self, name):
+        """Choose the Single Player opponent by name, None for a second human"""
+        self.cancel_bot_turn()
+        if self.bot is not None:
+            self.bot.close()
+        ticks_per_turn = max(1, self.turn_duration // self.clock.timestep)
+        self.bot = create_bot(name, ticks_per_turn=ticks_per_turn) if name else None
+        if self.bot is not None:
+            self.bot.warm_up()
+
+    def bot_controls_turn(self):
+        return (self.bot is not None and self.game_mode == "Single Player"
+                and self.current_turn == self.bot_side and not self.game_over)
+
+    def start_bot_turn(self):
+        """Let the bot pick its move in the worker thread"""
+        time_budget = min(self.bot_think_time, self.turn_duration // 2) / 1000
+        self.bot_future = self.bot_executor.submit(
+            self.bot.choose_action, self.engine.board.copy(), self.bot_side, time_budget)
+        self.statusBar().showMessage("Red is thinking...")
+
+    def cancel_bot_turn(self):
+        """Drop the move being thought about and free the worker"""
+        if self.bot_future is not None:
+            self.bot_future.cancel()
+            self.bot.stop()
+            self.bot_future = None
+
+    def poll_bot(self):
+        """Play the bot's move once the worker has finished"""
+        future = self.bot_future
+        if future is None or not future.done():
+            return
+        self.bot_future = None
+        if not self.bot_controls_turn():
+            return
+        
+        try:
+            action = future.result()
+        except Exception as e:
+            print(f"Bot failed to choose a move: {e}")
+            action = None
+        print(f"Bot {self.bot.name} chose {action} {self.bot.stats}")
+        
+        if not self.apply_bot_action(action):
+            # Passing ends the turn right away
+            self.switch_turn()
+
+    def apply_bot_action(self, action):
+        """Play action through the unit views, returns False if it no longer applies"""
+        if action is None:
+            return False
+        source = self.unit_map.get(action["source_id"])
+        target = self.unit_map.get(action["target_id"])
+        # The board kept ticking while the bot was thinking
+        if source is None or target is None or source.owner != self.bot_side:
+            return False
+        if action["type"] == "connect" and target.state not in source.state.connections:
+            source.connect_to(target)
+            return True
+        if action["type"] == "disconnect" and target.state in source.state.connections:
+            source.disconnect_from(target)
+            return True
+        return False
+
+    def stop_turn_timer(self):
+        self.turn_deadline = None
+        self.cancel_bot_turn()
+
+    def start_simulation(self):
+        """Resume the simulation clock and the Qt timer polling it"""
+        self.clock.start()
+        self.timer.start(self.frame_interval)
+
+    def stop_simulation(self):
+        self.timer.stop()
+        self.clock.stop()
+
+    def set_simulation_speed(self, speed):
+        """Scale game time, e.g. 2.0 for double speed or None for as fast as possible"""
+        self.clock.set_speed(speed)
+
+    def on_clock_frame(self):
+        """Run the ticks that became due and advance the turn countdown"""
+        self.clock.advance()
+        self.poll_bot()
+        if self.turn_deadline is not None:
+            self.update_progress()
 
     def update_progress(self):
-        self.time_remaining -= self.timer_tick
-        if self.time_remaining < 0:
-            self.time_remaining = 0
+        self.time_remaining = max(0, int(self.turn_deadline - self.clock.time))
         self.turn_progress.setValue(self.time_remaining)
         self.time_label.setText(f"{self.time_remaining/1000:.1f}s")
+        if self.time_remaining == 0:
+            self.switch_turn()
 
     def switch_turn(self):
         """Switch the current turn between players"""
-        self.turn_timer.stop()
-        self.progress_timer.stop()
+        self.stop_turn_timer()
         
         # In network mode, only apply visual updates for turn change
         # The actual turn state is controlled by action_performed and network messages
@@ -862,6 +640,8 @@ class MainWindow(QMainWindow):
             old_game_mode = self.game_mode
             config = dialog.get_config()
             self.game_mode = config["game_mode"]
+            self.sync_mode = config.get("sync_mode", "state")
+            self.set_bot(config.get("opponent"))
             self.network_ip = config["ip_address"]
             self.network_port = config["port"]
             self.network_role = config.get("network_role", "server")
@@ -896,8 +676,8 @@ class MainWindow(QMainWindow):
             print(f"Starting server on {self.network_ip}:{self.network_port}")
             self.statusBar().showMessage("Starting server and waiting for client...")
             
-            # Add delay before starting server to ensure ports are released
-            QTimer.singleShot(1000, lambda: self.start_server_with_delay())
+            # stop() above already released the port, start right away
+            self.start_network_server(self.network_ip, self.network_port)
         else:
             # As client, we're the second player (RED)
             self.player_role = "pc"  # Client is always RED
@@ -929,16 +709,6 @@ class MainWindow(QMainWindow):
             # Attempt connection (will retry automatically)
             self.network_manager.connect_to_server(self.network_ip, self.network_port)
 
-    def start_server_with_delay(self):
-        """Start server with proper delay to allow port binding"""
-        import time
-        # Sleep to ensure socket is fully released
-        time.sleep(1.0)
-        self.network_manager.start_server(self.network_ip, self.network_port)
-        # After server starts, add additional delay to allow OS to properly set up the socket
-        time.sleep(0.5)
-        print("Server started with extra timeout protection")
-
     def on_network_connected(self, success, message):
         """Handle network connection event"""
         print(f"Network connected: {success}, {message}")
@@ -950,8 +720,15 @@ class MainWindow(QMainWindow):
                 self.statusBar().showMessage("Connected to server. Waiting for game to start...")
                 print("Waiting for initial game state from server")
                 
+                # A new session, the server could not resume the old one
+                self.stop_resuming()
+                self.network_game_ready = False
+                
                 # Prepare game for network play by resetting
                 self.reset_level()
+        elif self.resuming:
+            # The host may still be restarting its server, keep trying until the timeout
+            QTimer.singleShot(self.resume_retry_delay, self.reconnect_session)
         else:
             print(f"Network connection failed: {message}")
             QMessageBox.critical(self, "Network Error", message)
@@ -961,6 +738,13 @@ class MainWindow(QMainWindow):
     def on_network_disconnected(self, message):
         """Handle network disconnection event"""
         print(f"Network disconnected: {message}")
+        self.latency_label.setText("")
+        
+        if (self.game_mode == "Network Game" and self.network_game_ready and self.network_manager.session_token
+                and "user initiated" not in message.lower()):
+            self.resume_session(message)
+            return
+        self.lockstep.stop()
         
         # Check for specific Windows socket error 10054 (Connection reset by peer)
         is_reset_error = "10054" in message or "reset by peer" in message.lower()
@@ -1012,6 +796,43 @@ class MainWindow(QMainWindow):
             self.network_game_ready = False
             self.network_manager.connection_verified = False  # Ensure connection state is cleared
 
+    def resume_session(self, message):
+        """Reconnect in the background and continue the same game"""
+        print(f"Connection lost ({message}), resuming the session")
+        self.statusBar().showMessage("Connection lost. Resuming the network game...")
+        if not self.resuming:
+            self.resuming = True
+            self.resume_timer.start(self.resume_timeout)
+        
+        if self.network_role == "server":
+            # Listen again, the client comes back with its session token
+            self.start_network_server(self.network_ip, self.network_port, resume=True)
+        else:
+            QTimer.singleShot(self.resume_retry_delay, self.reconnect_session)
+    
+    def reconnect_session(self):
+        if self.resuming:
+            self.network_manager.connect_to_server(self.network_ip, self.network_port, resume=True)
+    
+    def on_session_resumed(self):
+        """The opponent is back, only the missed messages were exchanged"""
+        print("Network session resumed")
+        self.stop_resuming()
+        self.statusBar().showMessage("Network game resumed")
+    
+    def stop_resuming(self):
+        self.resuming = False
+        self.resume_timer.stop()
+    
+    def on_resume_timeout(self):
+        """Give up on the session and fall back to a regular reconnect"""
+        if not self.resuming:
+            return
+        self.stop_resuming()
+        self.network_manager.stop()
+        self.network_manager.end_session()
+        self.on_network_disconnected("The network game could not be resumed")
+
     def attempt_reconnection(self, ip, port, role):
         """Attempt to reconnect to the server or restart the server"""
         self.network_ip = ip
@@ -1041,7 +862,7 @@ class MainWindow(QMainWindow):
             # Set a longer delay to ensure ports are fully released
             QTimer.singleShot(1000, lambda: self.start_network_server(ip, port))
 
-    def start_network_server(self, ip, port):
+    def start_network_server(self, ip, port, resume=False):
         """Start the network server with error handling"""
         try:
             # Make sure any previous server is fully stopped
@@ -1051,7 +872,7 @@ class MainWindow(QMainWindow):
                 print("NetworkManager.stop() doesn't accept additional parameters")
             
             # Now start a fresh server instance
-            self.network_manager.start_server(ip, port)
+            self.network_manager.start_server(ip, port, resume)
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -1086,6 +907,7 @@ class MainWindow(QMainWindow):
                 # Check if this connection has already been processed
                 if not self.network_manager.connection_processed:
                     self.network_manager.connection_processed = True
+                    self.stop_resuming()
                     
                     # Update UI to show connection
                     client_addr = message.data.get('address', 'unknown')
@@ -1101,13 +923,45 @@ class MainWindow(QMainWindow):
             # Received game state update
             print("Received game state from server")
             
-            # As client, restart game before applying network state
-            if self.network_role == "client":
-                self.reset_level()
+            if self.network_game_ready and self.network_role == "client" and "state_version" in message.data:
+                # Periodic snapshot during a running game, apply it in place
+                self.apply_state_snapshot(message.data)
+            else:
+                # As client, restart game before applying network state
+                if self.network_role == "client":
+                    self.reset_level()
+                    
+                # Apply the received state
+                self.apply_network_game_state(message.data)
+                self.network_game_ready = True
+                
+                if "state_version" in message.data:
+                    self.state_version = message.data["state_version"]
+                    self.network_manager.send_state_ack(self.state_version)
                 
-            # Apply the received state
-            self.apply_network_game_state(message.data)
-            self.network_game_ready = True
+                if self.network_role == "client":
+                    self.prediction.clear()
+                    self.prediction.reset(message.data.get("units", []), message.data.get("tick", 0))
+                    
+                    # The host chooses how the game is kept in sync
+                    self.sync_mode = message.data.get("sync_mode", "state")
+                    if self.sync_mode == "lockstep":
+                        self.lockstep.start(message.data.get("lockstep_epoch"))
+    
+        elif message.type == NetworkMessage.GAME_STATE_DELTA:
+            if self.network_game_ready and self.network_role == "client":
+                self.apply_state_delta(message.data)
+    
+        elif message.type == NetworkMessage.STATE_ACK:
+            if self.network_role == "server":
+                self.state_tracker.ack(message.data.get("version", 0))
+                if message.data.get("resync"):
+                    print("Client requested a full state snapshot")
+                    self.send_state_snapshot()
+    
+        elif message.type == NetworkMessage.LOCKSTEP_INPUT:
+            if self.lockstep_running() and self.lockstep.receive(message.data):
+                self.refresh_after_ticks()
     
         elif message.type == NetworkMessage.ACTION:
             # Process received action
@@ -1171,8 +1025,7 @@ class MainWindow(QMainWindow):
                     else:
                         self.statusBar().showMessage(f"Waiting for opponent's move... ({next_turn}'s turn)")
                         # Disable our controls since it's not our turn
-                        self.turn_timer.stop()
-                        self.progress_timer.stop()
+                        self.stop_turn_timer()
                         self.skip_button.setEnabled(False)
                         # Still update the turn indicator
                         self.update_turn_indicator()
@@ -1186,8 +1039,9 @@ class MainWindow(QMainWindow):
             # Restart game before sending initial state
             self.reset_level()
             
-            # Add delay before sending game state to ensure connection is stable
-            QTimer.singleShot(1000, self.send_initial_game_state)
+            # The handshake already verified the connection, the client
+            # acknowledges the state once it arrives
+            self.send_initial_game_state()
         else:
             print("Connection not verified - cannot show connection dialog")
 
@@ -1206,53 +1060,158 @@ class MainWindow(QMainWindow):
         # Add network-specific details
         game_state["network_role"] = self.network_role
         
+        # Deltas are versioned from this snapshot on
+        self.state_tracker.reset()
+        self.state_tracker.commit(self.engine.board)
+        self.state_tracker.mark_full_snapshot_sent()
+        game_state["state_version"] = self.state_tracker.version
+        self.last_remote_action = 0
+        game_state["last_action"] = 0
+        
+        # Lockstep starts from exactly this board and tick on both sides
+        game_state["sync_mode"] = self.sync_mode
+        if self.sync_mode == "lockstep":
+            game_state["lockstep_epoch"] = self.lockstep.start()
+        
         # Always set initial turn to "player" (GREEN) which is the host
         game_state["current_turn"] = "player"
         self.current_turn = "player"  # Make sure our local state matches
         
-        # Sleep before sending to ensure client socket is ready
-        import time
-        time.sleep(1.0)        
-        
-        success = self.network_manager.broadcast_game_state(game_state)
+        success = self.network_manager.broadcast_game_state(game_state, on_ack=self.on_initial_game_state_acked)
         
         if success:
-            print("Game state sent successfully")
-            self.network_game_ready = True
-            self.statusBar().showMessage("Game state sent. It's your turn (GREEN)!")
-            self.start_turn()
+            print("Game state sent, waiting for the client to acknowledge it")
+            self.statusBar().showMessage("Game state sent. Waiting for the client...")
             
-            # Add verification timer to check connection
-            QTimer.singleShot(2000, self.verify_client_still_connected)       
+            # Give up if the client never confirms the state
+            QTimer.singleShot(self.ack_timeout, self.verify_client_still_connected)
         else:
             print("Failed to send initial game state")
             QMessageBox.warning(self, "Network Error", 
                                "Failed to send initial game state to client. Connection may have been lost.")
 
+    def sync_network_state(self):
+        """Send the client what changed on the board since its last ack"""
+        if not self.state_tracker.commit(self.engine.board):
+            return
+        if self.state_tracker.acked_version is None:
+            # Initial snapshot still in flight, the next delta covers this change
+            return
+        if self.state_tracker.needs_full_snapshot():
+            self.send_state_snapshot()
+        else:
+            delta = self.state_tracker.make_delta(self.engine.board, self.engine.tick_count)
+            delta["last_action"] = self.last_remote_action
+            self.network_manager.send_state_delta(delta)
+    
+    def send_state_snapshot(self):
+        """Send a full versioned snapshot the client can apply in place"""
+        self.state_tracker.commit(self.engine.board)
+        game_state = self.get_current_game_state()
+        game_state["state_version"] = self.state_tracker.version
+        game_state["last_action"] = self.last_remote_action
+        if self.lockstep.active:
+            game_state["sync_mode"] = "lockstep"
+            game_state["lockstep_epoch"] = self.lockstep.epoch
+        if self.network_manager.broadcast_game_state(game_state):
+            self.state_tracker.mark_full_snapshot_sent()
+    
+    def apply_state_delta(self, delta):
+        """Apply a GAME_STATE_DELTA to the running game without a reset"""
+        version = delta.get("version", 0)
+        if version <= self.state_version:
+            return  # Already applied
+        if delta.get("base", 0) > self.state_version:
+            # We missed versions the delta does not cover
+            print(f"State delta base {delta.get('base')} is ahead of {self.state_version}, requesting resync")
+            self.network_manager.send_state_ack(self.state_version, resync=True)
+            return
+        
+        if self.client_prediction:
+            self.prediction.apply_delta(delta)
+            self.update_unit_views(self.prediction.reconcile(self.engine))
+        else:
+            self.update_unit_views(apply_delta(self.engine, delta))
+        self.state_version = version
+        self.network_manager.send_state_ack(version)
+    
+    def apply_state_snapshot(self, game_state):
+        """Bring the running game to a full snapshot without a reset"""
+        units = game_state.get("units", [])
+        tick = game_state.get("tick", 0)
+        if "lockstep_epoch" in game_state:
+            # Lockstep resync: take the host's board and restart from its tick
+            self.update_unit_views(apply_delta(self.engine, snapshot_to_delta(self.engine.board, units, tick)))
+            self.lockstep.start(game_state["lockstep_epoch"])
+        elif self.client_prediction:
+            self.prediction.reset(units, tick, game_state.get("last_action", 0))
+            self.update_unit_views(self.prediction.reconcile(self.engine))
+        else:
+            self.update_unit_views(apply_delta(self.engine, snapshot_to_delta(self.engine.board, units, tick)))
+        self.state_version = game_state["state_version"]
+        self.network_manager.send_state_ack(self.state_version)
+    
+    def on_latency_updated(self, rtt, jitter, loss):
+        self.latency_label.setText(f"Ping: {rtt:.0f} ms \u00b1{jitter:.0f} ({loss:.0%} loss)")
+    
+    def on_lockstep_desync(self, tick, local_hash, remote_hash):
+        """The boards diverged, the host's board wins"""
+        print(f"Lockstep desync at tick {tick}: local {local_hash:08x}, remote {remote_hash:08x}")
+        self.statusBar().showMessage(f"Desync detected at tick {tick}, resynchronizing...")
+        if self.network_role == "server":
+            # Restart lockstep from our board, inputs of the old epoch are dropped
+            self.lockstep.start()
+            self.send_state_snapshot()
+    
+    def update_unit_views(self, changes):
+        """Mirror the result of apply_delta on the unit views"""
+        for unit_id in changes["removed"]:
+            unit = self.unit_map.pop(unit_id, None)
+            self.highlighted_units.discard(unit)
+            if unit and unit.scene() is self.scene:
+                self.scene.removeItem(unit)
+        for state in changes["added"]:
+            self.add_unit_view(state)
+        if changes["added"]:
+            # Grow the scene for new bases without moving the view
+            self.scene.setSceneRect(self.scene.sceneRect().united(board_rect(self.engine.board)))
+        for unit_id in changes["changed"]:
+            unit = self.unit_map.get(unit_id)
+            if unit:
+                unit.setPos(unit.state.x, unit.state.y)
+                unit.sync_owner()
+                unit.update()
+        self.edge_layer.refresh()
+        self.check_game_over()
+    
+    def on_initial_game_state_acked(self):
+        """The client received the initial game state, the game can start"""
+        print("Client acknowledged the initial game state")
+        self.network_game_ready = True
+        self.statusBar().showMessage("Network game ready. It's your turn (GREEN)!")
+        self.start_turn()
+
     def verify_client_still_connected(self):
-        """Verify client is still connected after game state sent"""
+        """Verify the client acknowledged the game state in time"""
+        if self.network_game_ready:
+            return
         if not self.network_manager.valid_connection:
             print("Client disconnected after game state was sent")
             QMessageBox.warning(self, "Client Disconnected", 
                              "Client disconnected shortly after receiving game state.")
-            self.game_mode = "Single Player"
-            self.statusBar().showMessage("Client disconnected. Switched to Single Player mode.")
-            self.network_game_ready = False
         else:
-            print("Client connection verified after game state sent")
-            self.statusBar().showMessage("Network game ready. Your turn!")
+            print("Client did not acknowledge the game state")
+            QMessageBox.warning(self, "Client Not Responding", 
+                             "Client did not confirm the game state.")
+        self.lockstep.stop()
+        self.game_mode = "Single Player"
+        self.statusBar().showMessage("Client not responding. Switched to Single Player mode.")
 
     def find_unit_by_id(self, unit_id):
-        """Find a unit by its ID"""
-        if isinstance(unit_id, str):
-            try:
-                unit_id = int(unit_id)
-            except ValueError:
-                return None
-        for item in self.scene.items():
-            if isinstance(item, Unit) and item.unit_id == unit_id:
-                return item
-        return None
+        """Find a unit by its ID, the board index allocated by the engine"""
+        if not isinstance(unit_id, int) or isinstance(unit_id, bool):
+            return None
+        return self.unit_map.get(unit_id)
 
     def action_performed(self, action_data=None):
         """Called when a player performs an action (connect/disconnect)"""
@@ -1260,8 +1219,16 @@ class MainWindow(QMainWindow):
             # In network mode, send the action to the other player
             if self.game_mode == "Network Game" and self.network_game_ready:
                 if action_data:
-                    # Send action to remote player
-                    self.network_manager.send_action(action_data)
+                    if self.lockstep_running():
+                        # Goes out with our input for the tick it applies on
+                        self.lockstep.record_local_action(action_data)
+                    else:
+                        # Our own actions are replayed on top of host updates until confirmed
+                        if self.network_role == "client":
+                            self.prediction.record_action(action_data)
+                        
+                        # Send action to remote player
+                        self.network_manager.send_action(action_data)
                     
                     # Calculate next turn
                     next_turn = self.opponent_role
@@ -1271,7 +1238,7 @@ class MainWindow(QMainWindow):
                     turn_message = {
                         "next_turn": next_turn,
                         "current_player": self.player_role,
-                        "action_id": id(action_data)  # Unique ID for this action
+                        "action_id": next(self.action_ids)  # Unique ID for this action
                     }
                     self.network_manager.send_turn_change(turn_message)
                     self.statusBar().showMessage(f"Action sent to opponent. Switching to {next_turn}'s turn.")
@@ -1290,38 +1257,12 @@ class MainWindow(QMainWindow):
         if self.game_over:
             return
         
-        # Count units of each type
-        green_units = 0
-        red_units = 0
-        total_units = 0
-        
-        for item in self.scene.items():
-            if isinstance(item, Unit):
-                total_units += 1
-                if item.owner == "player":
-                    green_units += 1
-                elif item.owner == "pc":
-                    red_units += 1
-        
-        # Only determine a winner if we have actual units in the scene
-        if total_units == 0:
-            return
-        
-        winner = None
-        if green_units == 0 and red_units > 0:
-            winner = "red"
-        elif red_units == 0 and green_units > 0:
-            winner = "green"
-        # Only actually end the game if there are at least some units owned by either player
-        # and one player has no units
-        elif (green_units + red_units) > 0 and (green_units == 0 or red_units == 0):
-            winner = "green" if green_units > 0 else "red"
+        winner = self.engine.winner()
         
         if winner:
             self.game_over = True
-            self.turn_timer.stop()
-            self.progress_timer.stop()
-            self.timer.stop()
+            self.stop_turn_timer()
+            self.stop_simulation()
             self.show_game_over_dialog(winner)
 
     def show_game_over_dialog(self, winner):
@@ -1329,12 +1270,12 @@ class MainWindow(QMainWindow):
         dialog.setWindowTitle("Game Over!")
         if winner == "green":
             dialog.setIcon(QMessageBox.Information)
-            dialog.setWindowIcon(QIcon(QPixmap(":/images/grafika/green.bmp")))
+            dialog.setWindowIcon(QIcon(SPRITES.source("player")))
             dialog.setText("<h2>Green Player Wins!</h2>")
             dialog.setInformativeText("Green player has conquered the map!")
         else:
             dialog.setIcon(QMessageBox.Information)
-            dialog.setWindowIcon(QIcon(QPixmap(":/images/grafika/red.bmp")))
+            dialog.setWindowIcon(QIcon(SPRITES.source("pc")))
             dialog.setText("<h2>Red Player Wins!</h2>")
             dialog.setInformativeText("Red player has conquered the map!")
         
@@ -1347,22 +1288,20 @@ class MainWindow(QMainWindow):
         if clicked_button == restart_button:
             self.game_over = False
             # Stop all timers before resetting
-            self.turn_timer.stop()
-            self.progress_timer.stop()
-            self.timer.stop()
+            self.stop_turn_timer()
+            self.stop_simulation()
             QTimer.singleShot(100, self.reset_level)  # Use timer to ensure dialog is fully closed
         elif clicked_button == next_level_button:
             self.game_over = False
             # Stop all timers before moving to next level
-            self.turn_timer.stop()
-            self.progress_timer.stop()
-            self.timer.stop()
+            self.stop_turn_timer()
+            self.stop_simulation()
             QTimer.singleShot(100, self.next_level)  # Use timer to ensure dialog is fully closed
 
     def save_game(self):
         """Save current game state"""
         # Check if there are units to save
-        if not any(isinstance(item, Unit) for item in self.scene.items()):
+        if not len(self.engine.board):
             QMessageBox.warning(self, "Cannot Save", "There is no active game to save.")
             return
         
@@ -1426,6 +1365,7 @@ class MainWindow(QMainWindow):
                 # Load from MongoDB
                 success, message, game_state = self.db_handler.load_from_mongodb(load_info["game_id"])
                 if success:
+                    game_state["units"] = compact_unit_ids(game_state.get("units", []))
                     self.apply_game_state(game_state)
                     QMessageBox.information(self, "Game Loaded", "Game state loaded from MongoDB successfully.")
                 else:
@@ -1438,6 +1378,7 @@ class MainWindow(QMainWindow):
                     success, message, game_state = self.db_handler.load_from_xml_file(load_info["filepath"])
                 
                 if success:
+                    game_state["units"] = compact_unit_ids(game_state.get("units", []))
                     self.apply_game_state(game_state)
                     QMessageBox.information(self, "Game Loaded", "Game state loaded successfully.")
                 else:
@@ -1459,48 +1400,17 @@ class MainWindow(QMainWindow):
 
     def get_current_game_state(self):
         """Collect current game state"""
-        units = []
-        
-        # Count units by owner
-        player_units = 0
-        pc_units = 0
-        
-        # Collect unit data
-        for item in self.scene.items():
-            if isinstance(item, Unit):
-                unit_data = {
-                    "id": item.unit_id,
-                    "owner": item.owner,
-                    "value": item.value,
-                    "x": item.pos().x(),
-                    "y": item.pos().y(),
-                    "size": item.size
-                }
-                
-                # Count by owner
-                if item.owner == "player":
-                    player_units += 1
-                elif item.owner == "pc":
-                    pc_units += 1
-                
-                # If neutral, include points
-                if item.owner == "neutral":
-                    unit_data["player_points"] = item.player_points
-                    unit_data["pc_points"] = item.pc_points
-                
-                # Include connections
-                unit_data["connections"] = [conn.unit_id for conn in item.connections]
-                
-                units.append(unit_data)
+        counts = self.engine.owner_counts()
         
         # Create game state
         game_state = {
             "level": self.level_manager.current_level_index + 1,
+            "tick": self.engine.tick_count,
             "current_turn": self.current_turn,
             "game_mode": self.game_mode,
-            "player_units": player_units,
-            "pc_units": pc_units,
-            "units": units
+            "player_units": counts["player"],
+            "pc_units": counts["pc"],
+            "units": self.engine.board.to_dicts()
         }
         
         return game_state
@@ -1515,52 +1425,20 @@ class MainWindow(QMainWindow):
                     self.level_manager.current_level_index = level_idx
             
             # Stop all timers
-            self.timer.stop()
-            self.turn_timer.stop()
-            self.progress_timer.stop()
+            self.stop_simulation()
+            self.stop_turn_timer()
             
             # Clear the game state
             self.game_over = False
             self.clear_all_connections_and_highlights()
-            self.scene.clear()
-            self.unit_map = {}
+            self.clear_unit_views()
             
-            # Create units from game state
-            for unit_data in game_state.get("units", []):
-                unit = Unit(
-                    x=unit_data.get("x", 0),
-                    y=unit_data.get("y", 0),
-                    size=unit_data.get("size", 40),
-                    owner=unit_data.get("owner", "neutral")
-                )
-                unit.unit_id = unit_data.get("id", id(unit))
-                unit.value = unit_data.get("value", 0 if unit.owner != "neutral" else 10)
-                unit.main_window = self
-                
-                if unit.owner == "neutral":
-                    unit.player_points = unit_data.get("player_points", 0)
-                    unit.pc_points = unit_data.get("pc_points", 0)
-                
-                self.scene.addItem(unit)
-                self.unit_map[unit.unit_id] = unit
-            
-            # Create connections
-            for unit_data in game_state.get("units", []):
-                unit_id = unit_data.get("id")
-                if unit_id in self.unit_map:
-                    unit = self.unit_map[unit_id]
-                    
-                    # Establish connections
-                    for conn_id in unit_data.get("connections", []):
-                        if conn_id in self.unit_map and self.unit_map[conn_id] not in unit.connections:
-                            connected_unit = self.unit_map[conn_id]
-                            unit.connections.append(connected_unit)
-                            if unit not in connected_unit.connections:
-                                connected_unit.connections.append(unit)
+            # Create units and connections from game state
+            for state in self.engine.load_state(game_state.get("units", []), game_state.get("tick", 0)):
+                self.add_unit_view(state)
             
-            # Update all units to correctly draw connections
-            for unit_id, unit in self.unit_map.items():
-                unit.update()
+            self.edge_layer.refresh()
+            self.fit_view_to_board()
             
             # Set game state
             self.current_turn = game_state.get("current_turn", "player")
@@ -1573,7 +1451,7 @@ class MainWindow(QMainWindow):
             
             # Restart timers and turn
             self.start_turn()
-            self.timer.start(1000)
+            self.start_simulation()
             
             # Check for game over
             self.check_game_over()
@@ -1589,6 +1467,10 @@ class MainWindow(QMainWindow):
         """Override close to properly disconnect network"""
         if hasattr(self, 'network_manager'):
             self.network_manager.stop()
+        self.cancel_bot_turn()
+        if self.bot is not None:
+            self.bot.close()
+        self.bot_executor.shutdown(wait=False)
         super().close()
 
     def on_server_status_changed(self, is_running, status_message):
@@ -1764,6 +1646,11 @@ class MainWindow(QMainWindow):
         self.time_label.setStyleSheet("font-weight: bold; margin: 0px 10px;")
         turn_toolbar.addWidget(self.time_label)
         
+        # Round trip time to the opponent, only shown in network games
+        self.latency_label = QLabel("")
+        self.latency_label.setStyleSheet("color: gray; margin: 0px 10px;")
+        turn_toolbar.addWidget(self.latency_label)
+        
         spacer = QWidget()
         spacer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
         turn_toolbar.addWidget(spacer)
@@ -0,0 +1,275 @@
+"""
+Wire encodings for NetworkMessage payloads.
+
+Two codecs are available:
+
+* JsonCodec   - the original JSON text encoding, understood by every peer
+* BinaryCodec - a compact msgpack-style tagged encoding built on struct,
+                with one byte codes for the keys and strings the game sends
+                all the time and zlib compression for large payloads
+
+Peers agree on a codec during the HANDSHAKE_REQUEST / HANDSHAKE_RESPONSE
+exchange (see NetworkManager). Handshakes themselves are always JSON, and
+decode_payload() detects the codec from the first byte, so a peer can always
+read whatever it is sent. Both sides also announce the length of their
+KNOWN_STRINGS table, and codec_for() only uses the codes both of them know.
+
+Both codecs carry an optional per-connection sequence number next to the
+message type, used by NetworkManager to acknowledge delivery.
+"""
+
+import json
+import struct
+import zlib
+
+BINARY_MAGIC = 0xB1  # First byte of every binary payload, JSON always starts with "{"
+FLAG_COMPRESSED = 0x01
+FLAG_SEQ = 0x02  # A varint sequence number follows the header
+COMPRESS_THRESHOLD = 512  # Only compress payloads larger than this many bytes
+
+# Value tags
+TAG_NONE = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT = 0x03     # Zigzag varint
+TAG_FLOAT = 0x04   # IEEE 754 double
+TAG_STR = 0x05     # Varint length + UTF-8
+TAG_LIST = 0x06    # Varint count + items
+TAG_DICT = 0x07    # Varint count + key/value pairs
+TAG_BYTES = 0x08   # Varint length + raw bytes
+TAG_KNOWN_STR = 0x40  # 0x40-0x7F: index into KNOWN_STRINGS
+TAG_SMALL_INT = 0x80  # 0x80-0xFF: non-negative ints 0-127
+
+# Keys and values sent in almost every message. Append only: the index is
+# the wire format, reordering breaks compatibility with older binary peers,
+# and strings past the table of the peer are sent in full.
+KNOWN_STRINGS = [
+    "type", "source_id", "target_id", "tick", "id", "owner", "value", "x",
+    "y", "size", "player_points", "pc_points", "connections", "units",
+    "level", "current_turn", "game_mode", "player_units", "pc_units",
+    "network_role", "next_turn", "current_player", "action_id", "player",
+    "pc", "neutral", "connect", "disconnect", "server", "client",
+    "Network Game", "Single Player", "Two Players Local", "version", "seq",
+    "ack", "status", "error", "base", "added", "removed", "state_version",
+    "resync", "actions", "hash", "epoch", "sync_mode", "lockstep_epoch",
+    "lockstep", "state", "ping",
+]
+KNOWN_STRING_CODES = {s: i for i, s in enumerate(KNOWN_STRINGS)}
+BASE_KNOWN_STRINGS = 38  # Table of the first binary peers, which do not announce its length
+
+DOUBLE = struct.Struct("!d")
+HEADER = struct.Struct("!BBB")  # magic, flags, message type
+
+
+class CodecError(Exception):
+    """Raised when a payload cannot be decoded"""
+
+
+class JsonCodec:
+    """Plain JSON encoding, the fallback every peer supports"""
+    name = "json"
+
+    def encode(self, msg_type, data, seq=None):
+        msg_dict = {"type": msg_type, "data": data}
+        if seq is not None:
+            msg_dict["seq"] = seq
+        return json.dumps(msg_dict).encode('utf-8')
+
+    def decode(self, payload):
+        try:
+            msg_dict = json.loads(payload.decode('utf-8'))
+            return msg_dict["type"], msg_dict["data"], msg_dict.get("seq")
+        except (UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            raise CodecError(f"Invalid JSON message: {str(e)}")
+
+
+class BinaryCodec:
+    """Compact tagged binary encoding
+
+    Only the first known_strings entries of KNOWN_STRINGS are sent as codes,
+    so a peer with a shorter table can read the messages.
+    """
+    name = "binary"
+
+    def __init__(self, compress_threshold=COMPRESS_THRESHOLD, known_strings=len(KNOWN_STRINGS)):
+        self.compress_threshold = compress_threshold
+        self.known_strings = known_strings
+
+    def encode(self, msg_type, data, seq=None):
+        body = bytearray()
+        write_value(body, data, self.known_strings)
+        flags = 0
+        if len(body) > self.compress_threshold:
+            compressed = zlib.compress(bytes(body), 6)
+            if len(compressed) < len(body):
+                body = compressed
+                flags |= FLAG_COMPRESSED
+
+        prefix = bytearray()
+        if seq is not None:
+            flags |= FLAG_SEQ
+            write_varint(prefix, seq)
+        return HEADER.pack(BINARY_MAGIC, flags, msg_type) + bytes(prefix) + bytes(body)
+
+    def decode(self, payload):
+        if len(payload) < HEADER.size:
+            raise CodecError("Binary message too short")
+        magic, flags, msg_type = HEADER.unpack_from(payload)
+        if magic != BINARY_MAGIC:
+            raise CodecError("Not a binary message")
+        body = payload[HEADER.size:]
+        seq = None
+        try:
+            if flags & FLAG_SEQ:
+                seq, offset = read_varint(body, 0)
+                body = body[offset:]
+            if flags & FLAG_COMPRESSED:
+                body = zlib.decompress(body)
+            data, offset = read_value(body, 0)
+        except (zlib.error, IndexError, struct.error, UnicodeDecodeError) as e:
+            raise CodecError(f"Corrupt binary message: {str(e)}")
+        if offset != len(body):
+            raise CodecError("Trailing bytes in binary message")
+        return msg_type, data, seq
+
+
+JSON_CODEC = JsonCodec()
+BINARY_CODEC = BinaryCodec()
+CODECS = {codec.name: codec for codec in (BINARY_CODEC, JSON_CODEC)}
+SUPPORTED_CODECS = [BINARY_CODEC.name, JSON_CODEC.name]  # In order of preference
+
+
+def decode_payload(payload):
+    """Decode a payload with whichever codec produced it"""
+    if payload and payload[0] == BINARY_MAGIC:
+        return BINARY_CODEC.decode(payload)
+    return JSON_CODEC.decode(payload)
+
+
+def choose_codec(offered):
+    """Pick the preferred codec from the names a peer offered"""
+    for name in SUPPORTED_CODECS:
+        if name in (offered or []):
+            return name
+    return JSON_CODEC.name
+
+
+def codec_for(name, known_strings=None):
+    """Codec called name for a peer that announced a table of known_strings"""
+    if name != BINARY_CODEC.name:
+        return CODECS.get(name, JSON_CODEC)
+    known_strings = min(known_strings or BASE_KNOWN_STRINGS, len(KNOWN_STRINGS))
+    if known_strings == BINARY_CODEC.known_strings:
+        return BINARY_CODEC
+    return BinaryCodec(known_strings=known_strings)
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(buf, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+
+def write_value(out, value, known_strings=len(KNOWN_STRINGS)):
+    if value is None:
+        out.append(TAG_NONE)
+    elif value is True:
+        out.append(TAG_TRUE)
+    elif value is False:
+        out.append(TAG_FALSE)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            out.append(TAG_SMALL_INT | value)
+        else:
+            out.append(TAG_INT)
+            # Zigzag so small negative numbers stay small
+            write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+    elif isinstance(value, float):
+        out.append(TAG_FLOAT)
+        out.extend(DOUBLE.pack(value))
+    elif isinstance(value, str):
+        code = KNOWN_STRING_CODES.get(value)
+        if code is not None and code < known_strings:
+            out.append(TAG_KNOWN_STR | code)
+        else:
+            encoded = value.encode('utf-8')
+            out.append(TAG_STR)
+            write_varint(out, len(encoded))
+            out.extend(encoded)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(TAG_BYTES)
+        write_varint(out, len(value))
+        out.extend(value)
+    elif isinstance(value, (list, tuple)):
+        out.append(TAG_LIST)
+        write_varint(out, len(value))
+        for item in value:
+            write_value(out, item, known_strings)
+    elif isinstance(value, dict):
+        out.append(TAG_DICT)
+        write_varint(out, len(value))
+        for key, item in value.items():
+            write_value(out, key, known_strings)
+            write_value(out, item, known_strings)
+    else:
+        # Same fallback as json.dump(..., default=str) used for saves
+        write_value(out, str(value), known_strings)
+
+
+def read_value(buf, offset):
+    tag = buf[offset]
+    offset += 1
+
+    if tag >= TAG_SMALL_INT:
+        return tag - TAG_SMALL_INT, offset
+    if tag >= TAG_KNOWN_STR:
+        index = tag - TAG_KNOWN_STR
+        if index >= len(KNOWN_STRINGS):
+            raise CodecError(f"Unknown string code {index}")
+        return KNOWN_STRINGS[index], offset
+    if tag == TAG_NONE:
+        return None, offset
+    if tag == TAG_FALSE:
+        return False, offset
+    if tag == TAG_TRUE:
+        return True, offset
+    if tag == TAG_INT:
+        raw, offset = read_varint(buf, offset)
+        return (raw >> 1) if not raw & 1 else -((raw + 1) >> 1), offset
+    if tag == TAG_FLOAT:
+        (value,) = DOUBLE.unpack_from(buf, offset)
+        return value, offset + DOUBLE.size
+    if tag in (TAG_STR, TAG_BYTES):
+        length, offset = read_varint(buf, offset)
+        raw = bytes(buf[offset:offset + length])
+        if len(raw) != length:
+            raise CodecError("Truncated string")
+        return (raw.decode('utf-8') if tag == TAG_STR else raw), offset + length
+    if tag == TAG_LIST:
+        count, offset = read_varint(buf, offset)
+        items = []
+        for _ in range(count):
+            item, offset = read_value(buf, offset)
+            items.append(item)
+        return items, offset
+    if tag == TAG_DICT:
+        count, offset = read_varint(buf, offset)
+        result = {}
+        for _ in range(count):
+            key, offset = read_value(buf, offset)
+            result[key], offset = read_value(buf, offset)
+        return result, offset
+    raise CodecError(f"Unknown value tag 0x{tag:02x}")
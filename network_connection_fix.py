@@ -5,26 +5,36 @@ It contains functions to force redraw of connections and ensure they're visible
 between client and server.
 """
 
-def enhance_connection_drawing(scene):
+def enhance_connection_drawing(scene, units=None, edge_layer=None):
     """
-    Force a complete redraw of all connections in the scene
+    Force a redraw of all connections in the scene
     to ensure they're visible, especially in network games.
+    
+    Pass the unit views (e.g. main_window.unit_map.values()) to avoid
+    scanning every item in the scene, and the EdgeLayer drawing the
+    connections to repaint only the lines that changed instead of the
+    whole scene.
     """
     if not scene:
         return False
     
     try:
+        if units is None:
+            from unit import Unit
+            units = [item for item in scene.items() if isinstance(item, Unit)]
+        
         # First, ensure all units are updated
-        for item in scene.items():
+        for item in units:
             try:
-                from unit import Unit
-                if isinstance(item, Unit):
-                    item.update()
-            except (ImportError, AttributeError) as e:
+                item.update()
+            except AttributeError as e:
                 print(f"Error during unit update: {str(e)}")
         
-        # Then force a complete scene update
-        scene.update()
+        if edge_layer is not None:
+            edge_layer.refresh()
+        else:
+            # Then force a complete scene update
+            scene.update()
         return True
     except Exception as e:
         print(f"Error enhancing connection drawing: {str(e)}")
@@ -41,28 +51,15 @@ def apply_connection_fixes(main_window):
         return False
     
     try:
-        # Perform immediate update
-        enhance_connection_drawing(main_window.scene)
-        
-        # Schedule delayed updates to ensure all connections appear
-        from PyQt5.QtCore import QTimer
-        QTimer.singleShot(500, lambda: enhance_connection_drawing(main_window.scene))
-        QTimer.singleShot(1000, lambda: enhance_connection_drawing(main_window.scene))
+        # The edge layer follows the board, so one refresh shows every
+        # connection and no delayed full-scene redraws are needed
+        main_window.edge_layer.refresh()
         
         # Add debug information if connections exist
-        connection_count = 0
-        unit_count = 0
-        try:
-            from unit import Unit
-            for item in main_window.scene.items():
-                if isinstance(item, Unit):
-                    unit_count += 1
-                    if hasattr(item, 'connections'):
-                        connection_count += len(item.connections)
-        except (ImportError, AttributeError) as e:
-            print(f"Error counting connections: {str(e)}")
+        unit_count = len(main_window.engine.board)
+        connection_count = sum(1 for _ in main_window.engine.board.connection_pairs())
         
-        print(f"Connection fix applied: Found {unit_count} units with {connection_count//2} connections")
+        print(f"Connection fix applied: Found {unit_count} units with {connection_count} connections")
         return True
     except Exception as e:
         print(f"Error applying connection fixes: {str(e)}")
@@ -8,11 +8,9 @@ Instructions for modifying NetworkManager class:
    - After accepting a client connection, set a longer timeout:
      client_socket.settimeout(30.0)  # 30 seconds instead of the default
 
-2. Increase the sleep delay after sending the handshake response:
-   - In the method where you send the initial handshake response to the client
-   - After sending the handshake response, add a sleep:
-     import time
-     time.sleep(1.0)  # 1 second delay to ensure client has time to process
+2. Do not sleep to wait for the peer:
+   - Messages are numbered and acknowledged by NetworkManager
+   - Pass on_ack to send_message() to run code once the peer received a message
 
 3. Add additional error handling for common socket errors:
    - In methods that handle socket operations, add specific handling for:
@@ -32,10 +30,6 @@ def handle_client_connection(self, client_socket, client_address):
         # Send handshake
         # ...existing handshake code...
         
-        # Add delay after handshake
-        import time
-        time.sleep(1.0)
-        
         # Continue with connection processing
         # ...
     except socket.error as e:
@@ -56,7 +50,6 @@ def apply_network_fixes(network_manager):
     the structure of the NetworkManager class.
     """
     import socket
-    import time
     
     # Try to find and extend timeouts on socket connections
     if hasattr(network_manager, 'server_socket'):
@@ -67,22 +60,7 @@ def apply_network_fixes(network_manager):
         except:
             print("Could not extend server socket timeout")
     
-    # Try to enhance socket connection handling
-    original_connect = getattr(network_manager, 'connect_to_server', None)
-    if original_connect and callable(original_connect):
-        # Get the connect_to_server method properly
-        def enhanced_connect_to_server(self, ip, port):
-            # Call original function with exact same parameters
-            result = original_connect(ip, port)
-            # Add sleep after connection
-            time.sleep(1.0)
-            return result
-        
-        try:
-            # Preserve the method signature by binding to the instance
-            network_manager.connect_to_server = enhanced_connect_to_server.__get__(network_manager)
-            print("Enhanced connect_to_server with extended sleep")
-        except:
-            print("Could not enhance connect_to_server method")
+    # connect_to_server is no longer wrapped with a sleep: it returns at once
+    # and the connected signal reports when the handshake completed
     
     return network_manager
@@ -1,37 +1,15 @@
 import socket
 import threading
-import json
 import time
 import uuid
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer
+from collections import OrderedDict, deque
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QTimer
+from message_codec import JSON_CODEC, KNOWN_STRINGS, SUPPORTED_CODECS, choose_codec, codec_for
+from network_protocol import PROTOCOL_VERSION, frame_message, FrameError, FrameBuffer, NetworkMessage
 
-class NetworkMessage:
-    """Message types for network communication"""
-    CONNECT = 1
-    DISCONNECT = 2
-    GAME_STATE = 3
-    ACTION = 4
-    TURN_CHANGE = 5
-    HANDSHAKE_REQUEST = 6
-    HANDSHAKE_RESPONSE = 7
-    ERROR = 99
-    def __init__(self, msg_type, data=None):
-        self.type = msg_type
-        self.data = data or {}
-        
-    def to_json(self):
-        return json.dumps({
-            "type": self.type,
-            "data": self.data
-        })
-    
-    @staticmethod
-    def from_json(json_str):
-        try:
-            msg_dict = json.loads(json_str)
-            return NetworkMessage(msg_dict["type"], msg_dict["data"])
-        except (json.JSONDecodeError, KeyError):
-            return NetworkMessage(NetworkMessage.ERROR, {"error": "Invalid message format"})
+# Messages that are never numbered or acknowledged
+UNSEQUENCED_TYPES = (NetworkMessage.HANDSHAKE_REQUEST, NetworkMessage.HANDSHAKE_RESPONSE, NetworkMessage.ACK,
+                     NetworkMessage.PING, NetworkMessage.PONG)
 
 class NetworkManager(QObject):
     """Handles network communication for multiplayer games"""
@@ -42,6 +20,10 @@ class NetworkManager(QObject):
     message_received = pyqtSignal(object)  # NetworkMessage object
     error = pyqtSignal(str)  # error message
     server_status_changed = pyqtSignal(bool, str)  # is_running, status_message
+    message_acked = pyqtSignal(int)  # Highest sequence number the peer acknowledged
+    latency_updated = pyqtSignal(float, float, float)  # rtt ms, jitter ms, loss fraction
+    peer_timed_out = pyqtSignal(float)  # ms the peer has been silent
+    session_resumed = pyqtSignal()  # A reconnect continued the previous session
     
     def __init__(self):
         super().__init__()
@@ -51,7 +33,9 @@ class NetworkManager(QObject):
         self.server_thread = None
         self.client_thread = None
         self.running = False
-        self.buffer_size = 4096
+        self.buffer_size = 65536
+        self.frame_buffer = FrameBuffer()
+        self.codec = JSON_CODEC  # Switched after the handshake if both peers agree
         self.retry_attempts = 3
         self.retry_delay = 1.0  # seconds
         self.server_is_running = False
@@ -67,6 +51,27 @@ class NetworkManager(QObject):
         
         self.debug_mode = True  # Enable console logging
         
+        # Outgoing messages are numbered per connection and acknowledged by
+        # the peer, so callers can wait for delivery instead of sleeping
+        self.sequence_lock = threading.Lock()
+        self.max_unacked = 1024  # Oldest unacknowledged messages are forgotten beyond this
+        self.reset_sequencing()
+        
+        # Sessions: the server issues a token in the handshake. A client that
+        # reconnects with it resumes the session and both sides replay only
+        # the messages the other one missed from their unacknowledged log.
+        self.session_token = None
+        self.message_acked.connect(self.run_ack_callbacks)
+        
+        # Heartbeat: pings measure latency and detect a dead peer long before
+        # the socket times out. Pings are sent and answered by the network
+        # thread, so a long GUI frame on either side does not look like silence
+        self.heartbeat_lock = threading.Lock()
+        self.heartbeat_interval = 250  # ms between pings
+        self.dead_peer_timeout = 5000  # ms without any data before the peer is dead, None disables
+        self.loss_window = 100  # Pings the loss rate is measured over
+        self.reset_heartbeat()
+        
         # Initialize the server status timer
         self.server_status_timer = QTimer(self)
         self.server_status_timer.timeout.connect(self.check_server_status)
@@ -76,8 +81,12 @@ class NetworkManager(QObject):
         if self.debug_mode:
             print(f"[NETWORK] {message}")
     
-    def start_server(self, host, port):
-        """Start a server to accept client connections"""
+    def start_server(self, host, port, resume=False):
+        """Start a server to accept client connections
+        
+        With resume the session of the previous client is kept, so it can
+        reconnect and continue where it left off.
+        """
         if self.running:
             self.stop()
             
@@ -88,6 +97,10 @@ class NetworkManager(QObject):
         self.connection_processed = False
         self.handshake_completed = False
         self.connection_verified = False
+        self.codec = JSON_CODEC
+        if not resume:
+            self.end_session()
+        self.reset_heartbeat()
         
         self.log(f"Starting server on {host}:{port}")
         
@@ -159,8 +172,8 @@ class NetworkManager(QObject):
         self.server_thread.daemon = True
         self.server_thread.start()
     
-    def connect_to_server(self, host, port):
-        """Connect to a server as a client"""
+    def connect_to_server(self, host, port, resume=False):
+        """Connect to a server as a client, resuming our session if asked to"""
         if self.running:
             self.stop()
             
@@ -171,6 +184,10 @@ class NetworkManager(QObject):
         self.connection_processed = False
         self.handshake_completed = False
         self.connection_verified = False
+        self.codec = JSON_CODEC
+        if not resume:
+            self.end_session()
+        self.reset_heartbeat()
         
         self.log(f"Attempting to connect to server at {host}:{port}")
         
@@ -185,7 +202,8 @@ class NetworkManager(QObject):
                     
                     self.client_socket.connect((host, port))
                     connected = True
-                    self.valid_connection = True
+                    # A resumed session sends again only after the handshake replayed its log
+                    self.valid_connection = self.session_token is None
                     
                     # Connection successful
                     self.connected.emit(True, f"Connected to server at {host}:{port}")
@@ -227,28 +245,40 @@ class NetworkManager(QObject):
     
     def send_handshake_request(self):
         """Send a handshake request to establish a verified connection"""
-        if not self.client_socket:
+        if not self.has_connection():
             return False
             
         try:
             # Create handshake request
             handshake_req = NetworkMessage(
                 NetworkMessage.HANDSHAKE_REQUEST, 
-                {"client_id": self.connection_id, "game": "ExpansionWar", "version": "1.0"}
+                {
+                    "client_id": self.connection_id,
+                    "game": "ExpansionWar",
+                    "version": PROTOCOL_VERSION,
+                    "codecs": SUPPORTED_CODECS,
+                    "known_strings": len(KNOWN_STRINGS)
+                }
             )
+            if self.session_token:
+                with self.sequence_lock:
+                    handshake_req.data.update({
+                        "session": self.session_token,
+                        "last_seq": self.recv_seq,
+                        "replay_from": self.first_unacked()
+                    })
             
-            # Send the handshake request
-            data = handshake_req.to_json().encode('utf-8')
-            self.client_socket.sendall(data)
+            # Send the handshake request (always JSON so any server can read it)
+            self.write_frame(handshake_req.encode(JSON_CODEC))
             self.statusMessage("Handshake request sent...")
             return True
         except socket.error as e:
             self.error.emit(f"Error sending handshake request: {str(e)}")
             return False
     
-    def send_handshake_response(self, client_id):
+    def send_handshake_response(self, client_id, codec_name=JSON_CODEC.name, resumed=False):
         """Send a handshake response to verify the connection"""
-        if not self.client_socket:
+        if not self.has_connection():
             return False
             
         try:
@@ -258,15 +288,18 @@ class NetworkManager(QObject):
                 {
                     "server_id": self.connection_id,
                     "client_id": client_id,
-                    "status": "accepted",
+                    "status": "resumed" if resumed else "accepted",
                     "game": "ExpansionWar",
-                    "version": "1.0"
+                    "version": PROTOCOL_VERSION,
+                    "codec": codec_name,
+                    "known_strings": len(KNOWN_STRINGS),
+                    "session": self.session_token,
+                    "last_seq": self.recv_seq
                 }
             )
             
-            # Send the handshake response
-            data = handshake_resp.to_json().encode('utf-8')
-            self.client_socket.sendall(data)
+            # Send the handshake response (JSON, the client switches codec after reading it)
+            self.write_frame(handshake_resp.encode(JSON_CODEC))
             self.statusMessage("Handshake response sent...")
             return True
         except socket.error as e:
@@ -276,103 +309,55 @@ class NetworkManager(QObject):
     def handle_client(self):
         """Handle messages from client/server"""
         self.log("Starting message handler")
+        self.frame_buffer.clear()
+        next_heartbeat = time.monotonic()
         
         while self.running and self.client_socket:
             try:
+                # Heartbeats run here, the receive timeout wakes us up for them
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    next_heartbeat = now + self.heartbeat_interval / 1000.0
+                    self.client_socket.settimeout(self.heartbeat_interval / 1000.0)
+                    self.send_heartbeat()
+                
                 # Try to receive data
                 data = self.client_socket.recv(self.buffer_size)
                 if not data:
                     # Connection closed
                     self.log("Connection closed by remote host (received empty data)")
-                    self.disconnected.emit("Connection closed by remote host")
+                    self.report_disconnect("Connection closed by remote host")
                     self.valid_connection = False
                     self.connection_processed = False
                     self.connection_verified = False
                     break
                 
-                # Process message
+                # One read may carry a partial message or several whole ones
                 try:
-                    message_text = data.decode('utf-8')
-                    self.log(f"Received data: {message_text[:50]}...")
-                    message = NetworkMessage.from_json(message_text)
-                    
-                    # Handle special messages internally
-                    if message.type == NetworkMessage.HANDSHAKE_REQUEST:
-                        # Server receives handshake request from client
-                        client_id = message.data.get("client_id", "unknown")
-                        game = message.data.get("game", "unknown")
-                        version = message.data.get("version", "unknown")
-                        
-                        # Validate game and version
-                        if game != "ExpansionWar":
-                            self.error.emit(f"Invalid game in handshake: {game}")
-                            self.client_socket.close()
-                            self.client_socket = None
-                            break
-                            
-                        # Send back handshake response
-                        self.statusMessage(f"Received handshake request from client {client_id}")
-                        self.send_handshake_response(client_id)
-                        
-                        # Mark connection as validated
-                        self.valid_connection = True
-                        self.connection_verified = True
-                        
-                        # Wait a moment to ensure the response is sent before notifying
-                        time.sleep(0.1)
-                        
-                        # Now notify about the real verified connection
-                        if self.client_address:
-                            self.message_received.emit(NetworkMessage(
-                                NetworkMessage.CONNECT, 
-                                {"address": self.client_address[0], "port": self.client_address[1], "client_id": client_id}
-                            ))
-                        
-                    elif message.type == NetworkMessage.HANDSHAKE_RESPONSE:
-                        # Client receives handshake response from server
-                        server_id = message.data.get("server_id", "unknown")
-                        client_id = message.data.get("client_id", "unknown")
-                        status = message.data.get("status", "unknown")
-                        
-                        # Verify it's our handshake
-                        if client_id != self.connection_id:
-                            self.error.emit(f"Handshake error: Client ID mismatch")
-                            self.client_socket.close()
-                            self.client_socket = None
-                            break
-                            
-                        # Check status
-                        if status != "accepted":
-                            self.error.emit(f"Handshake rejected by server: {status}")
-                            self.client_socket.close()
-                            self.client_socket = None
-                            break
-                            
-                        # Mark connection as validated
-                        self.statusMessage(f"Handshake accepted by server {server_id}")
-                        self.valid_connection = True
-                        self.connection_verified = True
-                        self.handshake_completed = True
-                        
-                        # Notify about successful connection
-                        self.connected.emit(True, f"Successfully connected and verified with server")
-                        
-                    else:
-                        # Only pass messages along if connection is verified
-                        if self.connection_verified:
-                            self.message_received.emit(message)
-                        else:
-                            self.error.emit("Received message before connection verification was complete")
-                        
-                except Exception as e:
-                    self.error.emit(f"Error processing message: {str(e)}")
-                    self.log(f"Error processing message: {str(e)}")
+                    payloads = self.frame_buffer.feed(data)
+                except FrameError as e:
+                    self.error.emit(f"Protocol error: {str(e)}")
+                    self.log(f"Protocol error: {str(e)}")
+                    self.client_socket.close()
+                    self.client_socket = None
+                    self.valid_connection = False
+                    self.connection_verified = False
+                    break
+                
+                keep_running = True
+                for payload in payloads:
+                    if not self.process_payload(payload):
+                        keep_running = False
+                        break
+                if not keep_running:
+                    break
                 
             except socket.timeout:
                 # This is expected due to the timeout we set
                 continue
             except socket.error as e:
-                if self.running:  # Only emit if we're still supposed to be running
+                # Only emit if we're still supposed to be running
+                if self.running and not self.disconnect_reported:
                     self.error.emit(f"Socket error: {str(e)}")
                     self.log(f"Socket error in handle_client: {str(e)}")
                 self.valid_connection = False
@@ -381,29 +366,391 @@ class NetworkManager(QObject):
         
         self.log("Message handler ended")
     
-    def send_message(self, message):
-        """Send a message to the connected client/server"""
-        if not self.client_socket or not self.valid_connection:
-            self.error.emit("Not connected")
+    def process_payload(self, payload):
+        """Process one complete message, returns False if the connection was closed"""
+        try:
+            # Any data at all shows the peer is alive
+            self.last_receive_time = time.monotonic()
+            message = NetworkMessage.decode(payload)
+            self.log(f"Received message: Type={message.type} ({len(payload)} bytes)")
+            
+            # Handle special messages internally
+            if message.type == NetworkMessage.HANDSHAKE_REQUEST:
+                # Server receives handshake request from client
+                client_id = message.data.get("client_id", "unknown")
+                game = message.data.get("game", "unknown")
+                version = message.data.get("version", "unknown")
+                
+                # Validate game and version
+                if game != "ExpansionWar":
+                    self.error.emit(f"Invalid game in handshake: {game}")
+                    self.close_connection()
+                    return False
+                    
+                # Peers before 2.0 don't offer codecs and only speak JSON
+                codec_name = choose_codec(message.data.get("codecs"))
+                
+                resumed = self.can_resume_session(message.data)
+                if not resumed:
+                    self.reset_sequencing()
+                    self.session_token = uuid.uuid4().hex
+                
+                # Send back handshake response
+                self.statusMessage(f"Received handshake request from client {client_id} (version {version})")
+                self.send_handshake_response(client_id, codec_name, resumed)
+                self.codec = codec_for(codec_name, message.data.get("known_strings"))
+                self.log(f"Using {codec_name} message codec")
+                
+                if resumed:
+                    self.connection_verified = True
+                    self.handle_ack(message.data.get("last_seq", 0))
+                    if self.resume_sending():
+                        self.session_resumed.emit()
+                    return True
+                
+                # Mark connection as validated
+                self.valid_connection = True
+                self.connection_verified = True
+                
+                # Make sure the response is out before notifying
+                self.wait_for_send()
+                
+                # Now notify about the real verified connection
+                if self.client_address:
+                    self.message_received.emit(NetworkMessage(
+                        NetworkMessage.CONNECT, 
+                        {"address": self.client_address[0], "port": self.client_address[1], "client_id": client_id}
+                    ))
+                
+            elif message.type == NetworkMessage.HANDSHAKE_RESPONSE:
+                # Client receives handshake response from server
+                server_id = message.data.get("server_id", "unknown")
+                client_id = message.data.get("client_id", "unknown")
+                status = message.data.get("status", "unknown")
+                
+                # Verify it's our handshake
+                if client_id != self.connection_id:
+                    self.error.emit(f"Handshake error: Client ID mismatch")
+                    self.close_connection()
+                    return False
+                    
+                # Check status
+                if status not in ("accepted", "resumed"):
+                    self.error.emit(f"Handshake rejected by server: {status}")
+                    self.close_connection()
+                    return False
+                    
+                # Use the codec the server picked, old servers don't send one
+                self.codec = codec_for(message.data.get("codec"), message.data.get("known_strings"))
+                self.log(f"Using {self.codec.name} message codec")
+                
+                if status == "resumed":
+                    self.statusMessage(f"Session resumed by server {server_id}")
+                    self.connection_verified = True
+                    self.handshake_completed = True
+                    self.handle_ack(message.data.get("last_seq", 0))
+                    if self.resume_sending():
+                        self.session_resumed.emit()
+                    return True
+                
+                # A new session, whatever we had queued is meaningless to this server
+                self.reset_sequencing()
+                self.session_token = message.data.get("session")
+                
+                # Mark connection as validated
+                self.statusMessage(f"Handshake accepted by server {server_id}")
+                self.valid_connection = True
+                self.connection_verified = True
+                self.handshake_completed = True
+                
+                # Notify about successful connection
+                self.connected.emit(True, f"Successfully connected and verified with server")
+                
+            elif message.type == NetworkMessage.ACK:
+                self.handle_ack(message.data.get("ack", 0))
+                
+            elif message.type == NetworkMessage.PING:
+                if self.connection_verified:
+                    self.send_pong(message.data)
+                
+            elif message.type == NetworkMessage.PONG:
+                self.handle_pong(message.data.get("ping"))
+                
+            else:
+                # Only pass messages along if connection is verified
+                if self.connection_verified:
+                    if message.seq is not None:
+                        duplicate = message.seq <= self.recv_seq
+                        if not duplicate:
+                            self.recv_seq = message.seq
+                        self.send_ack(self.recv_seq)
+                        if duplicate:
+                            self.log(f"Dropping duplicate message {message.seq}")
+                            return True
+                    self.message_received.emit(message)
+                else:
+                    self.error.emit("Received message before connection verification was complete")
+                
+        except Exception as e:
+            self.error.emit(f"Error processing message: {str(e)}")
+            self.log(f"Error processing message: {str(e)}")
+        
+        return True
+    
+    def send_message(self, message, on_ack=None):
+        """Send a message to the connected client/server
+        
+        on_ack is called on the GUI thread once the peer acknowledged the
+        message. While a session is waiting to be resumed messages are only
+        logged, they go out when the peer reconnects.
+        """
+        sequenced = message.type not in UNSEQUENCED_TYPES
+        error = None
+        with self.sequence_lock:
+            connected = self.has_connection() and self.valid_connection
+            if not connected and not (sequenced and self.session_token):
+                error = "Not connected"
+            else:
+                if sequenced:
+                    self.send_seq += 1
+                    message.seq = self.send_seq
+                    self.unacked[message.seq] = message
+                    if on_ack:
+                        self.ack_callbacks[message.seq] = on_ack
+                    while len(self.unacked) > self.max_unacked:
+                        seq, _ = self.unacked.popitem(last=False)
+                        self.ack_callbacks.pop(seq, None)
+                
+                if connected:
+                    self.log(f"Sending message: Type={message.type} Seq={message.seq}")
+                    try:
+                        # Written under the lock so messages leave in sequence order
+                        self.write_frame(message.encode(self.codec))
+                    except (socket.error, ValueError) as e:
+                        error = f"Error sending message: {str(e)}"
+                        self.valid_connection = False
+        
+        if error:
+            self.error.emit(error)
+            return False
+        return True
+    
+    def reset_sequencing(self):
+        """Start numbering from scratch for a new connection"""
+        with self.sequence_lock:
+            self.send_seq = 0  # Last sequence number sent
+            self.recv_seq = 0  # Last sequence number received
+            self.unacked = OrderedDict()  # seq -> NetworkMessage not yet acknowledged
+            self.ack_callbacks = {}  # seq -> callable waiting for the acknowledgement
+    
+    def first_unacked(self):
+        """Oldest sequence number we can still replay, call with sequence_lock held"""
+        return next(iter(self.unacked)) if self.unacked else self.send_seq + 1
+    
+    def end_session(self):
+        """Forget the session, the next connection starts a new one"""
+        self.session_token = None
+        self.reset_sequencing()
+    
+    def can_resume_session(self, request):
+        """Check whether a reconnecting client can continue our session"""
+        token = request.get("session")
+        if not token or token != self.session_token:
             return False
+        last_seq = request.get("last_seq", 0)
+        with self.sequence_lock:
+            # Each side must still hold every message the other one is missing
+            return (last_seq <= self.send_seq and self.first_unacked() <= last_seq + 1
+                    and request.get("replay_from", 1) <= self.recv_seq + 1)
+    
+    def resume_sending(self):
+        """Replay every unacknowledged message, then let new ones through"""
+        with self.sequence_lock:
+            messages = list(self.unacked.values())
+            try:
+                for message in messages:
+                    self.write_frame(message.encode(self.codec))
+            except (socket.error, ValueError) as e:
+                self.log(f"Error replaying messages: {str(e)}")
+                return False
+            self.valid_connection = True
+        self.log(f"Session resumed, replayed {len(messages)} messages")
+        return True
+    
+    def send_ack(self, seq):
+        """Acknowledge every message up to seq"""
+        try:
+            self.write_frame(NetworkMessage(NetworkMessage.ACK, {"ack": seq}).encode(self.codec))
+        except (socket.error, ValueError) as e:
+            self.log(f"Error sending ack: {str(e)}")
+    
+    def handle_ack(self, ack):
+        with self.sequence_lock:
+            while self.unacked:
+                seq = next(iter(self.unacked))
+                if seq > ack:
+                    break
+                del self.unacked[seq]
+            waiting = any(seq <= ack for seq in self.ack_callbacks)
+        if waiting:
+            self.message_acked.emit(ack)
+    
+    @pyqtSlot(int)
+    def run_ack_callbacks(self, ack):
+        with self.sequence_lock:
+            due = sorted(seq for seq in self.ack_callbacks if seq <= ack)
+            callbacks = [self.ack_callbacks.pop(seq) for seq in due]
+        for callback in callbacks:
+            callback()
+    
+    def reset_heartbeat(self):
+        """Forget the latency statistics of the previous connection"""
+        with self.heartbeat_lock:
+            self.ping_seq = 0
+            self.pending_pings = {}  # ping number -> monotonic send time
+            self.ping_results = deque(maxlen=self.loss_window)  # True if answered, False if lost
+            self.smoothed_rtt = None  # ms
+            self.last_rtt = None  # ms
+            self.rtt_jitter = 0.0  # ms
+            self.last_receive_time = None
+            self.disconnect_reported = False
+    
+    def set_heartbeat(self, interval=None, dead_peer_timeout=None):
+        """Change the ping interval and dead peer timeout, both in ms"""
+        if interval is not None:
+            self.heartbeat_interval = interval
+        if dead_peer_timeout is not None:
+            self.dead_peer_timeout = dead_peer_timeout
+    
+    @property
+    def rtt(self):
+        """Smoothed round trip time in ms, None before the first pong"""
+        return self.smoothed_rtt
+    
+    @property
+    def jitter(self):
+        """Mean deviation between consecutive round trip times in ms"""
+        return self.rtt_jitter
+    
+    @property
+    def packet_loss(self):
+        """Fraction of recent pings that got no pong in time"""
+        if not self.ping_results:
+            return 0.0
+        return self.ping_results.count(False) / len(self.ping_results)
+    
+    def latency_stats(self):
+        return {
+            "rtt": self.smoothed_rtt,
+            "last_rtt": self.last_rtt,
+            "jitter": self.rtt_jitter,
+            "packet_loss": self.packet_loss,
+            "pings_sent": self.ping_seq
+        }
+    
+    def send_heartbeat(self):
+        """Ping the peer and check it is still alive, run by the network thread"""
+        if not (self.connection_verified and self.has_connection()):
+            return
         
-        self.log(f"Sending message: Type={message.type}")
+        now = time.monotonic()
+        if self.dead_peer_timeout is not None and self.last_receive_time is not None:
+            silence = (now - self.last_receive_time) * 1000.0
+            if silence > self.dead_peer_timeout:
+                self.handle_dead_peer(silence)
+                return
+        
+        # A ping unanswered for as long as a dead peer may stay silent is lost
+        loss_timeout = self.dead_peer_timeout or 4 * self.heartbeat_interval
+        with self.heartbeat_lock:
+            for ping, sent in list(self.pending_pings.items()):
+                if (now - sent) * 1000.0 > loss_timeout:
+                    del self.pending_pings[ping]
+                    self.ping_results.append(False)
+            self.ping_seq += 1
+            ping = self.ping_seq
+            self.pending_pings[ping] = now
         
         try:
-            data = message.to_json().encode('utf-8')
-            self.client_socket.sendall(data)
-            # Add a small delay after sending to help with synchronization
-            import time
-            time.sleep(0.05)
-            return True
-        except socket.error as e:
-            self.error.emit(f"Error sending message: {str(e)}")
-            self.valid_connection = False
-            return False
+            self.write_frame(NetworkMessage(NetworkMessage.PING, {"ping": ping}).encode(self.codec))
+        except (socket.error, ValueError) as e:
+            self.log(f"Error sending ping: {str(e)}")
+    
+    def send_pong(self, ping_data):
+        try:
+            self.write_frame(NetworkMessage(NetworkMessage.PONG, ping_data).encode(self.codec))
+        except (socket.error, ValueError) as e:
+            self.log(f"Error sending pong: {str(e)}")
+    
+    def handle_pong(self, ping):
+        now = time.monotonic()
+        with self.heartbeat_lock:
+            sent = self.pending_pings.pop(ping, None)
+            if sent is None:
+                return  # Unknown or already counted as lost
+            rtt = (now - sent) * 1000.0
+            if self.last_rtt is not None:
+                # Interarrival jitter estimate of RFC 3550
+                self.rtt_jitter += (abs(rtt - self.last_rtt) - self.rtt_jitter) / 16.0
+            if self.smoothed_rtt is None:
+                self.smoothed_rtt = rtt
+            else:
+                # Same smoothing as the TCP retransmission timer (RFC 6298)
+                self.smoothed_rtt += (rtt - self.smoothed_rtt) / 8.0
+            self.last_rtt = rtt
+            self.ping_results.append(True)
+        self.latency_updated.emit(self.smoothed_rtt, self.rtt_jitter, self.packet_loss)
+    
+    def handle_dead_peer(self, silence):
+        """Close a connection whose peer stopped answering pings"""
+        self.log(f"No data from peer for {silence:.0f} ms, closing connection")
+        self.peer_timed_out.emit(silence)
+        self.valid_connection = False
+        self.connection_verified = False
+        self.report_disconnect(f"Peer did not respond for {silence / 1000:.1f} seconds")
+        self.close_connection()
     
-    def broadcast_game_state(self, game_state):
+    def report_disconnect(self, reason):
+        """Emit disconnected once per connection"""
+        with self.heartbeat_lock:
+            if self.disconnect_reported:
+                return
+            self.disconnect_reported = True
+        self.disconnected.emit(reason)
+    
+    def has_connection(self):
+        return self.client_socket is not None
+    
+    def write_frame(self, payload):
+        """Frame and write one encoded message, raises socket.error on failure"""
+        self.client_socket.sendall(frame_message(payload))
+    
+    def wait_for_send(self):
+        """Give the peer a moment to read what was just written"""
+        time.sleep(0.1)
+    
+    def close_connection(self):
+        """Close the current peer connection"""
+        if self.client_socket:
+            self.client_socket.close()
+            self.client_socket = None
+    
+    def broadcast_game_state(self, game_state, on_ack=None):
         """Send game state to the connected client"""
         message = NetworkMessage(NetworkMessage.GAME_STATE, game_state)
+        return self.send_message(message, on_ack)
+    
+    def send_state_delta(self, delta):
+        """Send the changes since the client's acknowledged state version"""
+        message = NetworkMessage(NetworkMessage.GAME_STATE_DELTA, delta)
+        return self.send_message(message)
+    
+    def send_state_ack(self, version, resync=False):
+        """Acknowledge a state version, or ask for a full snapshot"""
+        data = {"version": version}
+        if resync:
+            data["resync"] = True
+        message = NetworkMessage(NetworkMessage.STATE_ACK, data)
         return self.send_message(message)
     
     def send_action(self, action_data):
@@ -411,6 +758,11 @@ class NetworkManager(QObject):
         message = NetworkMessage(NetworkMessage.ACTION, action_data)
         return self.send_message(message)
     
+    def send_lockstep_input(self, input_data):
+        """Send our actions for one lockstep tick"""
+        message = NetworkMessage(NetworkMessage.LOCKSTEP_INPUT, input_data)
+        return self.send_message(message)
+    
     def send_turn_change(self, next_turn):
         """Send turn change notification"""
         message = NetworkMessage(NetworkMessage.TURN_CHANGE, {"next_turn": next_turn})
@@ -477,6 +829,7 @@ class NetworkManager(QObject):
         self.connection_processed = False
         self.connection_verified = False
         self.handshake_completed = False
+        self.codec = JSON_CODEC
         self.stop_server_status_monitor()
         self.cleanup()
     
@@ -93,9 +93,9 @@ def apply_patch():
             finally:
                 self.cleanup()
 
-        def patched_send_handshake_response(self, client_id):
+        def patched_send_handshake_response(self, client_id, *args, **kwargs):
             """Patched version with delay after sending handshake"""
-            result = original_send_handshake_response(self, client_id)
+            result = original_send_handshake_response(self, client_id, *args, **kwargs)
             # Add delay after sending handshake response
             print("[PATCH] Adding 1.0 second delay after handshake response")
             time.sleep(1.0)
@@ -0,0 +1,108 @@
+"""
+Wire protocol shared by every Expansion War peer.
+
+Message framing and the NetworkMessage envelope live here without any Qt
+dependency so the GUI NetworkManager and the headless game server speak
+exactly the same protocol.
+"""
+
+import json
+import struct
+from message_codec import CodecError, JSON_CODEC, decode_payload
+
+PROTOCOL_VERSION = "2.0"  # Peers from 2.0 on negotiate the message codec
+
+# Every message on the wire is a 4 byte big-endian payload length followed by the payload
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Reject absurd lengths from a corrupt stream
+
+def frame_message(payload):
+    """Prefix a payload (bytes) with its length for sending"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"Message too large: {len(payload)} bytes")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+class FrameError(Exception):
+    """Raised when the incoming byte stream is not validly framed"""
+
+class FrameBuffer:
+    """Streaming reassembly of length-prefixed frames
+    
+    TCP delivers a byte stream, so one recv() may hold part of a message or
+    several messages at once. feed() buffers the bytes and returns every
+    complete payload received so far.
+    """
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.buffer = bytearray()
+        self.max_frame_size = max_frame_size
+        
+    def feed(self, data):
+        self.buffer.extend(data)
+        payloads = []
+        offset = 0
+        header_size = FRAME_HEADER.size
+        
+        while len(self.buffer) - offset >= header_size:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame length {length} exceeds limit of {self.max_frame_size} bytes")
+            end = offset + header_size + length
+            if len(self.buffer) < end:
+                break
+            payloads.append(bytes(self.buffer[offset + header_size:end]))
+            offset = end
+        
+        if offset:
+            del self.buffer[:offset]
+        return payloads
+    
+    def clear(self):
+        self.buffer.clear()
+
+class NetworkMessage:
+    """Message types for network communication"""
+    CONNECT = 1
+    DISCONNECT = 2
+    GAME_STATE = 3
+    ACTION = 4
+    TURN_CHANGE = 5
+    HANDSHAKE_REQUEST = 6
+    HANDSHAKE_RESPONSE = 7
+    GAME_STATE_DELTA = 8  # Changes since the version the client acknowledged
+    STATE_ACK = 9  # Client confirms (or asks to resync) a state version
+    ACK = 10  # Every sequenced message up to data["ack"] was received
+    LOCKSTEP_INPUT = 11  # A peer's actions (and state hash) for one lockstep tick
+    PING = 12  # Heartbeat, answered right away with a PONG carrying the same data
+    PONG = 13
+    ERROR = 99
+    def __init__(self, msg_type, data=None, seq=None):
+        self.type = msg_type
+        self.data = data or {}
+        self.seq = seq  # Per-connection sequence number, None if unsequenced
+        
+    def to_json(self):
+        return json.dumps({
+            "type": self.type,
+            "data": self.data
+        })
+    
+    @staticmethod
+    def from_json(json_str):
+        try:
+            msg_dict = json.loads(json_str)
+            return NetworkMessage(msg_dict["type"], msg_dict["data"])
+        except (json.JSONDecodeError, KeyError):
+            return NetworkMessage(NetworkMessage.ERROR, {"error": "Invalid message format"})
+    
+    def encode(self, codec=JSON_CODEC):
+        """Encode the message to bytes with the given codec"""
+        return codec.encode(self.type, self.data, self.seq)
+    
+    @staticmethod
+    def decode(payload):
+        """Decode bytes produced by any supported codec"""
+        try:
+            msg_type, data, seq = decode_payload(payload)
+            return NetworkMessage(msg_type, data, seq)
+        except CodecError:
+            return NetworkMessage(NetworkMessage.ERROR, {"error": "Invalid message format"})
@@ -0,0 +1,108 @@
+"""
+Deterministic fixed-timestep simulation clock for Expansion War.
+
+The clock turns wall-clock time into a whole number of logical ticks of a
+fixed length, so the simulation runs at the same logical rate no matter how
+late the Qt event loop delivers timer events. Missed ticks are caught up on
+the next advance (up to max_catch_up_ticks), the speed can be scaled for
+fast-forwarded replays, and headless runs can step the clock directly as
+fast as possible.
+"""
+
+import time
+
+AS_FAST_AS_POSSIBLE = None  # Speed value that ignores wall-clock time
+
+
+class SimulationClock:
+    """Fixed timestep clock driving GameEngine ticks"""
+
+    def __init__(self, timestep=1000, speed=1.0, max_catch_up_ticks=10, time_source=time.monotonic):
+        self.timestep = timestep  # Logical milliseconds per tick
+        self.speed = speed  # Logical ms per real ms, or AS_FAST_AS_POSSIBLE
+        self.max_catch_up_ticks = max_catch_up_ticks
+        self.time_source = time_source
+
+        self.tick_listeners = []
+        self.running = False
+        self.last_real_time = None
+        self.reset()
+
+    def add_tick_listener(self, listener):
+        """Register a callable run once per logical tick"""
+        self.tick_listeners.append(listener)
+
+    def reset(self, tick_count=0):
+        self.tick_count = tick_count
+        self.accumulator = 0.0
+        self.dropped_ticks = 0
+
+    @property
+    def time(self):
+        """Logical milliseconds elapsed since the last reset"""
+        return self.tick_count * self.timestep + self.accumulator
+
+    def set_speed(self, speed):
+        self.speed = speed
+
+    def start(self):
+        """Start (or resume) following wall-clock time"""
+        self.running = True
+        self.last_real_time = self.time_source()
+
+    def stop(self):
+        """Pause the clock; time spent stopped is never caught up"""
+        self.running = False
+        self.last_real_time = None
+
+    def advance(self, now=None):
+        """Run every tick that is due since the last call
+
+        Returns the number of ticks run. When the clock fell further behind
+        than max_catch_up_ticks the remaining backlog is dropped so a long
+        stall cannot snowball into an ever longer catch-up.
+        """
+        if not self.running:
+            return 0
+
+        if now is None:
+            now = self.time_source()
+        real_elapsed = (now - self.last_real_time) * 1000.0
+        self.last_real_time = now
+
+        if self.speed is AS_FAST_AS_POSSIBLE:
+            return self.step(self.max_catch_up_ticks)
+
+        self.accumulator += max(0.0, real_elapsed) * self.speed
+
+        ticks = 0
+        while self.running and self.accumulator >= self.timestep and ticks < self.max_catch_up_ticks:
+            self.accumulator -= self.timestep
+            self.run_tick()
+            ticks += 1
+
+        if self.accumulator >= self.timestep:
+            backlog = int(self.accumulator // self.timestep)
+            self.dropped_ticks += backlog
+            self.accumulator -= backlog * self.timestep
+
+        return ticks
+
+    def step(self, count=1):
+        """Run count ticks immediately, regardless of wall-clock time"""
+        for _ in range(count):
+            self.run_tick()
+        return count
+
+    def run_until(self, predicate, max_ticks):
+        """Step until predicate() is true or max_ticks ran, returns ticks run"""
+        ticks = 0
+        while ticks < max_ticks and not predicate():
+            self.run_tick()
+            ticks += 1
+        return ticks
+
+    def run_tick(self):
+        self.tick_count += 1
+        for listener in self.tick_listeners:
+            listener()
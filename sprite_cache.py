@@ -0,0 +1,89 @@
+"""
+Shared unit sprites for Expansion War.
+
+Loading a bitmap from the Qt resources and smooth-scaling it for every unit
+and every capture is slow on big maps. SPRITES is the one process-wide
+SpriteCache: main.py preloads the sizes of a level when it is built, and a
+unit changing owner just takes the cached QPixmap for its new owner.
+"""
+
+from collections import OrderedDict
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap
+
+SPRITE_FILES = {
+    "player": ":/images/grafika/green.bmp",
+    "pc": ":/images/grafika/red.bmp",
+    "neutral": ":/images/grafika/grey.bmp"
+}
+MAX_SPRITES = 128  # Scaled sprites kept, a level rarely has more than a handful of sizes
+
+
+def device_pixel_ratio():
+    app = QApplication.instance()
+    return app.devicePixelRatio() if app else 1.0
+
+
+class SpriteCache:
+    """Process-wide cache of unit sprites keyed by (owner, size, device pixel ratio)
+
+    Each image is decoded from the resources once and each scaled sprite is
+    made once, so a base changing hands just swaps a reference to a shared
+    QPixmap. The least recently used sprites are dropped beyond max_sprites;
+    units still showing them keep their own reference.
+    """
+
+    def __init__(self, max_sprites=MAX_SPRITES):
+        self.max_sprites = max_sprites
+        self.sources = {}  # owner -> decoded image at its file size
+        self.sprites = OrderedDict()  # (owner, size, ratio) -> scaled QPixmap, oldest first
+        self.hits = 0
+        self.misses = 0
+
+    def source(self, owner):
+        """Unscaled image of an owner, a null pixmap if it cannot be loaded"""
+        pixmap = self.sources.get(owner)
+        if pixmap is None:
+            pixmap = QPixmap(SPRITE_FILES.get(owner, SPRITE_FILES["neutral"]))
+            self.sources[owner] = pixmap
+        return pixmap
+
+    def sprite(self, owner, size, ratio=None):
+        """Sprite of an owner drawn size x size logical pixels"""
+        if ratio is None:
+            ratio = device_pixel_ratio()
+        key = (owner, size, ratio)
+        pixmap = self.sprites.get(key)
+        if pixmap is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return pixmap
+
+        self.misses += 1
+        pixmap = self.source(owner)
+        if not pixmap.isNull():
+            # Scaled to device pixels so high-DPI screens get a sharp sprite
+            pixels = round(size * ratio)
+            pixmap = pixmap.scaled(pixels, pixels, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            pixmap.setDevicePixelRatio(ratio)
+        self.sprites[key] = pixmap
+        while len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return pixmap
+
+    def preload(self, sizes=(), ratio=None):
+        """Decode every image and scale it to each size ahead of the first capture"""
+        sizes = set(sizes)
+        for owner in SPRITE_FILES:
+            self.source(owner)
+            for size in sizes:
+                self.sprite(owner, size, ratio)
+
+    def clear(self):
+        self.sources.clear()
+        self.sprites.clear()
+
+
+SPRITES = SpriteCache()
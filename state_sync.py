@@ -0,0 +1,330 @@
+"""
+Versioned delta synchronisation of the board for network games.
+
+The host keeps a StateTracker that snapshots the board after every change
+and records which unit fields and connections changed in each version. A
+client that acknowledged version N receives only what changed since N
+(GAME_STATE_DELTA) instead of a full GAME_STATE, and the client applies it to
+its engine in place instead of rebuilding the scene.
+
+Deltas carry absolute values for every field touched since the base version,
+so applying one to any client version between its base and its target gives
+the same result. Full snapshots are still sent periodically and whenever the
+client falls behind the bounded history, and those are applied in place too.
+
+With ClientPrediction the client keeps the host's tick-stamped board apart
+from the board it displays. The displayed board keeps ticking locally, and
+every authoritative update is reconciled by re-simulating from the host's
+tick to the local one with the client's not yet confirmed actions replayed.
+"""
+
+from collections import OrderedDict
+
+from game_engine import GameEngine, NEUTRAL, VECTORIZE_THRESHOLD
+
+UNIT_FIELDS = ("owner", "value", "player_points", "pc_points", "x", "y", "size")
+
+
+def edge_key(a, b):
+    return (a, b) if a <= b else (b, a)
+
+
+def snapshot_board(board):
+    """Capture the board as plain comparable data"""
+    units = {}
+    edges = set()
+    for state in board:
+        units[state.unit_id] = tuple(getattr(state, field) for field in UNIT_FIELDS)
+        for other in state.connections:
+            edges.add(edge_key(state.unit_id, other.unit_id))
+    return units, edges
+
+
+def diff_snapshots(old, new):
+    """Return the change record between two snapshots"""
+    old_units, old_edges = old
+    new_units, new_edges = new
+
+    changed = {}
+    for unit_id, fields in new_units.items():
+        previous = old_units.get(unit_id)
+        if previous is None:
+            changed[unit_id] = set(UNIT_FIELDS)
+        elif previous != fields:
+            changed[unit_id] = {name for name, a, b in zip(UNIT_FIELDS, previous, fields) if a != b}
+
+    removed = set(old_units) - set(new_units)
+    edges = old_edges ^ new_edges
+    return {"changed": changed, "removed": removed, "edges": edges}
+
+
+class StateTracker:
+    """Host side history of board versions for delta sync"""
+
+    def __init__(self, history_size=64, full_snapshot_interval=30):
+        self.history_size = history_size
+        self.full_snapshot_interval = full_snapshot_interval
+        self.reset()
+
+    def reset(self):
+        self.version = 0
+        self.acked_version = None  # Last version the client confirmed
+        self.snapshot = ({}, set())
+        self.records = OrderedDict()  # version -> change record
+        self.last_full_version = 0
+
+    def commit(self, board):
+        """Snapshot the board, returns True if it changed since the last commit"""
+        snapshot = snapshot_board(board)
+        record = diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        if not (record["changed"] or record["removed"] or record["edges"]):
+            return False
+
+        self.version += 1
+        self.records[self.version] = record
+        while len(self.records) > self.history_size:
+            self.records.popitem(last=False)
+        return True
+
+    def ack(self, version):
+        if self.acked_version is None or version > self.acked_version:
+            self.acked_version = version
+
+    def needs_full_snapshot(self):
+        """True if the client cannot be brought up to date with a delta"""
+        if self.acked_version is None:
+            return True
+        if self.version - self.last_full_version >= self.full_snapshot_interval:
+            return True
+        # The history must cover every version after the acknowledged one
+        return self.acked_version < self.version and (self.acked_version + 1) not in self.records
+
+    def mark_full_snapshot_sent(self):
+        self.last_full_version = self.version
+
+    def make_delta(self, board, tick=0):
+        """Build a GAME_STATE_DELTA payload from the acknowledged version"""
+        base = self.acked_version if self.acked_version is not None else 0
+        touched_fields = {}
+        removed = set()
+        touched_edges = set()
+        for version in range(base + 1, self.version + 1):
+            record = self.records[version]
+            for unit_id, fields in record["changed"].items():
+                touched_fields.setdefault(unit_id, set()).update(fields)
+            removed |= record["removed"]
+            touched_edges |= record["edges"]
+
+        current_units, current_edges = self.snapshot
+        units = []
+        added = []
+        for unit_id, fields in touched_fields.items():
+            state = board.get(unit_id)
+            if state is None:
+                continue
+            if len(fields) == len(UNIT_FIELDS):
+                added.append({"id": unit_id, **{name: getattr(state, name) for name in UNIT_FIELDS}})
+            else:
+                update = {"id": unit_id}
+                for name in fields:
+                    update[name] = getattr(state, name)
+                units.append(update)
+
+        return {
+            "version": self.version,
+            "base": base,
+            "tick": tick,
+            "units": units,
+            "added": added,
+            "removed": [unit_id for unit_id in removed if unit_id not in current_units],
+            "connect": [list(edge) for edge in touched_edges if edge in current_edges],
+            "disconnect": [list(edge) for edge in touched_edges if edge not in current_edges]
+        }
+
+
+def apply_delta(engine, delta):
+    """Apply a GAME_STATE_DELTA payload to an engine in place
+
+    Returns a dict of "changed" unit ids, "added" UnitStates and "removed"
+    unit ids so views can update only what actually changed.
+    """
+    board = engine.board
+    changed = set()
+    added = []
+
+    for unit_data in delta.get("added", []):
+        state = board.get(unit_data["id"])
+        if state is None:
+            state = board.add_unit(unit_data["id"], owner=unit_data.get("owner", NEUTRAL))
+            added.append(state)
+        set_unit_fields(engine, state, unit_data)
+        changed.add(state.unit_id)
+
+    for unit_data in delta.get("units", []):
+        state = board.get(unit_data.get("id"))
+        if state is not None:
+            set_unit_fields(engine, state, unit_data)
+            changed.add(state.unit_id)
+
+    removed = []
+    for unit_id in delta.get("removed", []):
+        if board.remove_unit(unit_id):
+            removed.append(unit_id)
+
+    for a, b in delta.get("connect", []):
+        source, target = board.get(a), board.get(b)
+        if source and target and engine.connect(source, target):
+            changed.update((a, b))
+
+    for a, b in delta.get("disconnect", []):
+        source, target = board.get(a), board.get(b)
+        if source and target and engine.disconnect(source, target):
+            changed.update((a, b))
+
+    if "tick" in delta:
+        engine.tick_count = delta["tick"]
+
+    # Values were written directly, cached tick data must be rebuilt
+    board.touch()
+    return {"changed": changed - {state.unit_id for state in added}, "added": added, "removed": removed}
+
+
+def set_unit_fields(engine, state, unit_data):
+    for name in UNIT_FIELDS:
+        if name not in unit_data:
+            continue
+        if name == "owner":
+            if unit_data["owner"] != state.owner:
+                old_owner = state.owner
+                engine.board.set_owner(state, unit_data["owner"])
+                engine.notify("owner_changed", state, old_owner)
+        else:
+            setattr(state, name, unit_data[name])
+
+
+def snapshot_to_delta(board, units_data, tick=0):
+    """Build a delta that turns board into the full snapshot units_data"""
+    target_units = {}
+    target_edges = set()
+    for unit_data in units_data:
+        unit_id = unit_data.get("id")
+        target_units[unit_id] = unit_data
+        for conn_id in unit_data.get("connections", []):
+            target_edges.add(edge_key(unit_id, conn_id))
+
+    current_units, current_edges = snapshot_board(board)
+
+    added = []
+    units = []
+    for unit_id, unit_data in target_units.items():
+        fields = {name: unit_data[name] for name in UNIT_FIELDS if name in unit_data}
+        # Saved unit dicts only carry capture points for neutral bases
+        fields.setdefault("player_points", 0)
+        fields.setdefault("pc_points", 0)
+        current = current_units.get(unit_id)
+        if current is None:
+            added.append({"id": unit_id, **fields})
+            continue
+        # Only send what differs so views that already match are left alone
+        update = {name: value for name, value in fields.items()
+                  if current[UNIT_FIELDS.index(name)] != value}
+        if update:
+            units.append({"id": unit_id, **update})
+
+    return {
+        "tick": tick,
+        "units": units,
+        "added": added,
+        "removed": [unit_id for unit_id in current_units if unit_id not in target_units],
+        "connect": [list(edge) for edge in target_edges - current_edges],
+        "disconnect": [list(edge) for edge in current_edges - target_edges]
+    }
+
+
+class ClientPrediction:
+    """Client side prediction reconciled against the host's board
+
+    The host stamps every update with its tick and the action_seq of the
+    last client action it applied, so actions still in flight can be
+    replayed on top of the authoritative board.
+    """
+
+    def __init__(self, vectorize_threshold=VECTORIZE_THRESHOLD):
+        self.server_engine = GameEngine(vectorize_threshold=vectorize_threshold)
+        self.pending_actions = OrderedDict()  # action_seq -> action not confirmed by the host
+        self.next_action_seq = 1
+        self.corrections = 0  # Reconciliations that changed the displayed board
+
+    @property
+    def server_tick(self):
+        return self.server_engine.tick_count
+
+    def clear(self):
+        """Forget every action, for a new game"""
+        self.pending_actions.clear()
+        self.next_action_seq = 1
+
+    def reset(self, units_data, tick=0, last_action=0):
+        """Replace the authoritative board with a full snapshot"""
+        self.server_engine.load_state(units_data, tick)
+        self.confirm_actions(last_action)
+
+    def record_action(self, action):
+        """Number a local action before it is sent to the host"""
+        action["action_seq"] = self.next_action_seq
+        self.next_action_seq += 1
+        self.pending_actions[action["action_seq"]] = action
+        return action
+
+    def confirm_actions(self, last_action):
+        while self.pending_actions and next(iter(self.pending_actions)) <= last_action:
+            self.pending_actions.popitem(last=False)
+
+    def apply_delta(self, delta):
+        """Apply a GAME_STATE_DELTA to the authoritative board"""
+        apply_delta(self.server_engine, delta)
+        self.confirm_actions(delta.get("last_action", 0))
+
+    def predict(self, tick):
+        """Return an engine re-simulated from the host's tick to tick"""
+        engine = GameEngine(self.server_engine.board.copy(), self.server_engine.vectorize_threshold)
+        engine.tick_count = self.server_tick
+
+        # Actions are stamped with the tick they were made after
+        actions = sorted(self.pending_actions.values(), key=lambda action: action.get("tick", 0))
+        index = 0
+        while True:
+            while index < len(actions) and actions[index].get("tick", 0) <= engine.tick_count:
+                replay_action(engine, actions[index])
+                index += 1
+            if engine.tick_count >= tick:
+                break
+            engine.tick()
+
+        for action in actions[index:]:
+            replay_action(engine, action)
+        return engine
+
+    def reconcile(self, engine):
+        """Bring the displayed engine to the prediction for its own tick
+
+        Returns the apply_delta result for the views. The displayed engine
+        never moves back in time: if the host is ahead, it jumps forward.
+        """
+        predicted = self.predict(max(engine.tick_count, self.server_tick))
+        delta = snapshot_to_delta(engine.board, predicted.board.to_dicts(), predicted.tick_count)
+        if delta["units"] or delta["added"] or delta["removed"] or delta["connect"] or delta["disconnect"]:
+            self.corrections += 1
+        return apply_delta(engine, delta)
+
+
+def replay_action(engine, action):
+    source = engine.board.get(action.get("source_id"))
+    target = engine.board.get(action.get("target_id"))
+    if source is None or target is None:
+        return
+    if action.get("type") == "connect":
+        engine.connect(source, target)
+    elif action.get("type") == "disconnect":
+        engine.disconnect(source, target)
@@ -1,6 +1,65 @@
 from PyQt5.QtWidgets import QGraphicsItem, QGraphicsLineItem
 from PyQt5.QtCore import Qt, QRectF, QPointF, QLineF
-from PyQt5.QtGui import QBrush, QPen, QColor, QPainter, QFont, QPixmap
+from PyQt5.QtGui import QBrush, QPen, QColor, QPainter, QFont, QStaticText, QTextOption, QPainterPath
+from sprite_cache import SPRITES
+
+# Paint resources shared by every unit
+OWNER_COLORS = {
+    "player": QColor(50, 200, 50),
+    "pc": QColor(200, 50, 50),
+    "neutral": QColor(150, 150, 150)
+}
+OWNER_BRUSHES = {owner: QBrush(color) for owner, color in OWNER_COLORS.items()}
+HIGHLIGHT_PENS = {
+    "connect": QPen(QColor(0, 100, 255), 3),
+    "attack": QPen(QColor(255, 0, 0), 3),
+    "transfer": QPen(QColor(255, 255, 0), 3),
+    "ally": QPen(QColor(0, 255, 0), 3)
+}
+HIGHLIGHT_MARGIN = 7  # The highlight ring is drawn 5px around the unit with a 3px pen
+OUTLINE_PEN = QPen(Qt.black, 2)
+SELECTED_BRUSH = QBrush(QColor(255, 255, 0))
+LABEL_PEN = QPen(Qt.white)
+LABEL_OPTION = QTextOption(Qt.AlignHCenter)
+LABEL_FONTS = {}  # unit size -> label font
+LABELS = {}  # (text, unit size) -> (QStaticText, position), shared as most units show small numbers
+MAX_LABELS = 2048
+# Level of detail, by how many screen pixels a unit covers
+DOT_PIXELS = 8  # Smaller units are plain squares in the owner's colour
+LABEL_PIXELS = 16  # Smaller units have no label
+
+
+def label_font(size):
+    font = LABEL_FONTS.get(size)
+    if font is None:
+        font = LABEL_FONTS[size] = QFont("Arial", size // 4)
+    return font
+
+
+def make_label(text, size):
+    """QStaticText of a label and where it goes to be centred on a unit of this size"""
+    label = LABELS.get((text, size))
+    if label is not None:
+        return label
+    
+    # QStaticText breaks lines at U+2028, not at newlines
+    static_text = QStaticText(text.replace("\n", "\u2028"))
+    static_text.setTextFormat(Qt.PlainText)
+    static_text.prepare(font=label_font(size))
+    width = static_text.size().width()
+    if "\n" in text:
+        # Lay out at the natural width so the lines centre on each other
+        static_text.setTextWidth(width)
+        static_text.setTextOption(LABEL_OPTION)
+        static_text.prepare(font=label_font(size))
+    height = static_text.size().height()
+    # Centred on the unit like drawText(AlignCenter)
+    label = (static_text, QPointF((size - width) / 2, (size - height) / 2))
+    if len(LABELS) >= MAX_LABELS:
+        LABELS.clear()
+    LABELS[(text, size)] = label
+    return label
+
 
 class ConnectionLine(QGraphicsLineItem):
     def __init__(self, start_pos):
@@ -9,26 +68,17 @@ class ConnectionLine(QGraphicsLineItem):
         self.setPen(QPen(Qt.darkGray, 1, Qt.DashLine))
         
 class Unit(QGraphicsItem):
-    def __init__(self, x, y, size=40, owner="player"):
+    """Graphics view over a single UnitState owned by the GameEngine"""
+
+    def __init__(self, state):
         super().__init__()
         
-        self.size = size
-        self.owner = owner
-        
-        if owner == "player":
-            self.pixmap = QPixmap(":/images/grafika/green.bmp")
-            self.color = QColor(50, 200, 50)
-        elif owner == "pc":
-            self.pixmap = QPixmap(":/images/grafika/red.bmp")
-            self.color = QColor(200, 50, 50)
-        else:
-            self.pixmap = QPixmap(":/images/grafika/grey.bmp")
-            self.color = QColor(150, 150, 150)
-        
-        if not self.pixmap.isNull():
-            self.pixmap = self.pixmap.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.state = state
+        self.display_owner = None
+        self.display_size = None
+        self.bounds = QRectF()
+        self.sync_owner()
             
-        self.connections = []
         self.dragging_connection = False
         self.deleting_connection = False
         self.temp_connection_line = None
@@ -37,104 +87,201 @@ class Unit(QGraphicsItem):
         
         # Network-related properties
         self.last_action = None  # Store the last action performed for network sync
-        
-        # Initialize player_points and pc_points for all units
-        self.player_points = 0
-        self.pc_points = 0
-        
-        if owner == "neutral":
-            self.value = 10
-        else:
-            self.value = 0
+
+        self.label = None  # QStaticText of the value label
+        self.label_key = None  # What the label was built from
+        self.label_pos = QPointF()
 
         self.main_window = None
-        self.setPos(x, y)
+        self.setPos(state.x, state.y)
         self.setFlag(QGraphicsItem.ItemIsSelectable)
+        # Repaints that change nothing (hover, selection elsewhere, a moving
+        # connection line) reuse the pixmap; update() invalidates it
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+
+    # Game data lives in the engine state, the item only mirrors it
+    @property
+    def unit_id(self):
+        return self.state.unit_id
+
+    @property
+    def size(self):
+        return self.state.size
+
+    @property
+    def owner(self):
+        return self.state.owner
+
+    @property
+    def value(self):
+        return self.state.value
+
+    @value.setter
+    def value(self, value):
+        self.state.value = value
+
+    @property
+    def player_points(self):
+        return self.state.player_points
+
+    @player_points.setter
+    def player_points(self, points):
+        self.state.player_points = points
+
+    @property
+    def pc_points(self):
+        return self.state.pc_points
+
+    @pc_points.setter
+    def pc_points(self, points):
+        self.state.pc_points = points
+
+    @property
+    def connections(self):
+        """Views of the units connected to this one"""
+        if not self.main_window:
+            return []
+        unit_map = self.main_window.unit_map
+        return [unit_map[other.unit_id] for other in self.state.connections if other.unit_id in unit_map]
+
+    @property
+    def engine(self):
+        return self.main_window.engine if self.main_window else None
+
+    def sync_owner(self):
+        """Reload sprite, colour and geometry after the owner or size changed in the engine"""
+        if self.display_owner == self.owner and self.display_size == self.size:
+            return
+        self.display_owner = self.owner
+        if self.display_size != self.size:
+            self.display_size = self.size
+            # Room for the highlight ring, which is also what the item cache holds
+            self.prepareGeometryChange()
+            self.bounds = QRectF(-HIGHLIGHT_MARGIN, -HIGHLIGHT_MARGIN,
+                                 self.size + 2 * HIGHLIGHT_MARGIN, self.size + 2 * HIGHLIGHT_MARGIN)
         
-        # Add unique ID for each unit (for history tracking)
-        self.unit_id = id(self)
+        # Sprites are shared by every unit of the same owner and size
+        self.pixmap = SPRITES.sprite(self.owner, self.size)
+        self.color = OWNER_COLORS.get(self.owner, OWNER_COLORS["neutral"])
+        self.update()
 
     def can_interact(self):
         """Check if this unit can be interacted with in current game state"""
         if not self.main_window:
             return True
             
+        # The computer opponent's bases are not for the human to move
+        if self.main_window.bot_controls_turn():
+            return False
+            
         # In single player mode or if game is over, follow standard rules
-        if not hasattr(self.main_window, 'game_mode') or self.main_window.game_mode != "Network Game" or self.main_window.game_over:
+        if self.main_window.game_mode != "Network Game" or self.main_window.game_over:
             return self.owner == "neutral" or self.owner == self.main_window.current_turn
             
         # In network game, only allow interaction if:
         # 1. It's our turn (player_role matches current_turn)
-        # 2. We own the unit (current_turn matches unit.owner) OR the unit is neutral
+        # 2. We own the unit (unit's owner matches player_role) OR the unit is neutral
         is_our_turn = self.main_window.current_turn == self.main_window.player_role
-        is_our_unit = self.owner == "neutral" or self.owner == self.main_window.current_turn
+        
+        # FIX: Check if we own the unit (compare to player_role, not current_turn)
+        is_our_unit = self.owner == "neutral" or self.owner == self.main_window.player_role
+        
+        # Debug print for interaction check
+        print(f"Interaction check - Unit owner: {self.owner}, Current turn: {self.main_window.current_turn}, Player role: {self.main_window.player_role}")
+        print(f"Can interact? is_our_turn: {is_our_turn}, is_our_unit: {is_our_unit}, Result: {is_our_turn and is_our_unit}")
+        
+        # Debug print for client interaction check
+        if self.main_window.player_role == "pc":
+            print(f"[CLIENT] Interaction check - Unit owner: {self.owner}, Current turn: {self.main_window.current_turn}")
+            print(f"[CLIENT] Is my turn? {is_our_turn} (current_turn:{self.main_window.current_turn}==player_role:{self.main_window.player_role})")
+            print(f"[CLIENT] Is my unit? {is_our_unit} (owner:{self.owner}==player_role:{self.main_window.player_role} or neutral)") 
+            print(f"[CLIENT] Final permission: {is_our_turn and is_our_unit}")
         
         return is_our_turn and is_our_unit
         
+    def refresh_edges(self, other_unit):
+        """Repaint the connection lines changed between this unit and other_unit"""
+        if self.main_window:
+            self.main_window.edge_layer.refresh((self.unit_id, other_unit.unit_id))
+        
     def disconnect_from(self, other_unit):
-        if other_unit in self.connections:
-            self.connections.remove(other_unit)
-            if self in other_unit.connections:
-                other_unit.connections.remove(self)
-            
-            self.update()
-            other_unit.update()
-            if self.scene():
-                self.scene().update()
+        if self.engine:
+            disconnected = self.engine.disconnect(self.state, other_unit.state)
+        else:
+            # A unit outside a game only unlinks the two states
+            disconnected = other_unit.state in self.state.connections
+            if disconnected:
+                self.state.connections.remove(other_unit.state)
+                if self.state in other_unit.state.connections:
+                    other_unit.state.connections.remove(self.state)
+        if disconnected:
+            self.refresh_edges(other_unit)
             
-            if self.main_window and hasattr(self.main_window, 'current_turn') and self.owner == self.main_window.current_turn:
+            if self.main_window and self.owner == self.main_window.current_turn:
                 # Store the disconnect action for network sync
                 self.last_action = {
                     "type": "disconnect",
                     "source_id": self.unit_id,
-                    "target_id": other_unit.unit_id
+                    "target_id": other_unit.unit_id,
+                    "tick": self.engine.tick_count
                 }
-                if hasattr(self.main_window, 'action_performed'):
-                    self.main_window.action_performed(self.last_action)
+                self.main_window.action_performed(self.last_action)
 
     def paint(self, painter, option, widget=None):
-        if self.is_highlighted:
-            if self.highlight_type == "connect":
-                painter.setPen(QPen(QColor(0, 100, 255), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-            elif self.highlight_type == "attack":
-                painter.setPen(QPen(QColor(255, 0, 0), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-            elif self.highlight_type == "transfer":
-                painter.setPen(QPen(QColor(255, 255, 0), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
-            elif self.highlight_type == "ally":
-                painter.setPen(QPen(QColor(0, 255, 0), 3))
-                painter.setBrush(Qt.NoBrush)
-                painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
+        pixels = self.size * option.levelOfDetailFromTransform(painter.worldTransform())
+        if pixels < DOT_PIXELS:
+            self.paint_dot(painter)
+            return
         
-        # Draw connection lines - important part for visible connections
-        pen = QPen(Qt.darkGray, 1, Qt.DashLine)
-        painter.setPen(pen)
-        for other in self.connections:
-            start = self.scenePos() + self.boundingRect().center()
-            end = other.scenePos() + other.boundingRect().center()
-            painter.drawLine(self.mapFromScene(start), self.mapFromScene(end))
-
+        if self.is_highlighted and self.highlight_type in HIGHLIGHT_PENS:
+            painter.setPen(HIGHLIGHT_PENS[self.highlight_type])
+            painter.setBrush(Qt.NoBrush)
+            painter.drawEllipse(-5, -5, self.size + 10, self.size + 10)
+        
+        # Connection lines are drawn once for the whole board by the EdgeLayer
         if not self.pixmap.isNull():
             if self.isSelected():
-                painter.setPen(QPen(Qt.black, 2))
-                painter.setBrush(QBrush(QColor(255, 255, 0)))
+                painter.setPen(OUTLINE_PEN)
+                painter.setBrush(SELECTED_BRUSH)
                 painter.drawEllipse(0, 0, self.size, self.size)
                 
             painter.drawPixmap(0, 0, self.pixmap)
         else:
-            pen = QPen(Qt.black, 2)
-            brush = QBrush(self.color if not self.isSelected() else QColor(255, 255, 0))
-            painter.setPen(pen)
-            painter.setBrush(brush)
+            painter.setPen(OUTLINE_PEN)
+            painter.setBrush(SELECTED_BRUSH if self.isSelected() else
+                             OWNER_BRUSHES.get(self.owner, OWNER_BRUSHES["neutral"]))
             painter.drawEllipse(0, 0, self.size, self.size)
         
-        painter.setPen(QPen(Qt.white))
-        painter.setFont(QFont("Arial", self.size // 4))
+        if pixels >= LABEL_PIXELS:
+            self.update_label()
+            painter.setPen(LABEL_PEN)
+            painter.setFont(label_font(self.size))
+            painter.drawStaticText(self.label_pos, self.label)
+
+    def paint_dot(self, painter):
+        """Zoomed far out only the owner and the highlight are worth drawing"""
+        if self.is_highlighted and self.highlight_type in HIGHLIGHT_PENS:
+            painter.fillRect(QRectF(-5, -5, self.size + 10, self.size + 10), HIGHLIGHT_PENS[self.highlight_type].brush())
+        painter.fillRect(QRectF(0, 0, self.size, self.size), SELECTED_BRUSH if self.isSelected() else
+                         OWNER_BRUSHES.get(self.owner, OWNER_BRUSHES["neutral"]))
+
+    def shows_label(self, zoom):
+        return self.size * zoom >= LABEL_PIXELS
+
+    def label_source(self):
+        state = self.state
+        return (state.owner, state.value, state.player_points, state.pc_points, state.size)
+
+    def label_changed(self):
+        """True when the painted label no longer shows the unit's numbers"""
+        return self.label_source() != self.label_key
+
+    def update_label(self):
+        """Switch to the label of the numbers shown when they changed"""
+        key = self.label_source()
+        if key == self.label_key:
+            return
+        self.label_key = key
         
         if self.owner == "neutral":
             display_text = f"[{self.value}]"
@@ -144,83 +291,28 @@ class Unit(QGraphicsItem):
                 display_text += f"\nC:{self.pc_points}"
         else:
             display_text = str(self.value)
-            
-        painter.drawText(QRectF(0, 0, self.size, self.size), 
-                         Qt.AlignCenter, display_text)
-    
-    def transfer_points(self, from_unit):
-        if self.owner == "neutral":
-            if from_unit.owner == "player":
-                self.player_points += 1
-                if self.player_points >= 10:
-                    self.convert_to("player")
-            elif from_unit.owner == "pc":
-                self.pc_points += 1
-                if self.pc_points >= 10:
-                    self.convert_to("pc")
+        self.label, self.label_pos = make_label(display_text, self.size)
     
-        elif self.owner == "player" and from_unit.owner == "pc":
-            self.decrease_value()
-            if self.value == 0:
-                self.convert_to_neutral()
-    
-        elif self.owner == "pc" and from_unit.owner == "player":
-            self.decrease_value()
-            if self.value == 0:
-                self.convert_to_neutral()
-            
-        self.update()
-
-    def convert_to_neutral(self):
-        self.owner = "neutral"
-        self.color = QColor(150, 150, 150)
-        self.pixmap = QPixmap(":/images/grafika/grey.bmp")
-        if not self.pixmap.isNull():
-            self.pixmap = self.pixmap.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.value = 10
-        self.player_points = 0
-        self.pc_points = 0
-        self.update()
-        
-        if self.main_window:
-            self.main_window.check_game_over()
-
-    def convert_to(self, new_owner):
-        old_owner = self.owner
-        self.owner = new_owner
-
-        if new_owner == "player":
-            self.color = QColor(50, 200, 50)
-            self.pixmap = QPixmap(":/images/grafika/green.bmp")
-            self.value = self.player_points if self.player_points > 0 else 1  # Ensure at least 1 point
-        elif new_owner == "pc":
-            self.color = QColor(200, 50, 50)
-            self.pixmap = QPixmap(":/images/grafika/red.bmp")
-            self.value = self.pc_points if self.pc_points > 0 else 1  # Ensure at least 1 point
-    
-        if not self.pixmap.isNull():
-            self.pixmap = self.pixmap.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-    
-        self.player_points = 0
-        self.pc_points = 0
-
-        self.update()
-        
-        if self.main_window:
-            self.main_window.check_game_over()
-        
     def boundingRect(self):
-        return QRectF(0, 0, self.size, self.size)
+        # Qt asks several times per repaint of every visible unit
+        return self.bounds
+
+    def shape(self):
+        # Clicks and selection only hit the unit itself, not the ring around it
+        path = QPainterPath()
+        path.addRect(QRectF(0, 0, self.size, self.size))
+        return path
     
     def increase_value(self, amount=1):
-        old_value = self.value
-        self.value += amount
+        self.state.increase_value(amount)
+        if self.engine:
+            self.engine.board.touch()
         self.update()
         
     def decrease_value(self, amount=1):
-        old_value = self.value
-        self.value -= amount
-        self.value = max(0, self.value)
+        self.state.decrease_value(amount)
+        if self.engine:
+            self.engine.board.touch()
         self.update()
 
     def mousePressEvent(self, event):
@@ -248,11 +340,7 @@ class Unit(QGraphicsItem):
                 
             self.deleting_connection = True
         
-            self.clear_all_highlights()
-            for unit in self.connections:
-                unit.is_highlighted = True
-                unit.highlight_type = "attack"
-                unit.update()
+            self.apply_highlights({unit: "attack" for unit in self.connections})
         
             start_pos = self.scenePos() + self.boundingRect().center()
             self.temp_connection_line = ConnectionLine(start_pos)
@@ -263,36 +351,53 @@ class Unit(QGraphicsItem):
         else:
             super().mousePressEvent(event)
             
-    def clear_all_highlights(self):
+    def all_units(self):
+        """Every unit view on the board, from the main window index when available"""
+        if self.main_window:
+            return list(self.main_window.unit_map.values())
         if self.scene():
-            for item in self.scene().items():
-                if isinstance(item, Unit):
-                    item.is_highlighted = False
-                    item.highlight_type = None
-                    item.update()
+            return [item for item in self.scene().items() if isinstance(item, Unit)]
+        return []
+
+    def set_highlight(self, highlight_type):
+        """Show or (with None) remove the highlight ring, repainting only on a change"""
+        if highlight_type == self.highlight_type and self.is_highlighted == (highlight_type is not None):
+            return
+        self.is_highlighted = highlight_type is not None
+        self.highlight_type = highlight_type
+        self.update()
+
+    def apply_highlights(self, highlights):
+        """Highlight exactly the units in {unit: highlight type}"""
+        if self.main_window:
+            self.main_window.set_highlights(highlights)
+            return
+        for item in self.all_units():
+            item.set_highlight(highlights.get(item))
+
+    def clear_all_highlights(self):
+        self.apply_highlights({})
                     
     def show_possible_moves(self):
         if not self.scene():
             return
-            
-        all_units = [item for item in self.scene().items() if isinstance(item, Unit) and item != self]
         
-        for unit in all_units:
-            if unit not in self.connections:
-                unit.is_highlighted = True
-                unit.highlight_type = "connect"
-            else:
-                if unit.owner == "neutral" and self.owner != "neutral":
-                    unit.is_highlighted = True
-                    unit.highlight_type = "transfer"
-                elif unit.owner != self.owner and unit.owner != "neutral" and self.owner != "neutral":
-                    unit.is_highlighted = True
-                    unit.highlight_type = "attack"
-                elif unit.owner == self.owner:
-                    unit.is_highlighted = True
-                    unit.highlight_type = "ally"
-                    
-            unit.update()        
+        # Classify the moves from the engine's adjacency instead of the
+        # views: connected bases by owner, every other base can be connected
+        connected = {other.unit_id for other in self.state.connections}
+        highlights = {}
+        for unit in self.all_units():
+            if unit is self:
+                continue
+            if unit.unit_id not in connected:
+                highlights[unit] = "connect"
+            elif unit.owner == "neutral" and self.owner != "neutral":
+                highlights[unit] = "transfer"
+            elif unit.owner != self.owner and unit.owner != "neutral" and self.owner != "neutral":
+                highlights[unit] = "attack"
+            elif unit.owner == self.owner:
+                highlights[unit] = "ally"
+        self.apply_highlights(highlights)
             
     def mouseMoveEvent(self, event):
         if (self.dragging_connection or self.deleting_connection) and self.temp_connection_line:
@@ -358,22 +463,24 @@ class Unit(QGraphicsItem):
             self.clear_all_highlights()
             
     def connect_to(self, other_unit):
-        if other_unit not in self.connections:
-            self.connections.append(other_unit)
-            other_unit.connections.append(self)
-            self.update()
-            other_unit.update()
-            
-            # Force scene update to ensure connection lines are drawn
-            if self.scene():
-                self.scene().update()
+        if self.engine:
+            connected = self.engine.connect(self.state, other_unit.state)
+        else:
+            # A unit outside a game only links the two states
+            connected = other_unit.state is not self.state and other_unit.state not in self.state.connections
+            if connected:
+                self.state.connections.append(other_unit.state)
+                if self.state not in other_unit.state.connections:
+                    other_unit.state.connections.append(self.state)
+        if connected:
+            self.refresh_edges(other_unit)
             
-            if self.main_window and hasattr(self.main_window, 'current_turn') and self.owner == self.main_window.current_turn:
+            if self.main_window and self.owner == self.main_window.current_turn:
                 # Store the connect action for network sync
                 self.last_action = {
                     "type": "connect",
                     "source_id": self.unit_id,
-                    "target_id": other_unit.unit_id
+                    "target_id": other_unit.unit_id,
+                    "tick": self.engine.tick_count
                 }
-                if hasattr(self.main_window, 'action_performed'):
-                    self.main_window.action_performed(self.last_action)
+                self.main_window.action_performed(self.last_action)